@@ -0,0 +1,107 @@
+"""
+Archivage mensuel des nuages de points (rétention).
+
+Les sessions sont rangées par mois (ProfilometreLidarData.partition,
+"AAAA-MM"). Passé LIDAR_RETENTION_ARCHIVE_AFTER_DAYS, les colonnes des nuages
+d'un mois sont compressées dans un fichier SQLite par mois
+(LIDAR_ARCHIVE_DIR/lidar-AAAA-MM.sqlite3) et retirées de la base principale ;
+les métadonnées (sessions, métriques, IRI...) restent en base et les points
+restent lisibles, relus depuis l'archive à la demande.
+"""
+import contextlib
+import datetime
+import sqlite3
+import zlib
+from pathlib import Path
+
+from django.conf import settings
+from django.utils import timezone
+
+from . import pointcloud
+
+COMPRESSION_LEVEL = 6
+
+# Une table par modèle de nuage : nuages filtrés (LidarPointCloud) et points bruts (LidarRawPointCloud)
+CLOUDS_TABLE = 'clouds'
+RAW_CLOUDS_TABLE = 'raw_clouds'
+TABLES = (CLOUDS_TABLE, RAW_CLOUDS_TABLE)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS {table} (
+    id INTEGER PRIMARY KEY,
+    session_id INTEGER NOT NULL,
+    coord_dtype TEXT NOT NULL,
+    point_count INTEGER NOT NULL,
+    x BLOB NOT NULL,
+    y BLOB NOT NULL,
+    z BLOB NOT NULL,
+    t BLOB NOT NULL
+)
+"""
+
+
+def partition_key(moment):
+    """Clé de partition mensuelle d'une date : "AAAA-MM" (UTC)."""
+    if isinstance(moment, datetime.datetime) and timezone.is_aware(moment):
+        moment = moment.astimezone(datetime.timezone.utc)
+    return f"{moment.year:04d}-{moment.month:02d}"
+
+
+def archive_path(key):
+    directory = getattr(settings, 'LIDAR_ARCHIVE_DIR', Path(settings.BASE_DIR) / 'lidar_archive')
+    return Path(directory) / f"lidar-{key}.sqlite3"
+
+
+@contextlib.contextmanager
+def open_archive(key, create=False):
+    path = archive_path(key)
+    if not create and not path.exists():
+        raise FileNotFoundError(f"Archive introuvable : {path}")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    connection = sqlite3.connect(path)
+    try:
+        for table in TABLES:
+            connection.execute(_SCHEMA.format(table=table))
+        yield connection
+    finally:
+        connection.close()
+
+
+def write_clouds(key, clouds, table=CLOUDS_TABLE):
+    """
+    Copie des nuages (avec leurs colonnes) dans l'archive du mois, validée
+    sur disque avant que la base principale ne soit modifiée. Rejouable :
+    un nuage déjà archivé est remplacé.
+    """
+    def rows():
+        for cloud in clouds:
+            arrays = cloud.as_arrays()
+            yield (
+                cloud.pk, cloud.session_id, cloud.coord_dtype, cloud.point_count,
+                *(zlib.compress(pointcloud.pack(arrays[axis]), COMPRESSION_LEVEL) for axis in pointcloud.AXES),
+            )
+
+    with open_archive(key, create=True) as connection:
+        with connection:
+            connection.executemany(f"INSERT OR REPLACE INTO {table} VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows())
+
+
+def read_columns(key, cloud_id, table=CLOUDS_TABLE):
+    """Colonnes brutes {x, y, z, t} (octets) d'un nuage archivé."""
+    with open_archive(key) as connection:
+        row = connection.execute(f"SELECT x, y, z, t FROM {table} WHERE id = ?", (cloud_id,)).fetchone()
+    if row is None:
+        raise LookupError(f"Nuage {cloud_id} absent de l'archive {key}")
+    return {axis: zlib.decompress(blob) for axis, blob in zip(pointcloud.AXES, row)}
+
+
+def iter_archived(key, table=CLOUDS_TABLE):
+    """(id du nuage, colonnes brutes) de tous les nuages d'une archive."""
+    with open_archive(key) as connection:
+        for cloud_id, *blobs in connection.execute(f"SELECT id, x, y, z, t FROM {table}"):
+            yield cloud_id, {axis: zlib.decompress(blob) for axis, blob in zip(pointcloud.AXES, blobs)}
+
+
+def archive_size(key):
+    path = archive_path(key)
+    return path.stat().st_size if path.exists() else 0
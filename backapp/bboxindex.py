@@ -0,0 +1,127 @@
+"""
+Index global des emprises de sessions (« quelles sessions ont couvert cette
+zone ? ») dans une table virtuelle SQLite R*Tree.
+
+Une ligne par session ayant des points : id de la session, emprise x / y
+(bbox_min_x... de ProfilometreLidarData) et date de capture (secondes
+epoch, intervalle réduit à un instant). L'index est tenu à jour par save(),
+delete(), bulk_create() et QuerySet.delete() ; QuerySet.update() lui échappe
+(rebuild_lidar_bbox_index le reconstruit).
+
+Le R*Tree stocke des flottants 32 bits arrondis vers l'extérieur : il renvoie
+un sur-ensemble, affiné ensuite sur les colonnes exactes de la session.
+Hors SQLite, la table n'existe pas et les requêtes passent par les index
+des colonnes bbox_* seuls.
+"""
+import math
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models.expressions import RawSQL
+
+TABLE = 'backapp_lidar_bbox_rtree'
+SESSIONS_TABLE = 'backapp_profilometrelidardata'
+
+# Marge (s) sur les bornes de temps : le remplissage SQL tronque à la seconde
+TIME_MARGIN_SEC = 1.0
+
+BBOX_FIELDS = ('bbox_min_x', 'bbox_max_x', 'bbox_min_y', 'bbox_max_y')
+INDEXED_FIELDS = (*BBOX_FIELDS, 'timestamp')  # champs de session recopiés dans l'index
+
+
+def enabled(using=None):
+    return connections[using or DEFAULT_DB_ALIAS].vendor == 'sqlite'
+
+
+def create(connection):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING rtree(id, min_x, max_x, min_y, max_y, min_t, max_t)"
+        )
+
+
+def drop(connection):
+    with connection.cursor() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS {TABLE}")
+
+
+def _row(session):
+    bounds = [getattr(session, field) for field in BBOX_FIELDS]
+    if any(value is None or not math.isfinite(value) for value in bounds):
+        return None
+    timestamp = session._meta.get_field('timestamp').to_python(session.timestamp).timestamp()
+    return (session.pk, *bounds, timestamp, timestamp)
+
+
+def sync(sessions, using=None):
+    """Insère ou remplace l'emprise des sessions ; retire celles sans points."""
+    if not enabled(using):
+        return
+    rows, removed = [], []
+    for session in sessions:
+        row = _row(session)
+        if row is None:
+            removed.append(session.pk)
+        else:
+            rows.append(row)
+    with connections[using or DEFAULT_DB_ALIAS].cursor() as cursor:
+        if rows:
+            cursor.executemany(f"INSERT OR REPLACE INTO {TABLE} VALUES (%s, %s, %s, %s, %s, %s, %s)", rows)
+        if removed:
+            cursor.executemany(f"DELETE FROM {TABLE} WHERE id = %s", [(pk,) for pk in removed])
+
+
+def remove(session_ids, using=None):
+    if not enabled(using):
+        return
+    with connections[using or DEFAULT_DB_ALIAS].cursor() as cursor:
+        cursor.executemany(f"DELETE FROM {TABLE} WHERE id = %s", [(pk,) for pk in session_ids])
+
+
+def intersecting(bbox, start=None, end=None):
+    """
+    Sous-requête des id de sessions dont l'emprise recoupe bbox (min_x,
+    min_y, max_x, max_y), capturées dans [start, end] : pk__in=...
+    """
+    min_x, min_y, max_x, max_y = bbox
+    where = ["max_x >= %s", "min_x <= %s", "max_y >= %s", "min_y <= %s"]
+    params = [min_x, max_x, min_y, max_y]
+    if start is not None:
+        where.append("max_t >= %s")
+        params.append(start.timestamp() - TIME_MARGIN_SEC)
+    if end is not None:
+        where.append("min_t <= %s")
+        params.append(end.timestamp() + TIME_MARGIN_SEC)
+    return RawSQL(f"SELECT id FROM {TABLE} WHERE {' AND '.join(where)}", params)
+
+
+def rebuild(connection, sessions_table=SESSIONS_TABLE):
+    """Reconstruit l'index à partir des colonnes bbox_* des sessions (une requête SQL)."""
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TABLE}")
+        cursor.execute(
+            f"INSERT INTO {TABLE} "
+            f"SELECT id, bbox_min_x, bbox_max_x, bbox_min_y, bbox_max_y, "
+            f"CAST(strftime('%%s', timestamp) AS REAL), CAST(strftime('%%s', timestamp) AS REAL) "
+            f"FROM {sessions_table} "
+            f"WHERE bbox_min_x IS NOT NULL AND bbox_max_x IS NOT NULL "
+            f"AND bbox_min_y IS NOT NULL AND bbox_max_y IS NOT NULL",
+            [],
+        )
+        cursor.execute(f"SELECT COUNT(*) FROM {TABLE}")
+        return cursor.fetchone()[0]
+
+
+def stale_count(connection, sessions_table=SESSIONS_TABLE):
+    """Lignes manquantes ou en trop dans l'index par rapport aux sessions."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT COUNT(*) FROM {sessions_table} s WHERE s.bbox_min_x IS NOT NULL "
+            f"AND s.bbox_max_x IS NOT NULL AND s.bbox_min_y IS NOT NULL AND s.bbox_max_y IS NOT NULL "
+            f"AND NOT EXISTS (SELECT 1 FROM {TABLE} r WHERE r.id = s.id)"
+        )
+        missing = cursor.fetchone()[0]
+        cursor.execute(
+            f"SELECT COUNT(*) FROM {TABLE} r WHERE NOT EXISTS "
+            f"(SELECT 1 FROM {sessions_table} s WHERE s.id = r.id AND s.bbox_min_x IS NOT NULL)"
+        )
+        return missing, cursor.fetchone()[0]
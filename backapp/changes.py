@@ -0,0 +1,141 @@
+"""
+Détection de changements entre deux passages sur le même trajet.
+
+Les deux sessions doivent partager un repère (coordonnées x, y
+géoréférencées). La session de référence est hachée sur une grille x, y de
+pas cell_size (origine commune 0, 0) : une cellule non vide garde le
+barycentre et le z moyen de ses points. Chaque point de la session comparée
+est apparié, d'un bloc (NumPy), à la cellule de référence dont le barycentre
+est le plus proche parmi sa cellule et ses 8 voisines, à moins de
+cell_size. L'écart d'élévation dz = z - z de référence (positif : surface
+plus haute au second passage) est ensuite agrégé par cellule.
+"""
+import numpy as np
+from django.conf import settings
+
+CELL_DTYPE = np.dtype([
+    ('x', '<f4'),   # barycentre des points comparés de la cellule
+    ('y', '<f4'),
+    ('dz', '<f4'),  # écart d'élévation moyen (m)
+    ('n', '<u4'),   # points appariés
+])
+
+_NEIGHBOURS = [(dx, dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1)]
+
+
+def _cells(x, y, cell_size):
+    return np.floor(x / cell_size).astype(np.int64), np.floor(y / cell_size).astype(np.int64)
+
+
+def _keys(ix, iy):
+    # Clé linéaire unique tant que |iy| < 2**31 cellules
+    return ix * (1 << 32) + (iy + (1 << 31))
+
+
+def _finite_xyz(arrays):
+    x, y, z = (np.asarray(arrays[axis], dtype=np.float64) for axis in ('x', 'y', 'z'))
+    valid = np.isfinite(x) & np.isfinite(y) & np.isfinite(z)
+    return x[valid], y[valid], z[valid]
+
+
+def _cell_means(keys, *columns):
+    """Clés uniques triées, nombre de points et moyenne de chaque colonne par cellule."""
+    unique, inverse = np.unique(keys, return_inverse=True)
+    counts = np.bincount(inverse, minlength=unique.size)
+    means = [np.bincount(inverse, weights=column, minlength=unique.size) / counts for column in columns]
+    return unique, counts, means
+
+
+class ReferenceGrid:
+    """Hachage x, y de la session de référence : barycentre et z moyen par cellule."""
+
+    def __init__(self, cell_size, keys, x, y, z):
+        self.cell_size = float(cell_size)
+        self.keys = keys
+        self.x = x
+        self.y = y
+        self.z = z
+
+    @classmethod
+    def build(cls, arrays, cell_size):
+        x, y, z = _finite_xyz(arrays)
+        keys, _, (mx, my, mz) = _cell_means(_keys(*_cells(x, y, cell_size)), x, y, z)
+        return cls(cell_size, keys, mx, my, mz)
+
+    def nearest(self, x, y, max_distance=None):
+        """
+        Cellule de référence la plus proche de chaque point (barycentre, dans
+        la cellule du point et ses voisines). Renvoie (indices, distances) ;
+        -1 / inf quand aucune cellule n'est à moins de max_distance.
+        """
+        if max_distance is None:
+            max_distance = self.cell_size
+        best = np.full(x.size, -1, dtype=np.int64)
+        best_d2 = np.full(x.size, np.inf)
+        if not self.keys.size:
+            return best, best_d2
+        ix, iy = _cells(x, y, self.cell_size)
+        for dx, dy in _NEIGHBOURS:
+            wanted = _keys(ix + dx, iy + dy)
+            position = np.minimum(np.searchsorted(self.keys, wanted), self.keys.size - 1)
+            found = self.keys[position] == wanted
+            d2 = np.where(found, np.square(x - self.x[position]) + np.square(y - self.y[position]), np.inf)
+            closer = d2 < best_d2
+            best[closer] = position[closer]
+            best_d2[closer] = d2[closer]
+        too_far = best_d2 > max_distance * max_distance
+        best[too_far] = -1
+        best_d2[too_far] = np.inf
+        return best, np.sqrt(best_d2)
+
+
+def compare(reference, compared, cell_size=None, threshold=None):
+    """
+    Écarts d'élévation de `compared` par rapport à `reference` (colonnes
+    {x, y, z, t}). Renvoie les champs de ChangeDetection : statistiques sur
+    les points appariés et champ d'écarts par cellule (blob CELL_DTYPE).
+    """
+    if cell_size is None:
+        cell_size = settings.LIDAR_CHANGE_CELL_SIZE
+    if threshold is None:
+        threshold = settings.LIDAR_CHANGE_THRESHOLD
+    grid = ReferenceGrid.build(reference, cell_size)
+    x, y, z = _finite_xyz(compared)
+    nearest, _ = grid.nearest(x, y)
+    matched = nearest >= 0
+    x, y = x[matched], y[matched]
+    dz = z[matched] - grid.z[nearest[matched]]
+
+    keys, counts, (cx, cy, cdz) = _cell_means(_keys(*_cells(x, y, cell_size)), x, y, dz)
+    cells = np.empty(keys.size, dtype=CELL_DTYPE)
+    cells['x'], cells['y'], cells['dz'], cells['n'] = cx, cy, cdz, counts
+
+    summary = {
+        'mean_delta': None, 'median_delta': None, 'std_delta': None,
+        'rmse': None, 'min_delta': None, 'max_delta': None,
+    }
+    if dz.size:
+        summary = {
+            'mean_delta': float(dz.mean()),
+            'median_delta': float(np.median(dz)),
+            'std_delta': float(dz.std()),
+            'rmse': float(np.sqrt(np.mean(np.square(dz)))),
+            'min_delta': float(dz.min()),
+            'max_delta': float(dz.max()),
+        }
+    return {
+        'compared_points': int(matched.size),
+        'matched_points': int(dz.size),
+        'cell_count': int(keys.size),
+        'changed_cells': int(np.count_nonzero(np.abs(cdz) > threshold)),
+        **summary,
+        'cells': cells.tobytes(),
+    }
+
+
+def cells_to_json(cells):
+    """Cellules CELL_DTYPE -> [{x, y, dz, points}]."""
+    return [
+        {'x': x, 'y': y, 'dz': dz, 'points': n}
+        for x, y, dz, n in zip(cells['x'].tolist(), cells['y'].tolist(), cells['dz'].tolist(), cells['n'].tolist())
+    ]
@@ -0,0 +1,98 @@
+"""
+Droits des utilisateurs (abonnement le plus récent : offre, limites,
+expiration) mis en cache pour le chemin d'ingestion.
+
+Une entrée par utilisateur dans le cache Django, invalidée par post_save /
+post_delete sur Subscription ; LIDAR_ENTITLEMENT_CACHE_TTL borne la durée de
+vie d'une entrée si une modification échappe aux signaux (QuerySet.update).
+Avec plusieurs processus (workers d'ingestion), le cache doit être partagé
+(Redis, Memcached : LIDAR_CACHE_BACKEND) pour que l'invalidation les atteigne
+tous : check_shared_cache le signale au démarrage sinon.
+"""
+from collections import namedtuple
+
+from django.conf import settings
+from django.core import checks
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Subscription
+
+CACHE_PREFIX = 'lidar:entitlement:'
+# Caches propres à chaque processus : une invalidation n'atteint pas les autres
+PROCESS_LOCAL_CACHES = ('django.core.cache.backends.locmem.LocMemCache',)
+NO_SUBSCRIPTION = 'none'  # absence d'abonnement, mise en cache elle aussi
+
+# Mêmes noms que les champs de Subscription : check_limits / check_quota lisent l'un ou l'autre
+Entitlement = namedtuple('Entitlement', [
+    'user_id', 'plan_name', 'is_active', 'end_date', 'max_devices', 'max_distance', 'total_space',
+])
+
+
+def _key(user_id):
+    return f"{CACHE_PREFIX}{user_id}"
+
+
+def _ttl():
+    return getattr(settings, 'LIDAR_ENTITLEMENT_CACHE_TTL', 300)
+
+
+def for_users(user_ids):
+    """
+    Droits de chaque utilisateur {user_id: Entitlement} (absent : aucun
+    abonnement). Les utilisateurs absents du cache sont lus en une requête.
+    """
+    user_ids = {user_id for user_id in map(str, user_ids) if user_id.isdigit()}
+    cached = cache.get_many([_key(user_id) for user_id in user_ids])
+    entitlements = {}
+    missing = set()
+    for user_id in user_ids:
+        value = cached.get(_key(user_id))
+        if value is None:
+            missing.add(user_id)
+        elif value != NO_SUBSCRIPTION:
+            entitlements[user_id] = Entitlement(**value)
+
+    if missing:
+        loaded = {}
+        subscriptions = Subscription.objects.filter(user__id__in=missing).order_by('start_date')
+        for subscription in subscriptions:
+            loaded[str(subscription.user_id)] = Entitlement(
+                *(getattr(subscription, field) for field in Entitlement._fields)
+            )
+        entitlements.update(loaded)
+        cache.set_many({
+            _key(user_id): loaded[user_id]._asdict() if user_id in loaded else NO_SUBSCRIPTION
+            for user_id in missing
+        }, _ttl())
+    return entitlements
+
+
+@checks.register(checks.Tags.caches)
+def check_shared_cache(app_configs=None, **kwargs):
+    """Avertit si les droits sont mis en cache dans chaque processus séparément."""
+    backend = settings.CACHES.get('default', {}).get('BACKEND')
+    if backend not in PROCESS_LOCAL_CACHES or not _ttl():
+        return []
+    return [checks.Warning(
+        "Le cache des abonnements n'est pas partagé entre processus : une modification d'abonnement "
+        "n'est vue par les workers d'ingestion qu'après LIDAR_ENTITLEMENT_CACHE_TTL secondes.",
+        hint="Configurez un cache partagé (LIDAR_CACHE_BACKEND : Redis, Memcached) "
+             "ou LIDAR_ENTITLEMENT_CACHE_TTL = 0.",
+        id='backapp.W001',
+    )]
+
+
+def invalidate(user_id):
+    cache.delete(_key(user_id))
+
+
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Subscription)
+def invalidate_subscription(sender, instance, using=None, **kwargs):
+    # Tout de suite, puis à la validation : une lecture concurrente a pu
+    # remettre l'ancienne valeur en cache avant le COMMIT
+    invalidate(instance.user_id)
+    transaction.on_commit(lambda: invalidate(instance.user_id), using=using)
@@ -0,0 +1,187 @@
+"""
+Export en flux des sessions LiDAR : NDJSON, CSV, PLY binaire et LAS 1.2.
+
+Les colonnes de chaque nuage sont relues par tranches (SUBSTR sur les
+blobs) et encodées tranche par tranche par des générateurs : la mémoire
+utilisée ne dépend pas du nombre de points exportés. Les encodeurs
+acceptent aussi un flux de tranches déjà préparé (points fusionnés d'un
+trajet, cf. routes.py).
+"""
+import csv
+import datetime
+import io
+import json
+import struct
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Max, Min, Sum
+from rest_framework.renderers import BaseRenderer
+
+from . import pointcloud
+from .models import LidarPointCloud
+
+EXPORT_COLUMNS = ('session_id', 'x', 'y', 'z', 'timestamp_sec')
+
+# LAS 1.2, format de point 1 (avec temps GPS) : 28 octets par point
+LAS_HEADER = struct.Struct('<4sHHIHH8sBB32s32sHHHIIBHI5I3d3d6d')
+LAS_POINT_DTYPE = np.dtype([
+    ('X', '<i4'), ('Y', '<i4'), ('Z', '<i4'),
+    ('intensity', '<u2'),
+    ('return_bits', 'u1'),
+    ('classification', 'u1'),
+    ('scan_angle_rank', 'i1'),
+    ('user_data', 'u1'),
+    ('point_source_id', '<u2'),
+    ('gps_time', '<f8'),
+])
+LAS_SINGLE_RETURN = 0b00001001  # retour 1 sur 1
+LAS_CLASS_UNCLASSIFIED = 1
+LAS_CLASS_NOISE = 7             # point sans coordonnées valides
+
+
+class PassthroughRenderer(BaseRenderer):
+    """
+    Accepte tout type de contenu demandé : les exports renvoient une
+    StreamingHttpResponse, seules les erreurs passent par ce rendu (JSON).
+    """
+    media_type = '*/*'
+    format = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, bytes):
+            return data
+        return json.dumps(data, ensure_ascii=False).encode('utf-8')
+
+
+def _clouds(sessions):
+    """Nuages des sessions, dans l'ordre chronologique, sans leurs colonnes."""
+    return LidarPointCloud.objects.filter(session__in=sessions).order_by(
+        'session__timestamp', 'session_id'
+    )
+
+
+def iter_chunks(cloud, chunk_points=None):
+    """Colonnes {x, y, z, t} d'un nuage, par tranches de chunk_points points."""
+    if chunk_points is None:
+        chunk_points = getattr(settings, 'LIDAR_EXPORT_CHUNK_POINTS', 65536)
+    for start in range(0, cloud.point_count, chunk_points):
+        yield cloud.read_range(start, min(start + chunk_points, cloud.point_count))
+
+
+def _iter_clouds(sessions):
+    clouds = _clouds(sessions).only('id', 'session_id', 'coord_dtype', 'point_count', 'archive_partition', 'file_path')
+    return clouds.iterator()
+
+
+def iter_points(sessions):
+    """
+    Tranches (colonnes {x, y, z, t}, id de session de chaque point) des
+    sessions, nuage après nuage dans l'ordre chronologique.
+    """
+    for cloud in _iter_clouds(sessions):
+        for arrays in iter_chunks(cloud):
+            yield arrays, np.full(arrays['t'].size, cloud.session_id, dtype=np.int64)
+
+
+def _session_names(sessions):
+    return dict(sessions.values_list('id', 'session_id'))
+
+
+# -------------------- ENCODEURS --------------------
+def encode_ndjson(sessions, points=None):
+    names = _session_names(sessions)
+    for arrays, owners in points or iter_points(sessions):
+        yield ''.join(
+            json.dumps({'session_id': names[owner], **point}) + '\n'
+            for owner, point in zip(owners.tolist(), pointcloud.arrays_to_points(arrays))
+        ).encode('utf-8')
+
+
+def encode_csv(sessions, points=None):
+    names = _session_names(sessions)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for arrays, owners in points or iter_points(sessions):
+        writer.writerows(
+            (names[owner], p['x'], p['y'], p['z'], p['timestamp_sec'])
+            for owner, p in zip(owners.tolist(), pointcloud.arrays_to_points(arrays))
+        )
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def encode_ply(sessions, points=None):
+    clouds = _clouds(sessions)
+    total = clouds.aggregate(total=Sum('point_count'))['total'] or 0
+    double = clouds.filter(coord_dtype='float64').exists()
+    coord, coord_name = ('<f8', 'double') if double else ('<f4', 'float')
+    vertex = np.dtype([('x', coord), ('y', coord), ('z', coord), ('timestamp_sec', '<f8'), ('session', '<i4')])
+    yield (
+        "ply\n"
+        "format binary_little_endian 1.0\n"
+        "comment profilometre export\n"
+        f"element vertex {total}\n"
+        f"property {coord_name} x\n"
+        f"property {coord_name} y\n"
+        f"property {coord_name} z\n"
+        "property double timestamp_sec\n"
+        "property int session\n"
+        "end_header\n"
+    ).encode('ascii')
+    for arrays, owners in points or iter_points(sessions):
+        records = np.empty(arrays['t'].size, dtype=vertex)
+        for axis in ('x', 'y', 'z'):
+            records[axis] = arrays[axis]
+        records['timestamp_sec'] = arrays['t']
+        records['session'] = owners
+        yield records.tobytes()
+
+
+def encode_las(sessions, points=None):
+    clouds = _clouds(sessions)
+    bounds = sessions.aggregate(
+        min_x=Min('bbox_min_x'), max_x=Max('bbox_max_x'),
+        min_y=Min('bbox_min_y'), max_y=Max('bbox_max_y'),
+        min_z=Min('z_min'), max_z=Max('z_max'),
+    )
+    total = clouds.aggregate(total=Sum('point_count'))['total'] or 0
+    mins = np.array([bounds[key] or 0.0 for key in ('min_x', 'min_y', 'min_z')])
+    maxs = np.array([bounds[key] or 0.0 for key in ('max_x', 'max_y', 'max_z')])
+    # Coordonnées entières : précision LIDAR_EXPORT_LAS_SCALE, élargie si l'emprise déborde de l'int32
+    scale = max(getattr(settings, 'LIDAR_EXPORT_LAS_SCALE', 0.001), float((maxs - mins).max()) / 2e9)
+    today = datetime.date.today()
+    yield LAS_HEADER.pack(
+        b'LASF', 0, 0, 0, 0, 0, b'\0' * 8, 1, 2,
+        b'profilometre'.ljust(32, b'\0'), b'profilometre export'.ljust(32, b'\0'),
+        today.timetuple().tm_yday, today.year,
+        LAS_HEADER.size, LAS_HEADER.size, 0, 1, LAS_POINT_DTYPE.itemsize, total,
+        total, 0, 0, 0, 0,
+        scale, scale, scale,
+        *mins,
+        maxs[0], mins[0], maxs[1], mins[1], maxs[2], mins[2],
+    )
+    for arrays, owners in points or iter_points(sessions):
+        records = np.zeros(arrays['t'].size, dtype=LAS_POINT_DTYPE)
+        valid = np.ones(records.size, dtype=bool)
+        for axis, field, offset in zip(('x', 'y', 'z'), ('X', 'Y', 'Z'), mins):
+            values = np.asarray(arrays[axis], dtype=np.float64)
+            valid &= np.isfinite(values)
+            records[field] = np.round(np.nan_to_num(values - offset) / scale)
+        records['return_bits'] = LAS_SINGLE_RETURN
+        records['classification'] = np.where(valid, LAS_CLASS_UNCLASSIFIED, LAS_CLASS_NOISE)
+        records['point_source_id'] = owners & 0xFFFF
+        records['gps_time'] = np.nan_to_num(arrays['t'])
+        yield records.tobytes()
+
+
+EXPORT_FORMATS = {
+    'ndjson': (encode_ndjson, 'application/x-ndjson'),
+    'csv': (encode_csv, 'text/csv; charset=utf-8'),
+    'ply': (encode_ply, 'application/octet-stream'),
+    'las': (encode_las, 'application/vnd.las'),
+}
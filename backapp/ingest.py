@@ -0,0 +1,376 @@
+"""
+Chaîne d'ingestion des sessions Profilomètre + LiDAR.
+
+Partagée par les vues synchrones (envoi simple, envoi groupé, upload
+fractionné) et par les workers de la file asynchrone (IngestJob).
+"""
+import hashlib
+import io
+import os
+import tempfile
+
+from django.conf import settings
+from django.db import IntegrityError, OperationalError, transaction
+from django.db.models import F
+from django.utils import timezone
+from rest_framework.exceptions import APIException
+from rest_framework.utils.mediatypes import media_type_matches
+
+from . import entitlements, pointcloud
+from .models import IngestJob, ProfilometreLidarData, UserUsage
+from .parsers import INGEST_PARSER_CLASSES
+from .serializers import ProfilometreLidarDataSerializer, ProfilometreLidarDataBatchItemSerializer
+
+
+SPOOL_MAX_MEMORY = 8 * 1024 * 1024  # au-delà, le corps en attente d'analyse passe sur disque
+
+
+class IngestError(Exception):
+    """Refus d'un envoi : code HTTP et corps de la réponse d'erreur."""
+
+    def __init__(self, status, error, **extra):
+        super().__init__(error)
+        self.status = status
+        self.data = {"error": error, **extra}
+
+
+# -------------------- ABONNEMENTS --------------------
+def subscriptions_for(user_ids):
+    """
+    Droits (abonnement le plus récent) de chaque utilisateur, lus dans le
+    cache ; une seule requête pour les utilisateurs absents du cache.
+    """
+    return entitlements.for_users(user_ids)
+
+
+def check_limits(subscription, distance=None):
+    """Vérifie l'abonnement avant un envoi de données (IngestError si refusé)."""
+    if subscription is None:
+        raise IngestError(404, "Aucun abonnement trouvé.")
+
+    try:
+        too_far = distance is not None and float(distance) > subscription.max_distance
+    except (TypeError, ValueError):
+        raise IngestError(400, "Données invalides.")
+    expired = subscription.end_date is not None and subscription.end_date <= timezone.now()
+    if not subscription.is_active or expired or too_far:
+        raise IngestError(403, "Limite dépassée.")
+
+
+def check_quota(subscription, incoming=0):
+    """
+    Refuse (403) un envoi de `incoming` octets qui ferait dépasser le quota
+    de stockage de l'abonnement. Une seule lecture : le compteur UserUsage
+    de l'utilisateur, jamais la table des sessions.
+    """
+    if subscription is None or subscription.total_space is None:
+        return
+    consumed = UserUsage.stored_bytes_of(subscription.user_id)
+    if consumed + incoming > subscription.total_space:
+        raise IngestError(
+            403, "Quota de stockage dépassé.",
+            space_consumed=consumed, total_space=subscription.total_space,
+        )
+
+
+def check_owner(uploader, user_id):
+    """
+    Un utilisateur n'envoie que ses propres sessions (user_id = son id) ;
+    le staff peut envoyer pour n'importe quel utilisateur.
+    """
+    if uploader is not None and not uploader.is_staff and str(user_id) != str(uploader.id):
+        raise IngestError(403, "Envoi pour un autre utilisateur non autorisé.")
+
+
+def check_uploader_quota(uploader, owner_id=None):
+    """
+    Avant d'analyser le corps : refuse l'envoi si l'abonnement du
+    propriétaire des sessions est absent, inactif ou son quota déjà atteint.
+    Propriétaire : l'utilisateur connecté, ou pour le staff celui indiqué
+    par owner_id (?user_id=) ; sans owner_id, le staff n'est vérifié
+    qu'après analyse, session par session.
+    """
+    if owner_id in (None, ''):
+        if uploader.is_staff:
+            return
+        owner_id = uploader.id
+    check_owner(uploader, owner_id)
+    subscription = subscriptions_for([owner_id]).get(str(owner_id))
+    check_limits(subscription)
+    check_quota(subscription, incoming=1)
+
+
+def incoming_bytes(data):
+    """Taille qu'occuperont les points d'un envoi déjà décodé (octets)."""
+    arrays = data.get('lidar_arrays')
+    if arrays is not None:
+        return pointcloud.stored_size(len(arrays['t']), arrays['x'].dtype.name)
+    json_data = data.get('json_data')
+    points = json_data.get('lidar_data') if isinstance(json_data, dict) else None
+    return pointcloud.stored_size(len(points)) if isinstance(points, list) else 0
+
+
+def check_subscription(user_id, distance=None, incoming=0):
+    """Vérifie limites et quota ; renvoie l'abonnement."""
+    subscription = subscriptions_for([user_id]).get(str(user_id))
+    check_limits(subscription, distance)
+    check_quota(subscription, incoming)
+    return subscription
+
+
+# -------------------- IDEMPOTENCE --------------------
+def hash_body(stream, content_type='', content_encoding='', chunk_size=64 * 1024):
+    """
+    Empreinte SHA-256 du corps brut (avec son Content-Type et son
+    Content-Encoding), lue par blocs avant toute analyse. Renvoie
+    (empreinte, copie relisible du corps).
+    """
+    digest = hashlib.sha256(f"{content_type or ''}\n{content_encoding or ''}\n".encode('utf-8'))
+    body = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY)
+    if stream is not None:
+        for chunk in iter(lambda: stream.read(chunk_size), b''):
+            digest.update(chunk)
+            body.write(chunk)
+    body.seek(0)
+    return digest.hexdigest(), body
+
+
+def find_duplicate(content_hash, uploader=None):
+    """Session déjà enregistrée à partir du même corps (renvoi d'un appareil)."""
+    sessions = ProfilometreLidarData.objects.filter(content_hash=content_hash)
+    if uploader is not None and not uploader.is_staff:
+        sessions = sessions.filter(user_id=str(uploader.id))
+    return sessions.first()
+
+
+# -------------------- INGESTION --------------------
+def ingest_session(data, content_hash=None, uploader=None):
+    """
+    Valide et enregistre une session ; renvoie l'instance créée.
+    Les points arrivent soit dans json_data.lidar_data (JSON), soit déjà en
+    colonnes NumPy sous 'lidar_arrays' (formats binaires, cf. parsers.py).
+    Un session_id déjà enregistré (avec un autre contenu) est refusé en 409.
+    La limite de distance porte sur la distance calculée à partir des points.
+    """
+    if not isinstance(data, dict):
+        raise IngestError(400, "Données invalides.")
+    check_owner(uploader, data.get('user_id'))
+    subscription = check_subscription(data.get('user_id'), incoming=incoming_bytes(data))
+
+    session_id = data.get('session_id')
+    if isinstance(session_id, str) and ProfilometreLidarData.objects.filter(session_id=session_id).exists():
+        raise IngestError(409, "Session déjà enregistrée avec un contenu différent.", session_id=session_id)
+
+    serializer = ProfilometreLidarDataSerializer(data=data)
+    if not serializer.is_valid():
+        raise IngestError(400, "Données invalides.")
+    try:
+        with transaction.atomic():
+            session = serializer.save(lidar_arrays=data.get('lidar_arrays'), content_hash=content_hash)
+            check_limits(subscription, session.distance)
+            # Envois concurrents : le compteur vient d'être incrémenté dans cette transaction
+            check_quota(subscription)
+            return session
+    except IntegrityError:
+        # Même session_id enregistré entre-temps par une requête concurrente
+        raise IngestError(409, "Session déjà enregistrée avec un contenu différent.", session_id=session_id)
+
+
+def ingest_batch(data, uploader=None):
+    """
+    Envoi groupé : liste de sessions, ou {"sessions": [...]}.
+    Renvoie (statut HTTP, corps) avec un résultat par session.
+    """
+    items = data.get('sessions') if isinstance(data, dict) else data
+    if not isinstance(items, list) or not items:
+        raise IngestError(400, "Une liste de sessions est requise.")
+    max_sessions = getattr(settings, 'LIDAR_BATCH_MAX_SESSIONS', 100)
+    if len(items) > max_sessions:
+        raise IngestError(400, f"Maximum {max_sessions} sessions par lot.")
+
+    results = [None] * len(items)
+
+    # Unicité des session_id : une requête pour tout le lot
+    session_ids = [item.get('session_id') for item in items if isinstance(item, dict)]
+    existing = set(
+        ProfilometreLidarData.objects.filter(session_id__in=session_ids).values_list('session_id', flat=True)
+    )
+    # Abonnements : une requête pour tout le lot, une vérification par utilisateur
+    subscriptions = subscriptions_for({str(item.get('user_id')) for item in items if isinstance(item, dict)})
+
+    seen = set()
+    planned = {}  # octets acceptés dans ce lot, par utilisateur
+    to_create = []
+    for index, item in enumerate(items):
+        serializer = ProfilometreLidarDataBatchItemSerializer(data=item)
+        if not serializer.is_valid():
+            results[index] = {"status": 400, "errors": serializer.errors}
+            continue
+        session_id = serializer.validated_data['session_id']
+        try:
+            check_owner(uploader, serializer.validated_data['user_id'])
+        except IngestError as exc:
+            results[index] = {"status": exc.status, **exc.data}
+            continue
+        if session_id in existing or session_id in seen:
+            results[index] = {"status": 409, "error": "Session déjà enregistrée."}
+            continue
+        user_id = str(serializer.validated_data['user_id'])
+        session = ProfilometreLidarData(**serializer.validated_data)
+        if item.get('lidar_arrays') is not None:
+            session.set_point_arrays(item['lidar_arrays'])
+        session.extract_fields()  # distance et taille calculées à partir des points
+        try:
+            check_limits(subscriptions.get(user_id), session.distance)
+            check_quota(subscriptions.get(user_id), planned.get(user_id, 0) + session.stored_bytes)
+        except IngestError as exc:
+            results[index] = {"status": exc.status, **exc.data}
+            continue
+        planned[user_id] = planned.get(user_id, 0) + session.stored_bytes
+        seen.add(session_id)
+        to_create.append((index, session))
+
+    try:
+        with transaction.atomic():
+            ProfilometreLidarData.objects.bulk_create([obj for _, obj in to_create])
+            for user_id in planned:
+                check_quota(subscriptions.get(user_id))
+    except IntegrityError:
+        raise IngestError(409, "Conflit d'identifiant de session, renvoyez le lot.")
+
+    for index, obj in to_create:
+        results[index] = {"status": 201, "id": obj.pk, "lidar_point_count": obj.lidar_point_count}
+    for index, result in enumerate(results):
+        result['index'] = index
+        result.setdefault('session_id', items[index].get('session_id') if isinstance(items[index], dict) else None)
+
+    created = len(to_create)
+    body = {
+        "created": created,
+        "failed": len(items) - created,
+        "results": results,
+    }
+    return (201 if created == len(items) else 207), body
+
+
+# -------------------- FILE ASYNCHRONE --------------------
+def parse_payload(body, content_type, content_encoding=''):
+    """
+    Décode un corps de requête brut (octets ou fichier) avec le parser
+    correspondant au Content-Type, après décompression selon Content-Encoding.
+    """
+    content_type = content_type or 'application/json'
+    stream = body if hasattr(body, 'read') else io.BytesIO(body)
+    for parser_class in INGEST_PARSER_CLASSES:
+        if media_type_matches(parser_class.media_type, content_type):
+            context = {'content_encoding': content_encoding}
+            return parser_class().parse(stream, content_type, context)
+    raise IngestError(415, f"Type de contenu non supporté : {content_type}")
+
+
+def queue_is_full():
+    max_depth = getattr(settings, 'LIDAR_INGEST_QUEUE_MAX_DEPTH', 1000)
+    active = IngestJob.objects.filter(status__in=[IngestJob.STATUS_PENDING, IngestJob.STATUS_RUNNING])
+    return active.count() >= max_depth
+
+
+def claim_next_job():
+    """
+    Réserve le plus ancien job en attente. La réservation est un UPDATE
+    conditionnel : deux workers ne peuvent pas prendre le même job.
+    """
+    while True:
+        job = IngestJob.objects.filter(status=IngestJob.STATUS_PENDING).order_by('created_at').first()
+        if job is None:
+            return None
+        claimed = IngestJob.objects.filter(pk=job.pk, status=IngestJob.STATUS_PENDING).update(
+            status=IngestJob.STATUS_RUNNING,
+            started_at=timezone.now(),
+            attempts=F('attempts') + 1,
+            worker_pid=os.getpid(),
+        )
+        if claimed:
+            job.refresh_from_db()
+            return job
+
+
+def max_attempts():
+    return getattr(settings, 'LIDAR_INGEST_MAX_ATTEMPTS', 3)
+
+
+def _internal_error(exc):
+    return {"error": "Erreur interne lors de l'ingestion.", "detail": f"{type(exc).__name__}: {exc}"}
+
+
+def process_job(job):
+    """
+    Valide, extrait et enregistre le contenu d'un job ; stocke le résultat.
+    Toute erreur autre qu'une indisponibilité de la base (OperationalError,
+    relancée : le job est repris) termine le job en échec (500) : un contenu
+    qui fait échouer le traitement n'est pas retenté indéfiniment.
+    """
+    try:
+        data = parse_payload(bytes(job.payload), job.content_type, job.content_encoding)
+        with transaction.atomic():
+            if job.kind == IngestJob.KIND_BATCH:
+                status_code, result = ingest_batch(data, uploader=job.owner)
+            else:
+                session = ingest_session(data, content_hash=job.content_hash or None, uploader=job.owner)
+                status_code = 201
+                result = {
+                    "id": session.pk,
+                    "session_id": session.session_id,
+                    "lidar_point_count": session.lidar_point_count,
+                }
+    except IngestError as exc:
+        status_code, result = exc.status, exc.data
+    except APIException as exc:
+        status_code, result = exc.status_code, {"error": str(exc.detail)}
+    except OperationalError:
+        raise
+    except Exception as exc:
+        status_code, result = 500, _internal_error(exc)
+    return finish_job(job, status_code, result)
+
+
+def finish_job(job, status_code, result):
+    job.status = IngestJob.STATUS_DONE if status_code < 400 else IngestJob.STATUS_FAILED
+    job.status_code = status_code
+    job.result = result
+    job.payload = b''  # le corps brut n'est plus utile une fois traité
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'status_code', 'result', 'payload', 'finished_at'])
+    return job
+
+
+def _abandon(jobs):
+    """Jobs ayant épuisé LIDAR_INGEST_MAX_ATTEMPTS tentatives : terminés en échec (500)."""
+    return jobs.filter(attempts__gte=max_attempts()).update(
+        status=IngestJob.STATUS_FAILED,
+        status_code=500,
+        result={"error": f"Abandonné après {max_attempts()} tentative(s)."},
+        payload=b'',
+        worker_pid=None,
+        finished_at=timezone.now(),
+    )
+
+
+def release_job(job):
+    """
+    Remet un job en attente après une erreur transitoire (base verrouillée...),
+    sauf s'il a épuisé ses tentatives.
+    """
+    jobs = IngestJob.objects.filter(pk=job.pk)
+    if not _abandon(jobs):
+        jobs.update(status=IngestJob.STATUS_PENDING, worker_pid=None)
+
+
+def requeue_interrupted_jobs():
+    """
+    Remet en attente les jobs restés 'running' (worker arrêté en cours de
+    traitement). Ceux qui ont déjà épuisé leurs tentatives (le job a
+    peut-être arrêté le worker) sont terminés en échec.
+    """
+    running = IngestJob.objects.filter(status=IngestJob.STATUS_RUNNING)
+    _abandon(running)
+    return running.update(status=IngestJob.STATUS_PENDING, worker_pid=None)
@@ -0,0 +1,58 @@
+import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from backapp import archive
+from backapp.models import LidarPartition
+
+
+class Command(BaseCommand):
+    help = (
+        "Rétention : archive les partitions mensuelles anciennes (colonnes des nuages "
+        "compressées dans LIDAR_ARCHIVE_DIR, métadonnées conservées en base)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than-days', type=int,
+            default=getattr(settings, 'LIDAR_RETENTION_ARCHIVE_AFTER_DAYS', 365),
+            help="Archive les mois entièrement antérieurs à cette ancienneté (LIDAR_RETENTION_ARCHIVE_AFTER_DAYS par défaut)",
+        )
+        parser.add_argument('--dry-run', action='store_true', help="Affiche les partitions concernées sans rien modifier")
+        parser.add_argument('--vacuum', action='store_true', help="Compacte la base SQLite après archivage (VACUUM)")
+        parser.add_argument('--restore', metavar='AAAA-MM', help="Remet en base les nuages d'une partition archivée")
+
+    def handle(self, *args, **options):
+        if options['restore']:
+            partition = LidarPartition.objects.filter(key=options['restore']).first()
+            if partition is None or partition.status != LidarPartition.STATUS_ARCHIVED:
+                raise CommandError(f"Partition archivée introuvable : {options['restore']}")
+            restored = partition.restore()
+            self.stdout.write(self.style.SUCCESS(f"Partition {partition.key} : {restored} nuage(s) restauré(s)."))
+            return
+
+        limit = archive.partition_key(timezone.now() - datetime.timedelta(days=options['older_than_days']))
+        LidarPartition.refresh()
+        partitions = LidarPartition.objects.filter(key__lt=limit).exclude(key='')
+
+        archived = 0
+        for partition in partitions:
+            if options['dry_run']:
+                self.stdout.write(
+                    f"Partition {partition.key} ({partition.status}) : {partition.session_count} session(s), "
+                    f"{partition.stored_bytes} octets"
+                )
+                continue
+            count = partition.archive()
+            archived += count
+            self.stdout.write(
+                f"Partition {partition.key} : {count} nuage(s) archivé(s), archive de {partition.archived_bytes} octets"
+            )
+
+        if options['vacuum'] and archived and not options['dry_run'] and connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute('VACUUM')
+        self.stdout.write(self.style.SUCCESS(f"{archived} nuage(s) archivé(s)."))
@@ -0,0 +1,31 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from backapp.models import IriAnalysis, ProfilometreLidarData
+
+
+class Command(BaseCommand):
+    help = "Calcule (mode lot) l'IRI des sessions LiDAR qui n'ont pas encore d'analyse."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help="user_id des sessions à analyser (toutes par défaut)")
+        parser.add_argument(
+            '--segment-length', type=float,
+            default=getattr(settings, 'LIDAR_IRI_SEGMENT_LENGTH', 100.0),
+            help="Longueur de segment en mètres (LIDAR_IRI_SEGMENT_LENGTH par défaut)",
+        )
+
+    def handle(self, *args, **options):
+        sessions = ProfilometreLidarData.objects.filter(has_lidar_data=True).order_by('id')
+        if options['user']:
+            sessions = sessions.filter(user_id=options['user'])
+
+        analysed = failed = 0
+        for session_id, analysis, error in IriAnalysis.for_sessions(sessions, options['segment_length']):
+            if analysis is None:
+                failed += 1
+                self.stderr.write(f"Session {session_id} : {error}")
+            else:
+                analysed += 1
+                self.stdout.write(f"Session {session_id} : {analysis.iri:.2f} m/km")
+        self.stdout.write(self.style.SUCCESS(f"{analysed} session(s) analysée(s), {failed} en échec."))
@@ -0,0 +1,47 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
+
+from backapp import export
+from backapp.models import ProfilometreLidarData
+
+
+class Command(BaseCommand):
+    help = "Exporte des sessions LiDAR en flux (NDJSON, CSV, PLY binaire ou LAS 1.2)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('format', choices=sorted(export.EXPORT_FORMATS))
+        parser.add_argument('--output', '-o', help="Fichier de sortie (sortie standard par défaut)")
+        parser.add_argument('--session', type=int, action='append', help="Identifiant de session (répétable)")
+        parser.add_argument('--user', help="user_id des sessions")
+        parser.add_argument('--start', help="Début de période (date-heure ISO 8601)")
+        parser.add_argument('--end', help="Fin de période (date-heure ISO 8601)")
+        parser.add_argument(
+            '--bbox', type=float, nargs=4, metavar=('MIN_X', 'MIN_Y', 'MAX_X', 'MAX_Y'),
+            help="Emprise recoupant celle des sessions",
+        )
+
+    def handle(self, *args, **options):
+        dates = {}
+        for name in ('start', 'end'):
+            if options[name]:
+                dates[name] = parse_datetime(options[name])
+                if dates[name] is None:
+                    raise CommandError(f"--{name} invalide : {options[name]}")
+        sessions = ProfilometreLidarData.objects.matching(user_id=options['user'], bbox=options['bbox'], **dates)
+        if options['session']:
+            sessions = sessions.filter(pk__in=options['session'])
+
+        encoder, _ = export.EXPORT_FORMATS[options['format']]
+        output = open(options['output'], 'wb') if options['output'] else sys.stdout.buffer
+        try:
+            written = 0
+            for chunk in encoder(sessions):
+                output.write(chunk)
+                written += len(chunk)
+        finally:
+            if options['output']:
+                output.close()
+        if options['output']:
+            self.stdout.write(self.style.SUCCESS(f"{written} octets écrits dans {options['output']}."))
@@ -0,0 +1,78 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from backapp import pointcloud, pointfiles
+from backapp.models import LidarPointCloud, LidarRawPointCloud, ProfilometreLidarData
+
+CLOUD_MODELS = (LidarPointCloud, LidarRawPointCloud)  # nuages filtrés et points bruts
+
+
+class Command(BaseCommand):
+    help = (
+        "Mode fichier (LIDAR_POINT_STORAGE = 'file') : sort de la base les points encore stockés "
+        "en JSON (json_data['lidar_data']) ou en blobs, vers des fichiers .npy."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help="Nuages chargés en mémoire à la fois")
+        parser.add_argument('--verify', action='store_true', help="Vérifie l'empreinte de chaque fichier")
+        parser.add_argument('--prune', action='store_true', help="Supprime les fichiers qu'aucun nuage ne référence")
+
+    def handle(self, *args, **options):
+        if pointfiles.storage_mode() != 'file':
+            raise CommandError("LIDAR_POINT_STORAGE doit valoir 'file'.")
+
+        # Anciennes lignes : points encore dans json_data, extraits au save()
+        legacy = ProfilometreLidarData.objects.filter(point_cloud__isnull=True, json_data__has_key='lidar_data')
+        converted = 0
+        for session in legacy.iterator(chunk_size=options['batch_size']):
+            session.save()
+            converted += 1
+
+        moved = 0
+        for model in CLOUD_MODELS:
+            last = 0
+            while True:
+                batch = list(
+                    model.objects.filter(pk__gt=last, file_path='', archive_partition='')
+                    .order_by('pk')[:options['batch_size']]
+                )
+                if not batch:
+                    break
+                for cloud in batch:
+                    with transaction.atomic():
+                        cloud.save(update_fields=['file_path', 'checksum', *pointcloud.AXES])
+                    moved += 1
+                last = batch[-1].pk
+        self.stdout.write(f"{converted} session(s) JSON convertie(s), {moved} nuage(s) déplacé(s) vers des fichiers.")
+
+        if options['verify']:
+            corrupted = 0
+            for model in CLOUD_MODELS:
+                clouds = model.objects.exclude(file_path='').only('id', 'file_path', 'checksum')
+                for cloud in clouds.iterator():
+                    try:
+                        valid = pointfiles.checksum(cloud.as_arrays()) == cloud.checksum
+                    except (OSError, ValueError):
+                        valid = False
+                    if not valid:
+                        corrupted += 1
+                        self.stderr.write(
+                            f"{model._meta.verbose_name} {cloud.pk} : fichier absent ou altéré ({cloud.file_path})"
+                        )
+            self.stdout.write(f"{corrupted} fichier(s) en erreur.")
+
+        if options['prune']:
+            referenced = {
+                path for model in CLOUD_MODELS
+                for path in model.objects.exclude(file_path='').values_list('file_path', flat=True)
+            }
+            pruned = 0
+            for directory in pointfiles.data_dir().glob('*/*'):
+                relative = directory.relative_to(pointfiles.data_dir()).as_posix()
+                if directory.is_dir() and relative not in referenced:
+                    pointfiles.remove(relative)
+                    pruned += 1
+            self.stdout.write(f"{pruned} répertoire(s) orphelin(s) supprimé(s).")
+
+        self.stdout.write(self.style.SUCCESS("Terminé."))
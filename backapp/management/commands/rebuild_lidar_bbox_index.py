@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from backapp import bboxindex
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconstruit l'index R*Tree des emprises de sessions (SQLite) à partir des colonnes "
+        "bbox_* : rattrapage des sessions existantes ou modifiées par QuerySet.update()."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help="Compte les écarts sans reconstruire")
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        if not bboxindex.enabled(options['database']):
+            raise CommandError("L'index R*Tree des emprises n'existe que sous SQLite.")
+        connection = connections[options['database']]
+
+        if options['check']:
+            missing, extra = bboxindex.stale_count(connection)
+            self.stdout.write(f"{missing} session(s) absente(s) de l'index, {extra} ligne(s) en trop.")
+            return
+
+        with transaction.atomic(using=options['database']):
+            bboxindex.create(connection)
+            indexed = bboxindex.rebuild(connection)
+        self.stdout.write(self.style.SUCCESS(f"{indexed} session(s) indexée(s)."))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from backapp.models import Route
+
+
+class Command(BaseCommand):
+    help = (
+        "Regroupe toutes les sessions en trajets (Route) : après un changement de "
+        "LIDAR_ROUTE_MAX_GAP_SEC ou des sessions modifiées par QuerySet.update()."
+    )
+
+    def handle(self, *args, **options):
+        Route.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"{Route.objects.count()} trajet(s) regroupé(s)."))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from backapp.models import UserUsage
+
+
+class Command(BaseCommand):
+    help = "Recalcule les cumuls par utilisateur (UserUsage) à partir des sessions enregistrées."
+
+    def handle(self, *args, **options):
+        UserUsage.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"{UserUsage.objects.count()} utilisateur(s) recalculé(s)."))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from backapp.models import UserUsage
+
+
+class Command(BaseCommand):
+    help = (
+        "Corrige la dérive des compteurs de stockage : taille de chaque session recalculée "
+        "d'après son nuage, cumuls par utilisateur (UserUsage) ramenés aux totaux réels."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Affiche les écarts sans rien corriger")
+
+    def handle(self, *args, **options):
+        sessions, deltas = UserUsage.reconcile(dry_run=options['dry_run'])
+        for user_id, diff in sorted(deltas.items()):
+            self.stdout.write(f"Utilisateur {user_id} : " + ", ".join(f"{field} {value:+g}" for field, value in diff.items()))
+        verb = "à corriger" if options['dry_run'] else "corrigé(s)"
+        self.stdout.write(self.style.SUCCESS(
+            f"{sessions} session(s) et {len(deltas)} utilisateur(s) {verb}."
+        ))
@@ -0,0 +1,82 @@
+import multiprocessing
+import signal
+import time
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections
+
+
+def _worker_loop(poll_interval, once):
+    # Démarrage par spawn / forkserver (macOS, Windows) : le processus fils
+    # n'importe que ce module, Django et les modèles y sont à initialiser
+    django.setup()
+    from backapp import ingest
+
+    # Chaque processus ouvre sa propre connexion à la base
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    while True:
+        job = ingest.claim_next_job()
+        if job is None:
+            if once:
+                return
+            time.sleep(poll_interval)
+            continue
+        try:
+            ingest.process_job(job)
+        except OperationalError:
+            # Base momentanément indisponible : le job sera repris plus tard
+            ingest.release_job(job)
+            time.sleep(poll_interval)
+        except Exception:
+            # Échec de l'enregistrement du résultat : le worker continue,
+            # le job est repris jusqu'à LIDAR_INGEST_MAX_ATTEMPTS tentatives
+            ingest.release_job(job)
+
+
+class Command(BaseCommand):
+    help = "Lance le pool de workers qui traite la file d'ingestion asynchrone (IngestJob)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int,
+            default=getattr(settings, 'LIDAR_INGEST_WORKERS', 2),
+            help="Nombre de processus workers (LIDAR_INGEST_WORKERS par défaut)",
+        )
+        parser.add_argument(
+            '--poll-interval', type=float,
+            default=getattr(settings, 'LIDAR_INGEST_POLL_INTERVAL', 1.0),
+            help="Attente (secondes) quand la file est vide",
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help="Traite les jobs en attente puis s'arrête",
+        )
+
+    def handle(self, *args, **options):
+        from backapp import ingest
+
+        requeued = ingest.requeue_interrupted_jobs()
+        if requeued:
+            self.stdout.write(f"{requeued} job(s) interrompu(s) remis en attente")
+
+        # Les connexions ne doivent pas être partagées avec les processus fils
+        connections.close_all()
+        workers = [
+            multiprocessing.Process(target=_worker_loop, args=(options['poll_interval'], options['once']))
+            for _ in range(max(1, options['workers']))
+        ]
+        for worker in workers:
+            worker.start()
+        self.stdout.write(self.style.SUCCESS(f"{len(workers)} worker(s) d'ingestion démarré(s)"))
+
+        try:
+            for worker in workers:
+                worker.join()
+        except KeyboardInterrupt:
+            for worker in workers:
+                worker.terminate()
+            for worker in workers:
+                worker.join()
+        self.stdout.write("Workers arrêtés")
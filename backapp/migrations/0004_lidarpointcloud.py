@@ -0,0 +1,124 @@
+# Generated by Django 5.2.5 on 2026-10-17 18:32
+
+import django.db.models.deletion
+import numpy as np
+from django.conf import settings
+from django.db import migrations, models
+
+# Copie figée de backapp.pointcloud au moment de la migration : le module
+# peut évoluer, la migration doit toujours relire les mêmes données.
+AXES = ('x', 'y', 'z', 't')
+POINT_KEYS = ('x', 'y', 'z', 'timestamp_sec')
+TIMESTAMP_DTYPE = np.dtype('<f8')
+
+
+def coord_dtype(name=None):
+    name = name or getattr(settings, 'LIDAR_COORD_DTYPE', 'float32')
+    return np.dtype(name).newbyteorder('<')
+
+
+def _as_float(value):
+    if value is None:
+        return np.nan
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def points_to_arrays(points):
+    rows = [
+        tuple(_as_float(p.get(key)) for key in POINT_KEYS) if isinstance(p, dict) else (np.nan,) * 4
+        for p in points
+    ]
+    matrix = np.array(rows, dtype=np.float64).reshape(-1, 4)
+    xyz = coord_dtype()
+    return {
+        'x': np.ascontiguousarray(matrix[:, 0], dtype=xyz),
+        'y': np.ascontiguousarray(matrix[:, 1], dtype=xyz),
+        'z': np.ascontiguousarray(matrix[:, 2], dtype=xyz),
+        't': np.ascontiguousarray(matrix[:, 3], dtype=TIMESTAMP_DTYPE),
+    }
+
+
+def _to_python(column):
+    # float32 -> représentation la plus courte ("1.1" et non 1.100000023841858)
+    if column.dtype.itemsize == 4:
+        column = column.astype(str).astype(np.float64)
+    return [None if v != v else v for v in column.tolist()]
+
+
+def arrays_to_points(arrays):
+    xs, ys, zs, ts = (_to_python(arrays[axis]) for axis in AXES)
+    return [
+        {'x': x, 'y': y, 'z': z, 'timestamp_sec': t}
+        for x, y, z, t in zip(xs, ys, zs, ts)
+    ]
+
+
+def pack_existing_points(apps, schema_editor):
+    """Déplace json_data['lidar_data'] des sessions existantes vers LidarPointCloud."""
+    Session = apps.get_model('backapp', 'ProfilometreLidarData')
+    LidarPointCloud = apps.get_model('backapp', 'LidarPointCloud')
+    for session in Session.objects.iterator(chunk_size=100):
+        json_data = dict(session.json_data or {})
+        points = json_data.pop('lidar_data', None)
+        if points is None:
+            continue
+        arrays = points_to_arrays(points if isinstance(points, list) else [])
+        LidarPointCloud.objects.create(
+            session=session,
+            point_count=len(arrays['t']),
+            coord_dtype=arrays['x'].dtype.name,
+            **{axis: np.ascontiguousarray(arrays[axis]).tobytes() for axis in AXES}
+        )
+        Session.objects.filter(pk=session.pk).update(json_data=json_data)
+
+
+def unpack_points(apps, schema_editor):
+    """Retour arrière : remet les points des nuages dans json_data['lidar_data']."""
+    Session = apps.get_model('backapp', 'ProfilometreLidarData')
+    LidarPointCloud = apps.get_model('backapp', 'LidarPointCloud')
+    for cloud in LidarPointCloud.objects.select_related('session').iterator(chunk_size=100):
+        dtype = coord_dtype(cloud.coord_dtype)
+        arrays = {
+            axis: np.frombuffer(bytes(getattr(cloud, axis)), dtype=TIMESTAMP_DTYPE if axis == 't' else dtype)
+            for axis in AXES
+        }
+        json_data = dict(cloud.session.json_data or {})
+        json_data['lidar_data'] = arrays_to_points(arrays)
+        Session.objects.filter(pk=cloud.session_id).update(json_data=json_data)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backapp', '0003_remove_datasession_device_remove_sensordata_session_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='profilometrelidardata',
+            name='json_data',
+            field=models.JSONField(help_text='Données profilomètre + metadata (lidar_data est extrait vers LidarPointCloud)'),
+        ),
+        migrations.CreateModel(
+            name='LidarPointCloud',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('point_count', models.PositiveIntegerField(default=0)),
+                ('coord_dtype', models.CharField(default='float32', max_length=10)),
+                ('x', models.BinaryField()),
+                ('y', models.BinaryField()),
+                ('z', models.BinaryField()),
+                ('t', models.BinaryField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('session', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='point_cloud', to='backapp.profilometrelidardata')),
+            ],
+            options={
+                'verbose_name': 'Nuage de points LiDAR',
+                'verbose_name_plural': 'Nuages de points LiDAR',
+            },
+        ),
+        migrations.RunPython(pack_existing_points, unpack_points),
+    ]
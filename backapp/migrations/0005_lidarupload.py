@@ -0,0 +1,58 @@
+# Generated by Django 5.2.5 on 2026-10-17 18:34
+
+import backapp.pointcloud
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backapp', '0004_lidarpointcloud'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LidarUpload',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('session_id', models.CharField(max_length=200, unique=True)),
+                ('user_id', models.CharField(db_index=True, max_length=150)),
+                ('timestamp', models.DateTimeField(default=django.utils.timezone.now)),
+                ('json_data', models.JSONField(blank=True, default=dict)),
+                ('total_chunks', models.PositiveIntegerField(blank=True, null=True)),
+                ('coord_dtype', models.CharField(default='float32', max_length=10)),
+                ('stats', models.JSONField(blank=True, default=backapp.pointcloud.empty_stats)),
+                ('status', models.CharField(choices=[('open', 'En cours'), ('finalized', 'Finalisé')], default='open', max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('lidar_session', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='upload', to='backapp.profilometrelidardata')),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lidar_uploads', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Upload LiDAR fractionné',
+                'verbose_name_plural': 'Uploads LiDAR fractionnés',
+            },
+        ),
+        migrations.CreateModel(
+            name='LidarUploadChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('index', models.PositiveIntegerField()),
+                ('point_count', models.PositiveIntegerField(default=0)),
+                ('x', models.BinaryField()),
+                ('y', models.BinaryField()),
+                ('z', models.BinaryField()),
+                ('t', models.BinaryField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('upload', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chunks', to='backapp.lidarupload')),
+            ],
+            options={
+                'ordering': ['index'],
+                'constraints': [models.UniqueConstraint(fields=('upload', 'index'), name='unique_upload_chunk_index')],
+            },
+        ),
+    ]
@@ -0,0 +1,139 @@
+# Generated by Django 5.2.5 on 2026-10-17 18:36
+
+import numpy as np
+from django.conf import settings
+from django.db import migrations, models
+
+# Copie figée des calculs de backapp.pointcloud au moment de la migration
+TIMESTAMP_DTYPE = np.dtype('<f8')
+
+
+def coord_dtype(name=None):
+    name = name or getattr(settings, 'LIDAR_COORD_DTYPE', 'float32')
+    return np.dtype(name).newbyteorder('<')
+
+
+def unpack(blob, dtype):
+    if blob is None:
+        return np.empty(0, dtype=dtype)
+    return np.frombuffer(blob, dtype=dtype)
+
+
+def derived_fields(arrays):
+    """Champs dérivés d'un nuage (cf. pointcloud.compute_stats / derived_fields)."""
+    t = arrays['t']
+    valid_t = t[~np.isnan(t)]
+    fields = {
+        'has_lidar_data': t.size > 0,
+        'lidar_point_count': int(t.size),
+        'lidar_capture_duration_sec': None,
+        'sampling_rate_hz': None,
+    }
+    if valid_t.size >= 2:
+        duration = float(valid_t.max() - valid_t.min())
+        fields['lidar_capture_duration_sec'] = duration
+        if duration > 0:
+            fields['sampling_rate_hz'] = (valid_t.size - 1) / duration
+
+    xyz = np.column_stack((arrays['x'], arrays['y'], arrays['z'])).astype(np.float64, copy=False)
+    xyz = xyz[np.isfinite(xyz).all(axis=1)]
+    if xyz.size:
+        (x_min, y_min, z_min), (x_max, y_max, z_max) = xyz.min(axis=0).tolist(), xyz.max(axis=0).tolist()
+        x_mean, y_mean, z_mean = xyz.mean(axis=0).tolist()
+        z_std = float(np.sqrt(np.square(xyz[:, 2] - z_mean).sum() / xyz.shape[0]))
+    else:
+        x_min = y_min = z_min = x_max = y_max = z_max = x_mean = y_mean = z_mean = z_std = None
+    fields.update({
+        'bbox_min_x': x_min,
+        'bbox_max_x': x_max,
+        'bbox_min_y': y_min,
+        'bbox_max_y': y_max,
+        'z_min': z_min,
+        'z_max': z_max,
+        'centroid_x': x_mean,
+        'centroid_y': y_mean,
+        'z_mean': z_mean,
+        'z_std': z_std,
+    })
+    return fields
+
+
+def compute_existing_metrics(apps, schema_editor):
+    """Calcule les nouvelles métriques des sessions déjà enregistrées."""
+    Session = apps.get_model('backapp', 'ProfilometreLidarData')
+    LidarPointCloud = apps.get_model('backapp', 'LidarPointCloud')
+    for cloud in LidarPointCloud.objects.iterator(chunk_size=100):
+        dtype = coord_dtype(cloud.coord_dtype)
+        arrays = {
+            'x': unpack(cloud.x, dtype),
+            'y': unpack(cloud.y, dtype),
+            'z': unpack(cloud.z, dtype),
+            't': unpack(cloud.t, TIMESTAMP_DTYPE),
+        }
+        Session.objects.filter(pk=cloud.session_id).update(**derived_fields(arrays))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backapp', '0005_lidarupload'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profilometrelidardata',
+            name='bbox_max_x',
+            field=models.FloatField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='profilometrelidardata',
+            name='bbox_max_y',
+            field=models.FloatField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='profilometrelidardata',
+            name='bbox_min_x',
+            field=models.FloatField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='profilometrelidardata',
+            name='bbox_min_y',
+            field=models.FloatField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='profilometrelidardata',
+            name='centroid_x',
+            field=models.FloatField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='profilometrelidardata',
+            name='centroid_y',
+            field=models.FloatField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='profilometrelidardata',
+            name='sampling_rate_hz',
+            field=models.FloatField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='profilometrelidardata',
+            name='z_max',
+            field=models.FloatField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='profilometrelidardata',
+            name='z_mean',
+            field=models.FloatField(blank=True, db_index=True, help_text='Moyenne de z (z du centroïde)', null=True),
+        ),
+        migrations.AddField(
+            model_name='profilometrelidardata',
+            name='z_min',
+            field=models.FloatField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='profilometrelidardata',
+            name='z_std',
+            field=models.FloatField(blank=True, db_index=True, null=True),
+        ),
+        migrations.RunPython(compute_existing_metrics, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-17 18:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backapp', '0007_ingestjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingestjob',
+            name='content_encoding',
+            field=models.CharField(blank=True, max_length=20),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.5 on 2026-10-17 18:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backapp', '0008_ingestjob_content_encoding'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LidarSpatialIndex',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('voxel_size', models.FloatField()),
+                ('origin_x', models.FloatField()),
+                ('origin_y', models.FloatField()),
+                ('origin_z', models.FloatField()),
+                ('nx', models.PositiveIntegerField()),
+                ('ny', models.PositiveIntegerField()),
+                ('nz', models.PositiveIntegerField()),
+                ('cell_count', models.PositiveIntegerField(default=0)),
+                ('point_count', models.PositiveIntegerField(default=0)),
+                ('cell_keys', models.BinaryField()),
+                ('cell_offsets', models.BinaryField()),
+                ('records', models.BinaryField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('cloud', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='spatial_index', to='backapp.lidarpointcloud')),
+            ],
+            options={
+                'verbose_name': 'Index spatial LiDAR',
+                'verbose_name_plural': 'Index spatiaux LiDAR',
+            },
+        ),
+    ]
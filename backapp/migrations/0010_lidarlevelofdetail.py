@@ -0,0 +1,37 @@
+# Generated by Django 5.2.5 on 2026-10-17 18:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backapp', '0009_lidarspatialindex'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LidarLevelOfDetail',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('point_count', models.PositiveIntegerField(default=0)),
+                ('coord_dtype', models.CharField(default='float32', max_length=10)),
+                ('x', models.BinaryField()),
+                ('y', models.BinaryField()),
+                ('z', models.BinaryField()),
+                ('t', models.BinaryField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('level', models.PositiveSmallIntegerField()),
+                ('target_points', models.PositiveIntegerField()),
+                ('voxel_size', models.FloatField(blank=True, null=True)),
+                ('cloud', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='levels', to='backapp.lidarpointcloud')),
+            ],
+            options={
+                'verbose_name': 'Niveau de détail LiDAR',
+                'verbose_name_plural': 'Niveaux de détail LiDAR',
+                'ordering': ['level'],
+                'constraints': [models.UniqueConstraint(fields=('cloud', 'level'), name='unique_lidar_lod_level')],
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.5 on 2026-10-17 18:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backapp', '0010_lidarlevelofdetail'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IriAnalysis',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('segment_length', models.FloatField()),
+                ('sample_interval', models.FloatField()),
+                ('length_m', models.FloatField()),
+                ('iri', models.FloatField(db_index=True)),
+                ('segments', models.JSONField(default=list)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('cloud', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='iri_analyses', to='backapp.lidarpointcloud')),
+            ],
+            options={
+                'verbose_name': 'Analyse IRI',
+                'verbose_name_plural': 'Analyses IRI',
+                'constraints': [models.UniqueConstraint(fields=('cloud', 'segment_length', 'sample_interval'), name='unique_iri_analysis')],
+            },
+        ),
+    ]
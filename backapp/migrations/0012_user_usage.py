@@ -0,0 +1,64 @@
+# Generated by Django 5.2.5 on 2026-10-17 18:49
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import Coalesce, Length
+
+
+def build_user_usage(apps, schema_editor):
+    """Taille des nuages existants, puis cumuls par utilisateur."""
+    Session = apps.get_model('backapp', 'ProfilometreLidarData')
+    LidarPointCloud = apps.get_model('backapp', 'LidarPointCloud')
+    UserUsage = apps.get_model('backapp', 'UserUsage')
+    sizes = LidarPointCloud.objects.annotate(
+        nbytes=Length('x') + Length('y') + Length('z') + Length('t')
+    ).values_list('session_id', 'nbytes')
+    for session_id, nbytes in sizes.iterator():
+        Session.objects.filter(pk=session_id).update(stored_bytes=nbytes or 0)
+
+    rows = Session.objects.order_by().values('user_id').annotate(
+        session_count=Count('id'),
+        point_count=Coalesce(Sum('lidar_point_count'), 0),
+        capture_duration_sec=Coalesce(Sum('lidar_capture_duration_sec'), 0.0),
+        distance=Coalesce(Sum('distance'), 0.0),
+        stored_bytes=Coalesce(Sum('stored_bytes'), 0),
+    )
+    UserUsage.objects.bulk_create(UserUsage(**row) for row in rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backapp', '0011_iri_analysis'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserUsage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.CharField(max_length=150, unique=True)),
+                ('session_count', models.PositiveIntegerField(default=0)),
+                ('point_count', models.BigIntegerField(default=0)),
+                ('capture_duration_sec', models.FloatField(default=0.0)),
+                ('distance', models.FloatField(default=0.0)),
+                ('stored_bytes', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': "Cumuls d'utilisation",
+                'verbose_name_plural': "Cumuls d'utilisation",
+            },
+        ),
+        migrations.AddField(
+            model_name='profilometrelidardata',
+            name='distance',
+            field=models.FloatField(blank=True, help_text="Distance déclarée par l'appareil (même unité que Subscription.max_distance)", null=True),
+        ),
+        migrations.AddField(
+            model_name='profilometrelidardata',
+            name='stored_bytes',
+            field=models.BigIntegerField(default=0, help_text='Taille du nuage de points stocké (octets)'),
+        ),
+        migrations.RunPython(build_user_usage, migrations.RunPython.noop),
+    ]
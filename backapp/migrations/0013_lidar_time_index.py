@@ -0,0 +1,85 @@
+# Generated by Django 5.2.5 on 2026-10-17 18:54
+
+import numpy as np
+from django.conf import settings
+from django.db import migrations, models
+
+# Copie figée des outils de backapp.pointcloud au moment de la migration
+AXES = ('x', 'y', 'z', 't')
+TIMESTAMP_DTYPE = np.dtype('<f8')
+
+
+def coord_dtype(name=None):
+    name = name or getattr(settings, 'LIDAR_COORD_DTYPE', 'float32')
+    return np.dtype(name).newbyteorder('<')
+
+
+def unpack(blob, dtype):
+    if blob is None:
+        return np.empty(0, dtype=dtype)
+    return np.frombuffer(blob, dtype=dtype)
+
+
+def sort_by_time(arrays):
+    """Colonnes triées par timestamp (tri stable, timestamps absents en fin)."""
+    t = arrays['t']
+    timed = int(np.count_nonzero(~np.isnan(t)))
+    if not np.isnan(t[:timed]).any() and not (np.diff(t[:timed]) < 0).any():
+        return arrays
+    order = np.argsort(t, kind='stable')
+    return {axis: np.ascontiguousarray(arrays[axis][order]) for axis in AXES}
+
+
+def time_index(t):
+    stride = getattr(settings, 'LIDAR_TIME_INDEX_STRIDE', 1024)
+    timed = int(np.count_nonzero(~np.isnan(t)))
+    return np.ascontiguousarray(t[:timed:stride], dtype=TIMESTAMP_DTYPE), timed, stride
+
+
+def sort_existing_clouds(apps, schema_editor):
+    """Range les nuages existants par timestamp et construit leur index temporel."""
+    LidarPointCloud = apps.get_model('backapp', 'LidarPointCloud')
+    LidarSpatialIndex = apps.get_model('backapp', 'LidarSpatialIndex')
+    for cloud in LidarPointCloud.objects.iterator(chunk_size=100):
+        dtype = coord_dtype(cloud.coord_dtype)
+        arrays = {
+            'x': unpack(cloud.x, dtype),
+            'y': unpack(cloud.y, dtype),
+            'z': unpack(cloud.z, dtype),
+            't': unpack(cloud.t, TIMESTAMP_DTYPE),
+        }
+        ordered = sort_by_time(arrays)
+        if ordered is not arrays:
+            for axis in AXES:
+                setattr(cloud, axis, np.ascontiguousarray(ordered[axis]).tobytes())
+            # Les positions des points ont changé : l'index spatial sera reconstruit
+            LidarSpatialIndex.objects.filter(cloud=cloud).delete()
+        samples, cloud.timed_count, cloud.time_index_stride = time_index(ordered['t'])
+        cloud.time_index = samples.tobytes()
+        cloud.save()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backapp', '0012_user_usage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lidarpointcloud',
+            name='time_index',
+            field=models.BinaryField(default=b''),
+        ),
+        migrations.AddField(
+            model_name='lidarpointcloud',
+            name='time_index_stride',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='lidarpointcloud',
+            name='timed_count',
+            field=models.PositiveIntegerField(default=0, help_text='Points horodatés (en tête du nuage)'),
+        ),
+        migrations.RunPython(sort_existing_clouds, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-17 18:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backapp', '0013_lidar_time_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingestjob',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='profilometrelidardata',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, help_text="SHA-256 du corps de l'envoi : un renvoi identique reçoit la réponse d'origine", max_length=64, null=True),
+        ),
+    ]
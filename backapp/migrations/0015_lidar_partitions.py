@@ -0,0 +1,80 @@
+# Generated by Django 5.2.5 on 2026-10-17 18:58
+
+import datetime
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+
+def partition_key(moment):
+    """Clé de partition mensuelle d'une date : "AAAA-MM" (UTC), cf. archive.partition_key."""
+    if isinstance(moment, datetime.datetime) and timezone.is_aware(moment):
+        moment = moment.astimezone(datetime.timezone.utc)
+    return f"{moment.year:04d}-{moment.month:02d}"
+
+
+def fill_partitions(apps, schema_editor):
+    """Clé de partition mensuelle des sessions existantes et volumétrie par mois."""
+    ProfilometreLidarData = apps.get_model('backapp', 'ProfilometreLidarData')
+    LidarPartition = apps.get_model('backapp', 'LidarPartition')
+    batch = []
+    for session in ProfilometreLidarData.objects.only('id', 'timestamp').iterator(chunk_size=1000):
+        session.partition = partition_key(session.timestamp)
+        batch.append(session)
+        if len(batch) >= 1000:
+            ProfilometreLidarData.objects.bulk_update(batch, ['partition'])
+            batch = []
+    ProfilometreLidarData.objects.bulk_update(batch, ['partition'])
+
+    rows = ProfilometreLidarData.objects.order_by().values('partition').annotate(
+        session_count=Count('id'),
+        point_count=Coalesce(Sum('lidar_point_count'), 0),
+        stored_bytes=Coalesce(Sum('stored_bytes'), 0),
+    )
+    LidarPartition.objects.bulk_create([LidarPartition(key=row.pop('partition'), **row) for row in rows])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backapp', '0014_content_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LidarPartition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=7, unique=True)),
+                ('status', models.CharField(choices=[('active', 'Active'), ('archived', 'Archivée')], default='active', max_length=10)),
+                ('session_count', models.PositiveIntegerField(default=0)),
+                ('point_count', models.BigIntegerField(default=0)),
+                ('stored_bytes', models.BigIntegerField(default=0, help_text='Taille des nuages non compressés (octets)')),
+                ('archived_bytes', models.BigIntegerField(default=0, help_text="Taille du fichier d'archive (octets)")),
+                ('archived_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Partition LiDAR',
+                'verbose_name_plural': 'Partitions LiDAR',
+                'ordering': ['key'],
+            },
+        ),
+        migrations.AddField(
+            model_name='lidarpointcloud',
+            name='archive_partition',
+            field=models.CharField(blank=True, default='', help_text="Partition (AAAA-MM) dont l'archive contient les colonnes ; vide = colonnes en base", max_length=7),
+        ),
+        migrations.AddField(
+            model_name='profilometrelidardata',
+            name='partition',
+            field=models.CharField(db_index=True, default='', editable=False, help_text='Mois de la capture (AAAA-MM, UTC) : partition de rétention (cf. LidarPartition)', max_length=7),
+        ),
+        migrations.AddIndex(
+            model_name='profilometrelidardata',
+            index=models.Index(fields=['partition', 'user_id'], name='backapp_pro_partiti_290462_idx'),
+        ),
+        migrations.RunPython(fill_partitions, migrations.RunPython.noop),
+    ]
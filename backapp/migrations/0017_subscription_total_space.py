@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-17 19:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backapp', '0016_lidar_point_files'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='subscription',
+            name='total_space',
+            field=models.BigIntegerField(blank=True, help_text='Quota de stockage des nuages de points (octets) ; vide = illimité', null=True),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.5 on 2026-10-17 19:08
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backapp', '0017_subscription_total_space'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='vente',
+            index=models.Index(fields=['vendeur', 'date'], name='backapp_ven_vendeur_8f2982_idx'),
+        ),
+    ]
@@ -0,0 +1,112 @@
+# Generated by Django 5.2.5 on 2026-10-17 19:09
+
+import sqlite3
+import zlib
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Sum
+from django.db.models.functions import Coalesce
+
+# Copie figée des lecteurs (base, archive, fichiers) et du calcul de trajet
+# de backapp.pointcloud / archive / pointfiles au moment de la migration
+AXES = ('x', 'y', 'z', 't')
+TIMESTAMP_DTYPE = np.dtype('<f8')
+
+
+def coord_dtype(name=None):
+    name = name or getattr(settings, 'LIDAR_COORD_DTYPE', 'float32')
+    return np.dtype(name).newbyteorder('<')
+
+
+def _archived_columns(key, cloud_id):
+    directory = getattr(settings, 'LIDAR_ARCHIVE_DIR', Path(settings.BASE_DIR) / 'lidar_archive')
+    path = Path(directory) / f"lidar-{key}.sqlite3"
+    if not path.exists():
+        raise FileNotFoundError(f"Archive introuvable : {path}")
+    connection = sqlite3.connect(path)
+    try:
+        row = connection.execute("SELECT x, y, z, t FROM clouds WHERE id = ?", (cloud_id,)).fetchone()
+    finally:
+        connection.close()
+    if row is None:
+        raise LookupError(f"Nuage {cloud_id} absent de l'archive {key}")
+    return {axis: zlib.decompress(blob) for axis, blob in zip(AXES, row)}
+
+
+def _cloud_arrays(cloud):
+    if cloud.file_path:
+        directory = Path(getattr(settings, 'LIDAR_POINT_DATA_DIR', Path(settings.BASE_DIR) / 'lidar_points'))
+        return {axis: np.load(directory / cloud.file_path / f"{axis}.npy", mmap_mode='r') for axis in AXES}
+    dtype = coord_dtype(cloud.coord_dtype)
+    if cloud.archive_partition:
+        columns = _archived_columns(cloud.archive_partition, cloud.pk)
+    else:
+        columns = {axis: getattr(cloud, axis) for axis in AXES}
+    return {
+        axis: np.frombuffer(columns[axis] or b'', dtype=TIMESTAMP_DTYPE if axis == 't' else dtype)
+        for axis in AXES
+    }
+
+
+def trajectory_length(arrays):
+    """Longueur du trajet (m), cf. pointcloud.trajectory_length."""
+    axes = ('x', 'y', 'z') if getattr(settings, 'LIDAR_TRAJECTORY_3D', False) else ('x', 'y')
+    t = np.asarray(arrays['t'], dtype=np.float64)
+    coords = [np.asarray(arrays[axis], dtype=np.float64) for axis in axes]
+    valid = ~np.isnan(t)
+    for column in coords:
+        valid &= np.isfinite(column)
+    t = t[valid]
+    coords = [column[valid] for column in coords]
+    if t.size < 2:
+        return 0.0
+    if (np.diff(t) < 0).any():
+        order = np.argsort(t, kind='stable')
+        t, coords = t[order], [column[order] for column in coords]
+    steps = np.sqrt(sum(np.square(np.diff(column)) for column in coords))
+    max_gap = getattr(settings, 'LIDAR_TRAJECTORY_MAX_GAP_SEC', 2.0)
+    if max_gap:
+        steps = steps[np.diff(t) <= max_gap]
+    return float(steps.sum())
+
+
+def compute_travelled_distance(apps, schema_editor):
+    """Distance parcourue des sessions existantes, puis cumuls de distance par utilisateur."""
+    ProfilometreLidarData = apps.get_model('backapp', 'ProfilometreLidarData')
+    LidarPointCloud = apps.get_model('backapp', 'LidarPointCloud')
+    UserUsage = apps.get_model('backapp', 'UserUsage')
+    unit = getattr(settings, 'LIDAR_DISTANCE_UNIT_M', 1000.0)
+    for cloud in LidarPointCloud.objects.iterator(chunk_size=100):
+        travelled = trajectory_length(_cloud_arrays(cloud))
+        ProfilometreLidarData.objects.filter(pk=cloud.session_id).update(
+            travelled_distance=travelled, distance=travelled / unit
+        )
+    for usage in UserUsage.objects.all():
+        usage.distance = ProfilometreLidarData.objects.filter(user_id=usage.user_id).aggregate(
+            total=Coalesce(Sum('distance'), 0.0)
+        )['total']
+        usage.save(update_fields=['distance'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backapp', '0018_vente_date_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profilometrelidardata',
+            name='travelled_distance',
+            field=models.FloatField(blank=True, db_index=True, help_text="Longueur du trajet calculée à partir des points à l'enregistrement (m)", null=True),
+        ),
+        migrations.AlterField(
+            model_name='profilometrelidardata',
+            name='distance',
+            field=models.FloatField(blank=True, help_text="Distance de la session (même unité que Subscription.max_distance) : calculée à partir des points, ou déclarée par l'appareil pour une session sans points", null=True),
+        ),
+        migrations.RunPython(compute_travelled_distance, migrations.RunPython.noop),
+    ]
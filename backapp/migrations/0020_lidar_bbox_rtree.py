@@ -0,0 +1,44 @@
+# Generated by Django 5.2.5 on 2026-10-17 19:40
+
+from django.db import migrations
+
+# SQL figé de backapp.bboxindex au moment de la migration
+TABLE = 'backapp_lidar_bbox_rtree'
+
+
+def create_index(apps, schema_editor):
+    """Table R*Tree des emprises (SQLite seulement), remplie à partir des sessions existantes."""
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+    sessions_table = apps.get_model('backapp', 'ProfilometreLidarData')._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING rtree(id, min_x, max_x, min_y, max_y, min_t, max_t)"
+        )
+        cursor.execute(
+            f"INSERT INTO {TABLE} "
+            f"SELECT id, bbox_min_x, bbox_max_x, bbox_min_y, bbox_max_y, "
+            f"CAST(strftime('%%s', timestamp) AS REAL), CAST(strftime('%%s', timestamp) AS REAL) "
+            f"FROM {sessions_table} "
+            f"WHERE bbox_min_x IS NOT NULL AND bbox_max_x IS NOT NULL "
+            f"AND bbox_min_y IS NOT NULL AND bbox_max_y IS NOT NULL",
+            [],
+        )
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backapp', '0019_travelled_distance'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.5 on 2026-10-17 19:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backapp', '0020_lidar_bbox_rtree'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeDetection',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cell_size', models.FloatField()),
+                ('threshold', models.FloatField(help_text='Écart (m) au-delà duquel une cellule compte comme modifiée')),
+                ('compared_points', models.PositiveIntegerField(default=0)),
+                ('matched_points', models.PositiveIntegerField(default=0)),
+                ('cell_count', models.PositiveIntegerField(default=0)),
+                ('changed_cells', models.PositiveIntegerField(default=0)),
+                ('mean_delta', models.FloatField(blank=True, null=True)),
+                ('median_delta', models.FloatField(blank=True, null=True)),
+                ('std_delta', models.FloatField(blank=True, null=True)),
+                ('rmse', models.FloatField(blank=True, null=True)),
+                ('min_delta', models.FloatField(blank=True, null=True)),
+                ('max_delta', models.FloatField(blank=True, null=True)),
+                ('cells', models.BinaryField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('compared', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='changes_as_compared', to='backapp.lidarpointcloud')),
+                ('reference', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='changes_as_reference', to='backapp.lidarpointcloud')),
+            ],
+            options={
+                'verbose_name': 'Détection de changements',
+                'verbose_name_plural': 'Détections de changements',
+                'constraints': [models.UniqueConstraint(fields=('reference', 'compared', 'cell_size', 'threshold'), name='unique_change_detection')],
+            },
+        ),
+    ]
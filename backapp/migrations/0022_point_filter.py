@@ -0,0 +1,42 @@
+# Generated by Django 5.2.5 on 2026-10-17 19:18
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backapp', '0021_change_detection'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profilometrelidardata',
+            name='point_filter',
+            field=models.JSONField(blank=True, help_text="Filtrage à l'ingestion (cf. pointfilter.py) : paramètres, points bruts, points retirés par étape, z lissés ; null = points enregistrés tels que reçus", null=True),
+        ),
+        migrations.AlterField(
+            model_name='profilometrelidardata',
+            name='stored_bytes',
+            field=models.BigIntegerField(default=0, help_text='Taille des nuages de points stockés (octets), points bruts conservés compris'),
+        ),
+        migrations.CreateModel(
+            name='LidarRawPointCloud',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('point_count', models.PositiveIntegerField(default=0)),
+                ('coord_dtype', models.CharField(default='float32', max_length=10)),
+                ('x', models.BinaryField()),
+                ('y', models.BinaryField()),
+                ('z', models.BinaryField()),
+                ('t', models.BinaryField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('session', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='raw_point_cloud', to='backapp.profilometrelidardata')),
+            ],
+            options={
+                'verbose_name': 'Points bruts LiDAR',
+                'verbose_name_plural': 'Points bruts LiDAR',
+            },
+        ),
+    ]
@@ -0,0 +1,105 @@
+# Generated by Django 5.2.5 on 2026-10-17 19:25
+
+import datetime
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+# Copie figée du regroupement de backapp.routes au moment de la migration
+SESSION_FIELDS = (
+    'id', 'timestamp', 'lidar_capture_duration_sec', 'lidar_point_count', 'travelled_distance',
+    'bbox_min_x', 'bbox_max_x', 'bbox_min_y', 'bbox_max_y',
+)
+
+
+def session_end(row):
+    return row['timestamp'] + datetime.timedelta(seconds=row['lidar_capture_duration_sec'] or 0.0)
+
+
+def split_groups(rows, gap):
+    """Sessions triées par timestamp regroupées en trajets, cf. routes.group_sessions."""
+    groups, group_end = [], None
+    for row in rows:
+        end = session_end(row)
+        if group_end is None or not group_end <= row['timestamp'] <= group_end + gap:
+            groups.append([])
+            group_end = end
+        groups[-1].append(row)
+        group_end = max(group_end, end)
+    return groups
+
+
+def summarize(group):
+    def bound(field, pick):
+        values = [row[field] for row in group if row[field] is not None]
+        return pick(values) if values else None
+
+    distances = [row['travelled_distance'] for row in group if row['travelled_distance'] is not None]
+    return {
+        'start': group[0]['timestamp'],
+        'end': max(session_end(row) for row in group),
+        'session_count': len(group),
+        'point_count': sum(row['lidar_point_count'] or 0 for row in group),
+        'travelled_distance': sum(distances) if distances else None,
+        'bbox_min_x': bound('bbox_min_x', min),
+        'bbox_max_x': bound('bbox_max_x', max),
+        'bbox_min_y': bound('bbox_min_y', min),
+        'bbox_max_y': bound('bbox_max_y', max),
+    }
+
+
+def group_sessions(apps, schema_editor):
+    """Trajets des sessions existantes (écart LIDAR_ROUTE_MAX_GAP_SEC)."""
+    Session = apps.get_model('backapp', 'ProfilometreLidarData')
+    Route = apps.get_model('backapp', 'Route')
+    gap = datetime.timedelta(seconds=getattr(settings, 'LIDAR_ROUTE_MAX_GAP_SEC', 300))
+    per_user = {}
+    rows = Session.objects.order_by('user_id', 'timestamp', 'pk').values('user_id', *SESSION_FIELDS)
+    for row in rows.iterator():
+        per_user.setdefault(row['user_id'], []).append(row)
+    for user_id, sessions in per_user.items():
+        for group in split_groups(sessions, gap):
+            route = Route.objects.create(user_id=user_id, **summarize(group))
+            Session.objects.filter(pk__in=[row['id'] for row in group]).update(route=route)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backapp', '0022_point_filter'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Route',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.CharField(db_index=True, max_length=150)),
+                ('start', models.DateTimeField(db_index=True, help_text='Début de la première session')),
+                ('end', models.DateTimeField(db_index=True, help_text='Fin de la dernière session (timestamp + durée de capture)')),
+                ('session_count', models.PositiveIntegerField(default=0)),
+                ('point_count', models.BigIntegerField(default=0)),
+                ('travelled_distance', models.FloatField(blank=True, help_text='Somme des distances parcourues (m)', null=True)),
+                ('bbox_min_x', models.FloatField(blank=True, null=True)),
+                ('bbox_max_x', models.FloatField(blank=True, null=True)),
+                ('bbox_min_y', models.FloatField(blank=True, null=True)),
+                ('bbox_max_y', models.FloatField(blank=True, null=True)),
+                ('version', models.PositiveIntegerField(default=1, help_text='Incrémentée à chaque changement : invalide les caches')),
+                ('analytics', models.JSONField(blank=True, default=dict, help_text='Analyses du trajet ({clé: résultat})')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Trajet LiDAR',
+                'verbose_name_plural': 'Trajets LiDAR',
+                'ordering': ['-start'],
+                'indexes': [models.Index(fields=['user_id', 'start'], name='backapp_rou_user_id_e908d0_idx')],
+            },
+        ),
+        migrations.AddField(
+            model_name='profilometrelidardata',
+            name='route',
+            field=models.ForeignKey(blank=True, editable=False, help_text='Trajet continu dont la session fait partie (cf. Route)', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='sessions', to='backapp.route'),
+        ),
+        migrations.RunPython(group_sessions, migrations.RunPython.noop),
+    ]
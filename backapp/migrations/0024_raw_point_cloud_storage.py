@@ -0,0 +1,28 @@
+# Generated by Django 5.2.5 on 2026-10-17 19:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backapp', '0023_routes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lidarrawpointcloud',
+            name='archive_partition',
+            field=models.CharField(blank=True, default='', help_text="Partition (AAAA-MM) dont l'archive contient les colonnes ; vide = colonnes en base", max_length=7),
+        ),
+        migrations.AddField(
+            model_name='lidarrawpointcloud',
+            name='checksum',
+            field=models.CharField(blank=True, default='', help_text='SHA-256 des colonnes x, y, z, t', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='lidarrawpointcloud',
+            name='file_path',
+            field=models.CharField(blank=True, default='', help_text='Répertoire des colonnes .npy (relatif à LIDAR_POINT_DATA_DIR) ; vide = colonnes en base', max_length=100),
+        ),
+    ]
@@ -1,7 +1,17 @@
-from django.db import models
+from django.db import IntegrityError, models, router, transaction
 from django.contrib.auth.models import User
 from django.utils import timezone
 import json
+import os
+import uuid
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Case, Count, F, Q, Sum, Value, When
+from django.db.models.functions import Coalesce, Substr
+
+from . import archive, bboxindex, changes, pointcloud, pointfiles, pointfilter, roughness, routes, spatial
 
 # ---------------------------------------------------------
 # 1️⃣ PROFILS D’UTILISATEURS : VENDEUR & CLIENT
@@ -77,16 +87,91 @@ class Vente(models.Model):
 
     def __str__(self):
         return f"Vente de {self.quantite} x {self.device_model.nom} par {self.vendeur.user.username}"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['vendeur', 'date']),  # liste d'un vendeur, paginée par curseur
+        ]
     
     
 # models.py — version finale adaptée à votre format LiDAR (x,y,z)
 
+class ProfilometreLidarDataQuerySet(models.QuerySet):
+    def matching(self, user_id=None, start=None, end=None, bbox=None):
+        """
+        Filtres communs à la liste et aux exports : utilisateur, période
+        [start, end] sur timestamp, et bbox (min_x, min_y, max_x, max_y) qui
+        recoupe l'emprise de la session. La période est aussi traduite en
+        bornes de partition mensuelle (index partition, user_id) ; la bbox
+        passe par l'index R*Tree des emprises (cf. bboxindex.py) sous SQLite.
+        """
+        sessions = self
+        if user_id is not None:
+            sessions = sessions.filter(user_id=str(user_id))
+        if start is not None:
+            sessions = sessions.filter(partition__gte=archive.partition_key(start), timestamp__gte=start)
+        if end is not None:
+            sessions = sessions.filter(partition__lte=archive.partition_key(end), timestamp__lte=end)
+        if bbox is not None:
+            min_x, min_y, max_x, max_y = bbox
+            if bboxindex.enabled(self.db):
+                sessions = sessions.filter(pk__in=bboxindex.intersecting(bbox, start, end))
+            sessions = sessions.filter(
+                bbox_max_x__gte=min_x, bbox_min_x__lte=max_x,
+                bbox_max_y__gte=min_y, bbox_min_y__lte=max_y,
+            )
+        return sessions
+
+    def bulk_create(self, objs, *args, **kwargs):
+        """
+        bulk_create() n'appelle pas save() : l'extraction des champs dérivés
+        et l'insertion des nuages de points sont donc faites ici.
+        """
+        objs = list(objs)
+        for obj in objs:
+            obj.extract_fields()
+        with transaction.atomic(using=self.db, savepoint=False):
+            objs = super().bulk_create(objs, *args, **kwargs)
+            clouds = [cloud for cloud in (obj.take_pending_cloud() for obj in objs) if cloud is not None]
+            for cloud in clouds:
+                cloud.store_points()
+            LidarPointCloud.objects.using(self.db).bulk_create(clouds)
+            raw_clouds = [raw for raw in (obj.take_pending_raw() for obj in objs) if raw is not None]
+            for raw in raw_clouds:
+                raw.store_points()
+            LidarRawPointCloud.objects.using(self.db).bulk_create(raw_clouds)
+            bboxindex.sync(objs, using=self.db)
+            UserUsage.record([obj.usage_row() for obj in objs], using=self.db)
+            Route.regroup_rows([obj.route_row() for obj in objs], using=self.db)
+        return objs
+
+    def delete(self):
+        """
+        Suppression en masse : les cumuls par utilisateur (UserUsage) sont
+        décrémentés, les emprises retirées de l'index R*Tree, les fichiers
+        de points (mode fichier) effacés et les trajets touchés regroupés.
+        """
+        with transaction.atomic(using=self.db, savepoint=False):
+            totals = UserUsage.totals(self)
+            spans = list(self.order_by().values(*Route.SPAN_FIELDS))
+            if bboxindex.enabled(self.db):
+                bboxindex.remove(list(self.values_list('pk', flat=True)), using=self.db)
+            for model in (LidarPointCloud, LidarRawPointCloud):
+                model.discard_files(model.objects.using(self.db).filter(session__in=self), using=self.db)
+            result = super().delete()
+            for user_id, deltas in totals.items():
+                UserUsage.apply(user_id, {field: -value for field, value in deltas.items()}, using=self.db)
+            Route.regroup_rows(spans, using=self.db)
+        return result
+
+
 class ProfilometreLidarData(models.Model):
     """
     Modèle unique pour stocker :
     - Données JSON du Profilomètre (psychométriques, comportementales)
-    - Données LiDAR au format {x, y, z, timestamp_sec}
-    - Tout dans un seul JSON, avec extraction intelligente
+    - Données LiDAR reçues au format {x, y, z, timestamp_sec}, extraites
+      à l'enregistrement vers LidarPointCloud (stockage colonnaire)
+    - Le reste du JSON (profile_data, metadata), avec extraction intelligente
     """
     
     user_id = models.CharField(
@@ -107,9 +192,9 @@ class ProfilometreLidarData(models.Model):
         help_text="Date et heure de la capture (session)"
     )
     
-    # JSON principal : contient TOUT
+    # JSON principal : profilomètre + metadata (les points LiDAR sont dans point_cloud)
     json_data = models.JSONField(
-        help_text="Données complètes : profilomètre + lidar (format x,y,z) + metadata"
+        help_text="Données profilomètre + metadata (lidar_data est extrait vers LidarPointCloud)"
     )
     
     # Champs extraits pour requêtes rapides
@@ -117,29 +202,225 @@ class ProfilometreLidarData(models.Model):
     has_personality_data = models.BooleanField(default=False, db_index=True)
     lidar_point_count = models.IntegerField(default=0, db_index=True)
     lidar_capture_duration_sec = models.FloatField(null=True, blank=True)
+
+    # Métriques dérivées des points (calcul NumPy), indexées pour le filtrage
+    bbox_min_x = models.FloatField(null=True, blank=True, db_index=True)
+    bbox_max_x = models.FloatField(null=True, blank=True, db_index=True)
+    bbox_min_y = models.FloatField(null=True, blank=True, db_index=True)
+    bbox_max_y = models.FloatField(null=True, blank=True, db_index=True)
+    centroid_x = models.FloatField(null=True, blank=True, db_index=True)
+    centroid_y = models.FloatField(null=True, blank=True, db_index=True)
+    z_min = models.FloatField(null=True, blank=True, db_index=True)
+    z_max = models.FloatField(null=True, blank=True, db_index=True)
+    z_mean = models.FloatField(null=True, blank=True, db_index=True, help_text="Moyenne de z (z du centroïde)")
+    z_std = models.FloatField(null=True, blank=True, db_index=True)
+    sampling_rate_hz = models.FloatField(null=True, blank=True, db_index=True)
+
+    distance = models.FloatField(
+        null=True, blank=True,
+        help_text="Distance de la session (même unité que Subscription.max_distance) : calculée à partir "
+                  "des points, ou déclarée par l'appareil pour une session sans points"
+    )
+    travelled_distance = models.FloatField(
+        null=True, blank=True, db_index=True,
+        help_text="Longueur du trajet calculée à partir des points à l'enregistrement (m)"
+    )
+    content_hash = models.CharField(
+        max_length=64, null=True, blank=True, db_index=True,
+        help_text="SHA-256 du corps de l'envoi : un renvoi identique reçoit la réponse d'origine"
+    )
+    stored_bytes = models.BigIntegerField(
+        default=0, help_text="Taille des nuages de points stockés (octets), points bruts conservés compris"
+    )
+    point_filter = models.JSONField(
+        null=True, blank=True,
+        help_text="Filtrage à l'ingestion (cf. pointfilter.py) : paramètres, points bruts, points retirés "
+                  "par étape, z lissés ; null = points enregistrés tels que reçus"
+    )
+    partition = models.CharField(
+        max_length=7, default='', db_index=True, editable=False,
+        help_text="Mois de la capture (AAAA-MM, UTC) : partition de rétention (cf. LidarPartition)"
+    )
+    route = models.ForeignKey(
+        'Route', on_delete=models.SET_NULL, null=True, blank=True, editable=False, related_name='sessions',
+        help_text="Trajet continu dont la session fait partie (cf. Route)"
+    )
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
-    def save(self, *args, **kwargs):
-        # Extraction intelligente
-        profilometre_data = self.json_data.get('profile_data', {})
-        lidar_points = self.json_data.get('lidar_data', [])
-        
+    objects = ProfilometreLidarDataQuerySet.as_manager()
+
+    # Champs repris dans les cumuls par utilisateur (UserUsage)
+    USAGE_FIELDS = ('user_id', 'lidar_point_count', 'lidar_capture_duration_sec', 'distance', 'stored_bytes')
+
+    _point_arrays = None
+    _pending_cloud = None
+    _pending_raw = None
+
+    def extract_fields(self):
+        """
+        Extraction intelligente : les points LiDAR sortent du JSON et partent
+        dans le stockage colonnaire (LidarPointCloud), les champs dérivés sont
+        calculés. Appelée par save() et par bulk_create().
+        """
+        self.partition = archive.partition_key(self._meta.get_field('timestamp').to_python(self.timestamp))
+        json_data = dict(self.json_data or {})
+        lidar_points = json_data.pop('lidar_data', None)
+        self.json_data = json_data
+        profilometre_data = json_data.get('profile_data') or {}
+
         # Détection de contenu
         self.has_personality_data = bool(profilometre_data.get('personality_traits'))
-        self.has_lidar_data = isinstance(lidar_points, list) and len(lidar_points) > 0
-        self.lidar_point_count = len(lidar_points) if self.has_lidar_data else 0
-        
-        # Calcul de la durée de capture (si timestamps disponibles)
-        if self.has_lidar_data and len(lidar_points) >= 2:
-            timestamps = [
-                p.get('timestamp_sec') for p in lidar_points
-                if p.get('timestamp_sec') is not None
-            ]
-            if len(timestamps) >= 2:
-                self.lidar_capture_duration_sec = max(timestamps) - min(timestamps)
-        
-        super().save(*args, **kwargs)
+
+        if lidar_points is not None:
+            if not isinstance(lidar_points, list):
+                lidar_points = []
+            self.set_point_arrays(pointcloud.points_to_arrays(lidar_points))
+
+    def save(self, *args, **kwargs):
+        self.extract_fields()
+        # Base de la session (alias explicite, sinon celle d'où elle a été lue) : nuages et cumuls y sont écrits
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using):
+            previous = None
+            if not self._state.adding:
+                previous = type(self).objects.using(using).filter(pk=self.pk).values(
+                    *self.USAGE_FIELDS, *Route.SPAN_FIELDS
+                ).first()
+            super().save(*args, **kwargs)
+            cloud = self.take_pending_cloud()
+            if cloud is not None:
+                previous_cloud = LidarPointCloud.objects.using(using).filter(session=self)
+                LidarPointCloud.discard_files(previous_cloud, using=using)
+                previous_cloud.delete()
+                cloud.save(using=using)
+                previous_raw = LidarRawPointCloud.objects.using(using).filter(session=self)
+                LidarRawPointCloud.discard_files(previous_raw, using=using)
+                previous_raw.delete()
+                raw = self.take_pending_raw()
+                if raw is not None:
+                    raw.save(using=using)
+            update_fields = kwargs.get('update_fields')
+            if update_fields is None or set(bboxindex.INDEXED_FIELDS) & set(update_fields):
+                bboxindex.sync([self], using=using)
+
+            # Cumuls par utilisateur, dans la même transaction que l'écriture
+            current = self.usage_row()
+            if kwargs.get('update_fields') is not None:
+                current = type(self).objects.using(using).filter(pk=self.pk).values(*self.USAGE_FIELDS).get()
+            if previous is not None:
+                UserUsage.record([previous], sign=-1, using=using)
+            UserUsage.record([current], using=using)
+
+            # Trajet : regroupé (et ses caches invalidés) quand la session change
+            if kwargs.get('update_fields') is None or set(Route.MEMBER_FIELDS) & set(kwargs['update_fields']):
+                Route.regroup_rows([row for row in (previous, self.route_row()) if row is not None], using=using)
+                self.route_id = type(self).objects.using(using).filter(pk=self.pk).values_list('route_id', flat=True).get()
+
+    def delete(self, *args, **kwargs):
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using):
+            previous = type(self).objects.using(using).filter(pk=self.pk).values(
+                *self.USAGE_FIELDS, *Route.SPAN_FIELDS
+            ).first()
+            for model in (LidarPointCloud, LidarRawPointCloud):
+                model.discard_files(model.objects.using(using).filter(session=self), using=using)
+            bboxindex.remove([self.pk], using=using)
+            result = super().delete(*args, **kwargs)
+            if previous is not None:
+                UserUsage.record([previous], sign=-1, using=using)
+                Route.regroup_rows([previous], using=using)
+        return result
+
+    def usage_row(self):
+        return {field: getattr(self, field) for field in self.USAGE_FIELDS}
+
+    def route_row(self):
+        return {field: getattr(self, field) for field in Route.SPAN_FIELDS}
+
+    def take_pending_cloud(self):
+        """Renvoie le nuage en attente, rattaché à cette session (déjà enregistrée)."""
+        cloud, self._pending_cloud = self._pending_cloud, None
+        if cloud is not None:
+            cloud.session = self
+        return cloud
+
+    def take_pending_raw(self):
+        """Points bruts en attente (filtrage à l'ingestion), rattachés à cette session."""
+        raw, self._pending_raw = self._pending_raw, None
+        if raw is not None:
+            raw.session = self
+        return raw
+
+    def set_point_cloud(self, cloud, stats, travelled_distance=None):
+        """
+        Attache un nuage de points (enregistré au prochain save()) et
+        renseigne les champs dérivés à partir de ses statistiques. La distance
+        calculée sur le trajet (ou `travelled_distance`, déjà calculée)
+        remplace celle déclarée par l'appareil.
+        """
+        self._pending_cloud = cloud
+        self._pending_raw = None
+        self._point_arrays = None
+        self.point_filter = None
+        self.stored_bytes = cloud.nbytes
+        if travelled_distance is None:
+            travelled_distance = pointcloud.trajectory_length(cloud.as_arrays())
+        self.travelled_distance = travelled_distance
+        self.distance = self.travelled_distance / getattr(settings, 'LIDAR_DISTANCE_UNIT_M', 1000.0)
+        for field, value in pointcloud.derived_fields(stats).items():
+            setattr(self, field, value)
+
+    def set_point_arrays(self, arrays):
+        """
+        Attache des colonnes NumPy {x, y, z, t} déjà décodées, filtrées si
+        un filtrage est configuré (cf. pointfilter.py) : le nuage de la
+        session est alors le nuage filtré, les points bruts sont conservés
+        à côté (LidarRawPointCloud) si LIDAR_FILTER_KEEP_RAW.
+        """
+        arrays = pointcloud.sort_by_time(arrays)
+        raw, report = None, None
+        params = pointfilter.configured_params()
+        if params:
+            raw, (arrays, report) = arrays, pointfilter.apply(arrays, params)
+        self.set_point_cloud(LidarPointCloud.from_arrays(arrays), pointcloud.compute_stats(arrays))
+        self._point_arrays = arrays
+        if report is not None:
+            self.point_filter = report
+            changed = report['point_count'] != report['raw_point_count'] or report['z_smoothed']
+            if changed and getattr(settings, 'LIDAR_FILTER_KEEP_RAW', True):
+                self._pending_raw = LidarRawPointCloud.from_arrays(raw)
+                self.stored_bytes += self._pending_raw.nbytes
+
+    def point_arrays(self):
+        """
+        Colonnes NumPy {x, y, z, t} de la session, ou None si la session
+        n'a jamais reçu de points.
+        """
+        if self._point_arrays is None and self._pending_cloud is not None:
+            self._point_arrays = self._pending_cloud.as_arrays()
+        if self._point_arrays is None:
+            try:
+                self._point_arrays = self.point_cloud.as_arrays()
+            except LidarPointCloud.DoesNotExist:
+                # Ancienne ligne encore au format JSON
+                lidar_points = (self.json_data or {}).get('lidar_data')
+                if isinstance(lidar_points, list):
+                    self._point_arrays = pointcloud.points_to_arrays(lidar_points)
+        return self._point_arrays
+
+    def legacy_json_data(self, arrays=None):
+        """
+        json_data au format historique, avec 'lidar_data' reconstruit (depuis
+        `arrays` si fourni, par exemple un niveau de détail).
+        """
+        data = dict(self.json_data or {})
+        if arrays is None:
+            arrays = self.point_arrays()
+        if arrays is not None:
+            data['lidar_data'] = pointcloud.arrays_to_points(arrays)
+        return data
 
     def __str__(self):
         return f"Session {self.session_id} - User {self.user_id} @ {self.timestamp.strftime('%Y-%m-%d %H:%M')}"
@@ -151,7 +432,1205 @@ class ProfilometreLidarData(models.Model):
         indexes = [
             models.Index(fields=['user_id', 'timestamp']),
             models.Index(fields=['has_lidar_data', 'lidar_point_count']),
+            models.Index(fields=['partition', 'user_id']),
         ]
+
+
+class PackedPointColumns(models.Model):
+    """
+    Colonnes de points packées :
+    - x, y, z : tableaux float32 (ou float64, cf. LIDAR_COORD_DTYPE)
+    - t : timestamp_sec en float64
+    Chaque colonne est un blob little-endian contigu, relu sans copie.
+    """
+    point_count = models.PositiveIntegerField(default=0)
+    coord_dtype = models.CharField(max_length=10, default='float32')
+    x = models.BinaryField()
+    y = models.BinaryField()
+    z = models.BinaryField()
+    t = models.BinaryField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    @classmethod
+    def from_arrays(cls, arrays, **kwargs):
+        dtype = pointcloud.coord_dtype(arrays['x'].dtype.name)
+        return cls(
+            point_count=len(arrays['t']),
+            coord_dtype=dtype.name,
+            x=pointcloud.pack(arrays['x'].astype(dtype, copy=False)),
+            y=pointcloud.pack(arrays['y'].astype(dtype, copy=False)),
+            z=pointcloud.pack(arrays['z'].astype(dtype, copy=False)),
+            t=pointcloud.pack(arrays['t'].astype(pointcloud.TIMESTAMP_DTYPE, copy=False)),
+            **kwargs,
+        )
+
+    def as_arrays(self):
+        """Colonnes NumPy en lecture seule {x, y, z, t}."""
+        dtype = pointcloud.coord_dtype(self.coord_dtype)
+        return {
+            'x': pointcloud.unpack(self.x, dtype),
+            'y': pointcloud.unpack(self.y, dtype),
+            'z': pointcloud.unpack(self.z, dtype),
+            't': pointcloud.unpack(self.t, pointcloud.TIMESTAMP_DTYPE),
+        }
+
+    @property
+    def nbytes(self):
+        return sum(len(getattr(self, axis) or b'') for axis in pointcloud.AXES)
+
+    def read_range(self, start, stop, axes=pointcloud.AXES):
+        """
+        Colonnes des points [start, stop), lues par SUBSTR sur les blobs :
+        le reste du nuage n'est ni chargé ni décodé.
+        """
+        coord = pointcloud.coord_dtype(self.coord_dtype)
+        dtypes = {axis: pointcloud.TIMESTAMP_DTYPE if axis == 't' else coord for axis in axes}
+        if stop <= start:
+            return {axis: np.empty(0, dtype=dtype) for axis, dtype in dtypes.items()}
+        row = type(self).objects.filter(pk=self.pk).values_list(*[
+            Substr(axis, start * dtype.itemsize + 1, (stop - start) * dtype.itemsize, output_field=models.BinaryField())
+            for axis, dtype in dtypes.items()
+        ]).get()
+        return {axis: np.frombuffer(bytes(blob), dtype=dtypes[axis]) for axis, blob in zip(dtypes, row)}
+
+    class Meta:
+        abstract = True
+
+
+class StoredPointColumns(PackedPointColumns):
+    """
+    Colonnes d'un nuage rattaché à une session, selon le stockage courant :
+    en base (blobs), en fichiers .npy projetés en mémoire
+    (LIDAR_POINT_STORAGE = 'file', cf. pointfiles ; la base ne garde que
+    file_path et checksum) ou, une fois la partition du mois archivée
+    (archive_partition renseigné), dans la table archive_table du fichier
+    d'archive (cf. archive.py), blobs vidés.
+    """
+    archive_partition = models.CharField(
+        max_length=7, blank=True, default='',
+        help_text="Partition (AAAA-MM) dont l'archive contient les colonnes ; vide = colonnes en base"
+    )
+    file_path = models.CharField(
+        max_length=100, blank=True, default='',
+        help_text="Répertoire des colonnes .npy (relatif à LIDAR_POINT_DATA_DIR) ; vide = colonnes en base"
+    )
+    checksum = models.CharField(max_length=64, blank=True, default='', help_text="SHA-256 des colonnes x, y, z, t")
+
+    archive_table = archive.CLOUDS_TABLE
+    _archived_arrays = None
+
+    @classmethod
+    def discard_files(cls, clouds, using=None):
+        """Fichiers des nuages `clouds` (supprimés), effacés une fois la transaction validée."""
+        paths = list(clouds.exclude(file_path='').values_list('file_path', flat=True))
+        if paths:
+            transaction.on_commit(lambda: [pointfiles.remove(path) for path in paths], using=using)
+
+    def store_points(self):
+        """
+        Mode fichier : écrit les colonnes sur disque et vide les blobs.
+        Appelée avant l'insertion (save() et bulk_create()).
+        """
+        if pointfiles.storage_mode() != 'file' or self.file_path or self.archive_partition:
+            return
+        self.file_path, self.checksum = pointfiles.write_columns(super().as_arrays())
+        self.x = self.y = self.z = self.t = b''
+
+    def save(self, *args, **kwargs):
+        self.store_points()
+        super().save(*args, **kwargs)
+
+    @property
+    def nbytes(self):
+        if not (self.file_path or self.archive_partition):
+            return super().nbytes
+        return pointcloud.stored_size(self.point_count, self.coord_dtype)
+
+    def as_arrays(self):
+        if self.file_path:
+            return pointfiles.open_columns(self.file_path)
+        if not self.archive_partition:
+            return super().as_arrays()
+        if self._archived_arrays is None:
+            coord = pointcloud.coord_dtype(self.coord_dtype)
+            columns = archive.read_columns(self.archive_partition, self.pk, self.archive_table)
+            self._archived_arrays = {
+                axis: pointcloud.unpack(columns[axis], pointcloud.TIMESTAMP_DTYPE if axis == 't' else coord)
+                for axis in pointcloud.AXES
+            }
+        return self._archived_arrays
+
+    def read_range(self, start, stop, axes=pointcloud.AXES):
+        if not (self.file_path or self.archive_partition):
+            return super().read_range(start, stop, axes)
+        # Fichiers projetés en mémoire : seules les pages découpées sont lues.
+        # Archive compressée : le nuage est décompressé une fois puis découpé.
+        arrays = self.as_arrays()
+        return {axis: arrays[axis][start:max(start, stop)] for axis in axes}
+
+    class Meta:
+        abstract = True
+
+
+class LidarPointCloud(StoredPointColumns):
+    """
+    Stockage colonnaire des points LiDAR d'une session (cf. PackedPointColumns,
+    StoredPointColumns pour les modes fichier et archive).
+    Les points sont rangés par timestamp_sec croissant ; time_index garde un
+    timestamp tous les time_index_stride points pour découper une fenêtre
+    temporelle par recherche dichotomique (cf. time_slice).
+    """
+    session = models.OneToOneField(
+        ProfilometreLidarData,
+        on_delete=models.CASCADE,
+        related_name='point_cloud'
+    )
+    time_index = models.BinaryField(default=b'')
+    time_index_stride = models.PositiveIntegerField(default=0)
+    timed_count = models.PositiveIntegerField(default=0, help_text="Points horodatés (en tête du nuage)")
+
+    @classmethod
+    def from_points(cls, points):
+        """Construit (sans sauvegarder) un nuage à partir de la liste JSON."""
+        return cls.from_arrays(pointcloud.points_to_arrays(points))
+
+    @classmethod
+    def from_arrays(cls, arrays, **kwargs):
+        """Nuage trié par timestamp, avec son index temporel."""
+        arrays = pointcloud.sort_by_time(arrays)
+        samples, timed, stride = pointcloud.time_index(arrays['t'])
+        return super().from_arrays(
+            arrays, time_index=samples.tobytes(), time_index_stride=stride, timed_count=timed, **kwargs
+        )
+
+    def first_timestamp(self):
+        """Premier timestamp_sec du nuage (0 si aucun point horodaté)."""
+        if not self.timed_count:
+            return 0.0
+        return float(pointcloud.unpack(self.time_index, pointcloud.TIMESTAMP_DTYPE)[0])
+
+    def time_slice(self, t_start=None, t_end=None):
+        """
+        Points de la fenêtre [t_start, t_end] : l'index donne les blocs
+        concernés, seuls ces blocs de t puis les x, y, z retenus sont lus.
+        Renvoie (position du premier point dans le nuage, colonnes).
+        """
+        samples = pointcloud.unpack(self.time_index, pointcloud.TIMESTAMP_DTYPE)
+        start, stop = pointcloud.time_bounds(samples, self.time_index_stride, self.timed_count, t_start, t_end)
+        t = self.read_range(start, stop, axes=('t',))['t']
+        first = int(np.searchsorted(t, t_start, side='left')) if t_start is not None else 0
+        last = int(np.searchsorted(t, t_end, side='right')) if t_end is not None else t.size
+        if last <= first:
+            return start + first, pointcloud.columns_to_arrays([], [], [], [], self.coord_dtype)
+        arrays = self.read_range(start + first, start + last, axes=('x', 'y', 'z'))
+        arrays['t'] = t[first:last]
+        return start + first, arrays
+
+    def __str__(self):
+        return f"Nuage {self.session_id} ({self.point_count} points)"
+
+    class Meta:
+        verbose_name = "Nuage de points LiDAR"
+        verbose_name_plural = "Nuages de points LiDAR"
+
+
+class LidarRawPointCloud(StoredPointColumns):
+    """
+    Points bruts d'une session filtrée à l'ingestion (cf. pointfilter.py),
+    tels que reçus et triés par timestamp. Stockés, déplacés en fichiers et
+    archivés comme le nuage filtré (LidarPointCloud) ; les calculs en aval
+    lisent le nuage filtré, celui-ci ne sert qu'à relire ou refiltrer les
+    points d'origine.
+    """
+    session = models.OneToOneField(
+        ProfilometreLidarData,
+        on_delete=models.CASCADE,
+        related_name='raw_point_cloud'
+    )
+
+    archive_table = archive.RAW_CLOUDS_TABLE
+
+    def __str__(self):
+        return f"Points bruts {self.session_id} ({self.point_count} points)"
+
+    class Meta:
+        verbose_name = "Points bruts LiDAR"
+        verbose_name_plural = "Points bruts LiDAR"
+
+
+class LidarSpatialIndex(models.Model):
+    """
+    Index spatial par voxels d'un nuage (cf. spatial.py), construit à la
+    première requête spatiale. Les points y sont recopiés triés par voxel :
+    une requête ne relit que les plages d'octets des voxels concernés.
+    Supprimé en cascade quand le nuage est remplacé.
+    """
+    cloud = models.OneToOneField(LidarPointCloud, on_delete=models.CASCADE, related_name='spatial_index')
+    voxel_size = models.FloatField()
+    origin_x = models.FloatField()
+    origin_y = models.FloatField()
+    origin_z = models.FloatField()
+    nx = models.PositiveIntegerField()
+    ny = models.PositiveIntegerField()
+    nz = models.PositiveIntegerField()
+    cell_count = models.PositiveIntegerField(default=0)
+    point_count = models.PositiveIntegerField(default=0)
+    cell_keys = models.BinaryField()
+    cell_offsets = models.BinaryField()
+    records = models.BinaryField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    _records = None
+
+    @classmethod
+    def for_cloud(cls, cloud):
+        """Index du nuage, construit et enregistré s'il n'existe pas encore."""
+        index = cls.objects.defer('records').filter(cloud=cloud).first()
+        if index is not None:
+            return index
+        grid, records = spatial.VoxelGrid.build(cloud.as_arrays())
+        index = cls(
+            cloud=cloud,
+            voxel_size=grid.voxel_size,
+            origin_x=grid.origin[0],
+            origin_y=grid.origin[1],
+            origin_z=grid.origin[2],
+            nx=grid.dims[0],
+            ny=grid.dims[1],
+            nz=grid.dims[2],
+            cell_count=grid.keys.size,
+            point_count=records.size,
+            cell_keys=grid.keys.tobytes(),
+            cell_offsets=grid.offsets.tobytes(),
+            records=records.tobytes(),
+        )
+        try:
+            with transaction.atomic():
+                index.save()
+        except IntegrityError:
+            # Construit en parallèle par une autre requête
+            return cls.objects.defer('records').get(cloud=cloud)
+        index._records = records
+        return index
+
+    def grid(self):
+        return spatial.VoxelGrid(
+            self.voxel_size,
+            (self.origin_x, self.origin_y, self.origin_z),
+            (self.nx, self.ny, self.nz),
+            np.frombuffer(self.cell_keys, dtype=spatial.KEY_DTYPE),
+            np.frombuffer(self.cell_offsets, dtype=spatial.OFFSET_DTYPE),
+        )
+
+    def read_records(self, ranges):
+        """
+        Lit les plages [début, fin) d'enregistrements. Seuls les octets
+        concernés sont lus (SUBSTR sur le blob), sauf si la requête couvre
+        une grande partie du nuage : le blob est alors lu en entier.
+        """
+        itemsize = spatial.RECORD_DTYPE.itemsize
+        total = sum(end - start for start, end in ranges)
+        if not total:
+            return np.empty(0, dtype=spatial.RECORD_DTYPE)
+        max_ranges = getattr(settings, 'LIDAR_SPATIAL_MAX_RANGES', 256)
+        if self._records is None and (len(ranges) > max_ranges or total * 2 > self.point_count):
+            blob = LidarSpatialIndex.objects.filter(pk=self.pk).values_list('records', flat=True).get()
+            self._records = np.frombuffer(blob, dtype=spatial.RECORD_DTYPE)
+        if self._records is not None:
+            return np.concatenate([self._records[start:end] for start, end in ranges])
+
+        parts = []
+        for first in range(0, len(ranges), 64):
+            group = ranges[first:first + 64]
+            row = LidarSpatialIndex.objects.filter(pk=self.pk).values_list(*[
+                Substr('records', start * itemsize + 1, (end - start) * itemsize, output_field=models.BinaryField())
+                for start, end in group
+            ]).get()
+            parts.extend(bytes(blob) for blob in row)
+        return np.frombuffer(b''.join(parts), dtype=spatial.RECORD_DTYPE)
+
+    def query_box(self, lo, hi):
+        """Points dans la boîte [lo, hi] (bornes None = non bornées)."""
+        lo_inf = [-np.inf if v is None else v for v in lo]
+        hi_inf = [np.inf if v is None else v for v in hi]
+        candidates = self.read_records(self.grid().ranges_for_box(lo_inf, hi_inf))
+        return spatial.in_box(candidates, lo, hi)
+
+    def query_radius(self, center, radius):
+        """Points à moins de radius du centre, triés par distance."""
+        center = np.asarray(center, dtype=np.float64)
+        candidates = self.query_box(center - radius, center + radius)
+        d2 = spatial.squared_distances(candidates, center)
+        keep = np.flatnonzero(d2 <= radius * radius)
+        order = keep[np.argsort(d2[keep], kind='stable')]
+        return candidates[order], np.sqrt(d2[order])
+
+    def query_knn(self, center, k):
+        """k plus proches voisins : recherche dans des cubes de taille croissante."""
+        center = np.asarray(center, dtype=np.float64)
+        k = min(k, self.point_count)
+        if k <= 0:
+            return np.empty(0, dtype=spatial.RECORD_DTYPE), np.empty(0)
+        grid = self.grid()
+        far_corner = np.maximum(np.abs(center - grid.origin), np.abs(grid.origin + grid.dims * grid.voxel_size - center))
+        reach = float(np.sqrt(np.square(far_corner).sum()))
+        radius = grid.voxel_size
+        while True:
+            candidates = self.query_box(center - radius, center + radius)
+            if candidates.size >= k or radius >= reach:
+                d2 = spatial.squared_distances(candidates, center)
+                nearest = np.argsort(d2, kind='stable')[:k]
+                # Le cube de demi-côté radius ne garantit que les voisins à distance <= radius
+                if radius >= reach or d2[nearest[-1]] <= radius * radius:
+                    return candidates[nearest], np.sqrt(d2[nearest])
+            radius *= 2
+
+    def __str__(self):
+        return f"Index spatial {self.cloud_id} ({self.cell_count} voxels)"
+
+    class Meta:
+        verbose_name = "Index spatial LiDAR"
+        verbose_name_plural = "Index spatiaux LiDAR"
+
+
+class LidarLevelOfDetail(PackedPointColumns):
+    """
+    Niveau de détail d'un nuage pour la visualisation : environ
+    LIDAR_LOD_LEVELS[level] points (un barycentre par voxel, cf.
+    spatial.voxel_downsample). Calculé à la première demande puis conservé ;
+    supprimé en cascade quand le nuage est remplacé.
+    """
+    cloud = models.ForeignKey(LidarPointCloud, on_delete=models.CASCADE, related_name='levels')
+    level = models.PositiveSmallIntegerField()
+    target_points = models.PositiveIntegerField()
+    voxel_size = models.FloatField(null=True, blank=True)
+
+    @classmethod
+    def for_cloud(cls, cloud, level):
+        """
+        Niveau `level` du nuage, calculé s'il n'existe pas encore. Renvoie
+        None quand le nuage a déjà moins de points que le niveau demandé :
+        le nuage complet sert alors d'aperçu.
+        """
+        target = settings.LIDAR_LOD_LEVELS[level]
+        if cloud.point_count <= target:
+            return None
+        lod = cls.objects.filter(cloud=cloud, level=level).first()
+        if lod is not None:
+            return lod
+        arrays, voxel_size = spatial.voxel_downsample(cloud.as_arrays(), target)
+        lod = cls.from_arrays(arrays, cloud=cloud, level=level, target_points=target, voxel_size=voxel_size)
+        try:
+            with transaction.atomic():
+                lod.save()
+        except IntegrityError:
+            # Calculé en parallèle par une autre requête
+            return cls.objects.get(cloud=cloud, level=level)
+        return lod
+
+    def __str__(self):
+        return f"Nuage {self.cloud_id} niveau {self.level} ({self.point_count} points)"
+
+    class Meta:
+        verbose_name = "Niveau de détail LiDAR"
+        verbose_name_plural = "Niveaux de détail LiDAR"
+        ordering = ['level']
+        constraints = [
+            models.UniqueConstraint(fields=['cloud', 'level'], name='unique_lidar_lod_level'),
+        ]
+
+
+class IriAnalysis(models.Model):
+    """
+    IRI d'un nuage (cf. roughness.py) pour une longueur de segment donnée,
+    calculé une fois puis relu par les tableaux de bord. Supprimé en
+    cascade quand le nuage est remplacé.
+    """
+    cloud = models.ForeignKey(LidarPointCloud, on_delete=models.CASCADE, related_name='iri_analyses')
+    segment_length = models.FloatField()
+    sample_interval = models.FloatField()
+    length_m = models.FloatField()
+    iri = models.FloatField(db_index=True)  # m/km, sur tout le trajet
+    segments = models.JSONField(default=list)  # [{start_m, end_m, iri}]
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    @classmethod
+    def for_cloud(cls, cloud, segment_length=None, sample_interval=None):
+        """Analyse du nuage, calculée si besoin (roughness.ProfileTooShort si impossible)."""
+        if segment_length is None:
+            segment_length = settings.LIDAR_IRI_SEGMENT_LENGTH
+        if sample_interval is None:
+            sample_interval = settings.LIDAR_IRI_SAMPLE_INTERVAL
+        lookup = {'cloud': cloud, 'segment_length': segment_length, 'sample_interval': sample_interval}
+        analysis = cls.objects.filter(**lookup).first()
+        if analysis is not None:
+            return analysis
+        result = roughness.compute_iri(cloud.as_arrays(), segment_length, sample_interval)
+        try:
+            with transaction.atomic():
+                return cls.objects.create(**lookup, **result)
+        except IntegrityError:
+            # Calculé en parallèle par une autre requête
+            return cls.objects.get(**lookup)
+
+    @classmethod
+    def for_sessions(cls, sessions, segment_length=None):
+        """
+        Mode lot : analyse de plusieurs sessions. Renvoie une liste de
+        (session_id, analyse ou None, erreur ou None) ; seules les analyses
+        manquantes sont calculées.
+        """
+        clouds = LidarPointCloud.objects.defer('x', 'y', 'z', 't').filter(session__in=sessions)
+        clouds = {cloud.session_id: cloud for cloud in clouds}
+        results = []
+        for session_id in sessions.values_list('id', flat=True):
+            cloud = clouds.get(session_id)
+            if cloud is None:
+                results.append((session_id, None, "Aucun point LiDAR."))
+                continue
+            try:
+                results.append((session_id, cls.for_cloud(cloud, segment_length), None))
+            except roughness.ProfileTooShort as exc:
+                results.append((session_id, None, str(exc)))
+        return results
+
+    def __str__(self):
+        return f"IRI nuage {self.cloud_id} : {self.iri:.2f} m/km"
+
+    class Meta:
+        verbose_name = "Analyse IRI"
+        verbose_name_plural = "Analyses IRI"
+        constraints = [
+            models.UniqueConstraint(
+                fields=['cloud', 'segment_length', 'sample_interval'], name='unique_iri_analysis'
+            ),
+        ]
+
+
+class ChangeDetection(models.Model):
+    """
+    Écarts d'élévation entre deux passages (cf. changes.py) : la session
+    comparée par rapport à la session de référence, pour une taille de
+    cellule donnée. Calculés une fois par paire puis relus ; supprimés en
+    cascade quand l'un des deux nuages est remplacé.
+    """
+    reference = models.ForeignKey(LidarPointCloud, on_delete=models.CASCADE, related_name='changes_as_reference')
+    compared = models.ForeignKey(LidarPointCloud, on_delete=models.CASCADE, related_name='changes_as_compared')
+    cell_size = models.FloatField()
+    threshold = models.FloatField(help_text="Écart (m) au-delà duquel une cellule compte comme modifiée")
+    compared_points = models.PositiveIntegerField(default=0)
+    matched_points = models.PositiveIntegerField(default=0)
+    cell_count = models.PositiveIntegerField(default=0)
+    changed_cells = models.PositiveIntegerField(default=0)
+    mean_delta = models.FloatField(null=True, blank=True)
+    median_delta = models.FloatField(null=True, blank=True)
+    std_delta = models.FloatField(null=True, blank=True)
+    rmse = models.FloatField(null=True, blank=True)
+    min_delta = models.FloatField(null=True, blank=True)
+    max_delta = models.FloatField(null=True, blank=True)
+    cells = models.BinaryField()  # changes.CELL_DTYPE, une entrée par cellule appariée
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    @classmethod
+    def for_clouds(cls, reference, compared, cell_size=None, threshold=None):
+        """Comparaison des deux nuages, calculée si elle n'existe pas encore."""
+        if cell_size is None:
+            cell_size = settings.LIDAR_CHANGE_CELL_SIZE
+        if threshold is None:
+            threshold = settings.LIDAR_CHANGE_THRESHOLD
+        lookup = {'reference': reference, 'compared': compared, 'cell_size': cell_size, 'threshold': threshold}
+        detection = cls.objects.filter(**lookup).first()
+        if detection is not None:
+            return detection
+        result = changes.compare(reference.as_arrays(), compared.as_arrays(), cell_size, threshold)
+        try:
+            with transaction.atomic():
+                return cls.objects.create(**lookup, **result)
+        except IntegrityError:
+            # Calculée en parallèle par une autre requête
+            return cls.objects.get(**lookup)
+
+    def cell_records(self):
+        return np.frombuffer(self.cells, dtype=changes.CELL_DTYPE)
+
+    def __str__(self):
+        return f"Changements nuage {self.compared_id} / {self.reference_id} ({self.changed_cells} cellules)"
+
+    class Meta:
+        verbose_name = "Détection de changements"
+        verbose_name_plural = "Détections de changements"
+        constraints = [
+            models.UniqueConstraint(
+                fields=['reference', 'compared', 'cell_size', 'threshold'], name='unique_change_detection'
+            ),
+        ]
+
+
+class LidarUpload(models.Model):
+    """
+    Upload fractionné d'une session LiDAR (protocole open / chunks / finalize).
+    Les statistiques des points sont fusionnées à chaque morceau reçu : le
+    finalize n'a plus qu'à concaténer les colonnes binaires.
+    """
+    STATUS_OPEN = 'open'
+    STATUS_FINALIZED = 'finalized'
+    STATUS_CHOICES = [
+        (STATUS_OPEN, 'En cours'),
+        (STATUS_FINALIZED, 'Finalisé'),
+    ]
+
+    session_id = models.CharField(max_length=200, unique=True)
+    user_id = models.CharField(max_length=150, db_index=True)
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='lidar_uploads')
+    timestamp = models.DateTimeField(default=timezone.now)
+    json_data = models.JSONField(default=dict, blank=True)
+    total_chunks = models.PositiveIntegerField(null=True, blank=True)
+    coord_dtype = models.CharField(max_length=10, default='float32')
+    stats = models.JSONField(default=pointcloud.empty_stats, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_OPEN)
+    lidar_session = models.OneToOneField(
+        ProfilometreLidarData,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='upload'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def received_chunks(self):
+        return list(self.chunks.order_by('index').values_list('index', flat=True))
+
+    def missing_chunks(self):
+        received = self.received_chunks()
+        expected = self.total_chunks if self.total_chunks is not None else (received[-1] + 1 if received else 0)
+        return sorted(set(range(expected)) - set(received))
+
+    def add_chunk(self, index, arrays):
+        """
+        Enregistre un morceau de points et met à jour les statistiques.
+        Renvoie False si ce morceau a déjà été reçu (renvoi du client).
+        """
+        with transaction.atomic():
+            upload = LidarUpload.objects.select_for_update().get(pk=self.pk)
+            if upload.chunks.filter(index=index).exists():
+                return False
+            stats = pointcloud.compute_stats(arrays)
+            dtype = pointcloud.coord_dtype(upload.coord_dtype)
+            arrays = {
+                axis: arrays[axis].astype(pointcloud.TIMESTAMP_DTYPE if axis == 't' else dtype, copy=False)
+                for axis in pointcloud.AXES
+            }
+            LidarUploadChunk.objects.create(
+                upload=upload,
+                index=index,
+                point_count=stats['count'],
+                **{axis: pointcloud.pack(arrays[axis]) for axis in pointcloud.AXES},
+            )
+            # Trajet par morceau (index -> résumé) : la distance parcourue est
+            # assemblée à la finalisation sans relire tous les points
+            segments = {**upload.stats.get('trajectory', {}), str(index): pointcloud.trajectory_segment(arrays)}
+            upload.stats = {**pointcloud.merge_stats(upload.stats, stats), 'trajectory': segments}
+            upload.save(update_fields=['stats', 'updated_at'])
+        self.stats = upload.stats
+        return True
+
+    def travelled_distance(self):
+        """
+        Distance parcourue (m), assemblée à partir du trajet de chaque
+        morceau (cf. pointcloud.joined_trajectory_length) ; None si elle doit
+        être recalculée sur tous les points (morceaux qui se chevauchent dans
+        le temps, upload antérieur au suivi par morceau).
+        """
+        segments = self.stats.get('trajectory')
+        if segments is None or len(segments) != self.chunks.count():
+            return None
+        return pointcloud.joined_trajectory_length(segments[key] for key in sorted(segments, key=int))
+
+    def finalize(self):
+        """
+        Assemble les morceaux (dans l'ordre des index) en une session
+        ProfilometreLidarData, sans recalculer les champs dérivés (sauf si
+        un filtrage à l'ingestion est configuré : ils portent alors sur les
+        points filtrés).
+        """
+        with transaction.atomic():
+            columns = {axis: [] for axis in pointcloud.AXES}
+            for chunk in self.chunks.order_by('index').iterator():
+                for axis in pointcloud.AXES:
+                    columns[axis].append(bytes(getattr(chunk, axis)))
+            coord = pointcloud.coord_dtype(self.coord_dtype)
+            arrays = {
+                axis: pointcloud.unpack(b''.join(parts), pointcloud.TIMESTAMP_DTYPE if axis == 't' else coord)
+                for axis, parts in columns.items()
+            }
+            session = ProfilometreLidarData(
+                user_id=self.user_id,
+                session_id=self.session_id,
+                timestamp=self.timestamp,
+                json_data=self.json_data,
+            )
+            if pointfilter.enabled():
+                session.set_point_arrays(arrays)
+            else:
+                session.set_point_cloud(
+                    LidarPointCloud.from_arrays(arrays), self.stats, self.travelled_distance()
+                )
+            session.save()
+            self.chunks.all().delete()
+            self.lidar_session = session
+            self.status = self.STATUS_FINALIZED
+            self.save(update_fields=['lidar_session', 'status', 'updated_at'])
+        return session
+
+    def __str__(self):
+        return f"Upload {self.session_id} ({self.status})"
+
+    class Meta:
+        verbose_name = "Upload LiDAR fractionné"
+        verbose_name_plural = "Uploads LiDAR fractionnés"
+
+
+class LidarUploadChunk(models.Model):
+    """Morceau de points d'un LidarUpload, colonnes packées comme LidarPointCloud."""
+    upload = models.ForeignKey(LidarUpload, on_delete=models.CASCADE, related_name='chunks')
+    index = models.PositiveIntegerField()
+    point_count = models.PositiveIntegerField(default=0)
+    x = models.BinaryField()
+    y = models.BinaryField()
+    z = models.BinaryField()
+    t = models.BinaryField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Morceau {self.index} de {self.upload.session_id}"
+
+    class Meta:
+        ordering = ['index']
+        constraints = [
+            models.UniqueConstraint(fields=['upload', 'index'], name='unique_upload_chunk_index'),
+        ]
+
+
+class IngestJob(models.Model):
+    """
+    File d'ingestion asynchrone (table SQLite) : la vue stocke le corps brut
+    de la requête et répond 202 ; un worker (manage.py run_ingest_workers)
+    fait ensuite validation, extraction et enregistrement.
+    """
+    KIND_SESSION = 'session'
+    KIND_BATCH = 'batch'
+    KIND_CHOICES = [
+        (KIND_SESSION, 'Session'),
+        (KIND_BATCH, 'Envoi groupé'),
+    ]
+
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'En attente'),
+        (STATUS_RUNNING, 'En cours'),
+        (STATUS_DONE, 'Terminé'),
+        (STATUS_FAILED, 'Échec'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='ingest_jobs')
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES, default=KIND_SESSION)
+    content_type = models.CharField(max_length=100, blank=True)
+    content_encoding = models.CharField(max_length=20, blank=True)
+    content_hash = models.CharField(max_length=64, blank=True, db_index=True)
+    payload = models.BinaryField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    worker_pid = models.PositiveIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Job {self.id} ({self.kind}, {self.status})"
+
+    class Meta:
+        verbose_name = "Job d'ingestion"
+        verbose_name_plural = "Jobs d'ingestion"
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+
+
+class UserUsage(models.Model):
+    """
+    Cumuls par utilisateur (user_id des sessions) : tenus à jour dans la
+    transaction de chaque enregistrement ou suppression de session, pour que
+    get_user_details les lise en une requête. Reconstruits par
+    manage.py rebuild_user_usage.
+    """
+    user_id = models.CharField(max_length=150, unique=True)
+    session_count = models.PositiveIntegerField(default=0)
+    point_count = models.BigIntegerField(default=0)
+    capture_duration_sec = models.FloatField(default=0.0)
+    distance = models.FloatField(default=0.0)
+    stored_bytes = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    SUMMED_FIELDS = ('session_count', 'point_count', 'capture_duration_sec', 'distance', 'stored_bytes')
+
+    @staticmethod
+    def contribution(row, sign=1):
+        """Part d'une session (dict de USAGE_FIELDS) dans les cumuls."""
+        return {
+            'session_count': sign,
+            'point_count': sign * (row['lidar_point_count'] or 0),
+            'capture_duration_sec': sign * (row['lidar_capture_duration_sec'] or 0.0),
+            'distance': sign * (row['distance'] or 0.0),
+            'stored_bytes': sign * (row['stored_bytes'] or 0),
+        }
+
+    @classmethod
+    def record(cls, rows, sign=1, using=None):
+        """Ajoute (sign=1) ou retire (sign=-1) des sessions des cumuls."""
+        per_user = {}
+        for row in rows:
+            deltas = cls.contribution(row, sign)
+            totals = per_user.setdefault(str(row['user_id']), dict.fromkeys(deltas, 0))
+            for field, value in deltas.items():
+                totals[field] += value
+        for user_id, deltas in per_user.items():
+            cls.apply(user_id, deltas, using=using)
+
+    @classmethod
+    def apply(cls, user_id, deltas, using=None):
+        """UPDATE ... SET champ = champ + delta ; crée la ligne au premier envoi."""
+        manager = cls.objects.using(using)
+        updates = {field: F(field) + value for field, value in deltas.items()}
+        if manager.filter(user_id=user_id).update(**updates, updated_at=timezone.now()):
+            return
+        try:
+            with transaction.atomic(using=using):
+                manager.create(user_id=user_id, **deltas)
+        except IntegrityError:
+            # Ligne créée entre-temps par une autre transaction
+            manager.filter(user_id=user_id).update(**updates, updated_at=timezone.now())
+
+    @classmethod
+    def stored_bytes_of(cls, user_id):
+        return cls.objects.filter(user_id=str(user_id)).values_list('stored_bytes', flat=True).first() or 0
+
+    @classmethod
+    def totals(cls, sessions):
+        """Cumuls calculés en base pour un queryset de sessions : {user_id: champs}."""
+        rows = sessions.order_by().values('user_id').annotate(
+            session_count=Count('id'),
+            point_count=Coalesce(Sum('lidar_point_count'), 0),
+            capture_duration_sec=Coalesce(Sum('lidar_capture_duration_sec'), 0.0),
+            distance=Coalesce(Sum('distance'), 0.0),
+            stored_bytes=Coalesce(Sum('stored_bytes'), 0),
+        )
+        return {row.pop('user_id'): row for row in rows}
+
+    @classmethod
+    def rebuild(cls):
+        """Recalcule toute la table à partir des sessions."""
+        with transaction.atomic():
+            cls.objects.all().delete()
+            cls.objects.bulk_create(
+                cls(user_id=user_id, **fields)
+                for user_id, fields in cls.totals(ProfilometreLidarData.objects.all()).items()
+            )
+
+    @classmethod
+    def reconcile(cls, dry_run=False):
+        """
+        Corrige la dérive des compteurs sans tout reconstruire : taille
+        stockée de chaque session recalculée d'après son nuage, puis cumuls
+        par utilisateur ramenés aux totaux réels par UPDATE F() (les envois
+        concurrents restent comptés). Renvoie (sessions corrigées,
+        {user_id: écarts}).
+        """
+        def cloud_bytes(relation):
+            return Case(
+                When(**{f'{relation}__isnull': True}, then=Value(0)),
+                When(**{f'{relation}__coord_dtype': 'float64'},
+                     then=F(f'{relation}__point_count') * pointcloud.stored_size(1, 'float64')),
+                default=F(f'{relation}__point_count') * pointcloud.stored_size(1, 'float32'),
+                output_field=models.BigIntegerField(),
+            )
+
+        expected = cloud_bytes('point_cloud') + cloud_bytes('raw_point_cloud')
+        drifted = list(
+            ProfilometreLidarData.objects.annotate(expected_bytes=expected)
+            .exclude(stored_bytes=F('expected_bytes')).only('id', 'stored_bytes')
+        )
+        with transaction.atomic():
+            for session in drifted:
+                session.stored_bytes = session.expected_bytes
+            ProfilometreLidarData.objects.bulk_update(drifted, ['stored_bytes'], batch_size=500)
+
+            totals = cls.totals(ProfilometreLidarData.objects.all())
+            counters = {usage.user_id: usage for usage in cls.objects.all()}
+            deltas = {}
+            for user_id in set(totals) | set(counters):
+                usage = counters.get(user_id)
+                diff = {
+                    field: value - (getattr(usage, field) if usage is not None else 0)
+                    for field, value in totals.get(user_id, dict.fromkeys(cls.SUMMED_FIELDS, 0)).items()
+                }
+                diff = {field: value for field, value in diff.items() if abs(value) > 1e-6}
+                if diff:
+                    deltas[user_id] = diff
+                    cls.apply(user_id, diff)
+            if dry_run:
+                transaction.set_rollback(True)
+        return len(drifted), deltas
+
+    def __str__(self):
+        return f"Cumuls {self.user_id} ({self.session_count} sessions)"
+
+    class Meta:
+        verbose_name = "Cumuls d'utilisation"
+        verbose_name_plural = "Cumuls d'utilisation"
+
+
+class LidarPartition(models.Model):
+    """
+    Partition mensuelle des sessions (clé AAAA-MM, cf. ProfilometreLidarData.partition) :
+    volumétrie et état de rétention. Archiver une partition (manage.py
+    archive_lidar_partitions) déplace les colonnes de ses nuages vers
+    LIDAR_ARCHIVE_DIR/lidar-AAAA-MM.sqlite3 ; sessions, métriques et résultats
+    IRI restent en base et interrogeables.
+    """
+    STATUS_ACTIVE = 'active'
+    STATUS_ARCHIVED = 'archived'
+    STATUS_CHOICES = [
+        (STATUS_ACTIVE, 'Active'),
+        (STATUS_ARCHIVED, 'Archivée'),
+    ]
+
+    key = models.CharField(max_length=7, unique=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_ACTIVE)
+    session_count = models.PositiveIntegerField(default=0)
+    point_count = models.BigIntegerField(default=0)
+    stored_bytes = models.BigIntegerField(default=0, help_text="Taille des nuages non compressés (octets)")
+    archived_bytes = models.BigIntegerField(default=0, help_text="Taille du fichier d'archive (octets)")
+    archived_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @classmethod
+    def refresh(cls, keys=None):
+        """Recalcule la volumétrie des partitions (toutes, ou celles de `keys`)."""
+        sessions = ProfilometreLidarData.objects.order_by()
+        if keys is not None:
+            sessions = sessions.filter(partition__in=keys)
+        rows = sessions.values('partition').annotate(
+            session_count=Count('id'),
+            point_count=Coalesce(Sum('lidar_point_count'), 0),
+            stored_bytes=Coalesce(Sum('stored_bytes'), 0),
+        )
+        partitions = []
+        for row in rows:
+            key = row.pop('partition')
+            partitions.append(cls.objects.update_or_create(key=key, defaults=row)[0])
+        return partitions
+
+    def archive(self, batch_size=100):
+        """
+        Archive la partition : les colonnes des nuages sont copiées par lots
+        dans le fichier du mois, puis vidées en base (ou leurs fichiers .npy
+        effacés). Un lot n'est vidé qu'une fois écrit dans l'archive ;
+        relancer reprend où l'on s'était arrêté.
+        Index spatiaux et niveaux de détail (caches) sont supprimés.
+        Les points bruts (LidarRawPointCloud) sont archivés de la même façon ;
+        seuls les nuages filtrés sont comptés.
+        """
+        archived = 0
+        for model in (LidarPointCloud, LidarRawPointCloud):
+            clouds = model.objects.filter(session__partition=self.key, archive_partition='').order_by('pk')
+            while True:
+                batch = list(clouds[:batch_size])
+                if not batch:
+                    break
+                archive.write_clouds(self.key, batch, model.archive_table)
+                ids = [cloud.pk for cloud in batch]
+                with transaction.atomic():
+                    archived_clouds = model.objects.filter(pk__in=ids)
+                    model.discard_files(archived_clouds)
+                    archived_clouds.update(
+                        archive_partition=self.key, file_path='', checksum='', x=b'', y=b'', z=b'', t=b''
+                    )
+                    if model is LidarPointCloud:
+                        LidarSpatialIndex.objects.filter(cloud__in=ids).delete()
+                        LidarLevelOfDetail.objects.filter(cloud__in=ids).delete()
+                        archived += len(batch)
+        self.status = self.STATUS_ARCHIVED
+        self.archived_bytes = archive.archive_size(self.key)
+        self.archived_at = timezone.now()
+        self.save(update_fields=['status', 'archived_bytes', 'archived_at', 'updated_at'])
+        return archived
+
+    def restore(self):
+        """
+        Remet les colonnes des nuages archivés en stockage courant (base ou
+        fichiers, selon LIDAR_POINT_STORAGE) et supprime le fichier d'archive.
+        """
+        restored = 0
+        with transaction.atomic():
+            for model in (LidarPointCloud, LidarRawPointCloud):
+                for cloud_id, columns in archive.iter_archived(self.key, model.archive_table):
+                    cloud = model.objects.filter(pk=cloud_id, archive_partition=self.key).first()
+                    if cloud is None:
+                        continue
+                    cloud.archive_partition = ''
+                    for axis, blob in columns.items():
+                        setattr(cloud, axis, blob)
+                    cloud.save(update_fields=['archive_partition', 'file_path', 'checksum', *pointcloud.AXES])
+                    restored += model is LidarPointCloud
+            self.status = self.STATUS_ACTIVE
+            self.archived_bytes = 0
+            self.archived_at = None
+            self.save(update_fields=['status', 'archived_bytes', 'archived_at', 'updated_at'])
+        archive.archive_path(self.key).unlink(missing_ok=True)
+        return restored
+
+    def __str__(self):
+        return f"Partition {self.key} ({self.status})"
+
+    class Meta:
+        verbose_name = "Partition LiDAR"
+        verbose_name_plural = "Partitions LiDAR"
+        ordering = ['key']
+
+
+class Route(models.Model):
+    """
+    Trajet : sessions consécutives d'un même user_id (écart d'au plus
+    LIDAR_ROUTE_MAX_GAP_SEC entre la fin d'une session et le début de la
+    suivante, sans chevauchement, cf. routes.py). Tenu à jour à chaque enregistrement ou
+    suppression de session ; les champs ci-dessous sont des cumuls de ses
+    sessions. Les analyses (analytics) et exports du trajet sont calculés
+    à la demande puis conservés jusqu'au prochain changement d'une session
+    membre (version incrémentée).
+    """
+    user_id = models.CharField(max_length=150, db_index=True)
+    start = models.DateTimeField(db_index=True, help_text="Début de la première session")
+    end = models.DateTimeField(db_index=True, help_text="Fin de la dernière session (timestamp + durée de capture)")
+    session_count = models.PositiveIntegerField(default=0)
+    point_count = models.BigIntegerField(default=0)
+    travelled_distance = models.FloatField(null=True, blank=True, help_text="Somme des distances parcourues (m)")
+    bbox_min_x = models.FloatField(null=True, blank=True)
+    bbox_max_x = models.FloatField(null=True, blank=True)
+    bbox_min_y = models.FloatField(null=True, blank=True)
+    bbox_max_y = models.FloatField(null=True, blank=True)
+    version = models.PositiveIntegerField(default=1, help_text="Incrémentée à chaque changement : invalide les caches")
+    analytics = models.JSONField(default=dict, blank=True, help_text="Analyses du trajet ({clé: résultat})")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    # Colonnes de session situant une session dans le temps (regroupement)
+    SPAN_FIELDS = ('id', 'user_id', 'timestamp', 'lidar_capture_duration_sec')
+    # Champs dont la modification change le trajet ou ses résultats
+    MEMBER_FIELDS = (*routes.SESSION_FIELDS[1:], 'user_id')
+
+    @classmethod
+    def regroup_rows(cls, rows, using=None):
+        """
+        Regroupe les trajets autour de sessions ajoutées, modifiées ou
+        supprimées (lignes de SPAN_FIELDS), utilisateur par utilisateur.
+        """
+        field = ProfilometreLidarData._meta.get_field('timestamp')
+        per_user = {}
+        for row in rows:
+            start = field.to_python(row['timestamp'])
+            end = routes.session_end(start, row['lidar_capture_duration_sec'])
+            span, ids = per_user.setdefault(str(row['user_id']), ([start, end], []))
+            span[0], span[1] = min(span[0], start), max(span[1], end)
+            ids.append(row['id'])
+        for user_id, (span, ids) in per_user.items():
+            cls.regroup(user_id, span, ids, using=using)
+
+    @classmethod
+    def regroup(cls, user_id, span, sessions=(), using=None):
+        """
+        Regroupe les sessions de user_id autour de la période span (début,
+        fin) : les trajets qui la touchent et les sessions `sessions` sont
+        redécoupés. Les trajets existants gardent leur id, dans l'ordre
+        chronologique ; seuls ceux dont les sessions changent (membres ou
+        session de `sessions`) changent de version (caches invalidés).
+        """
+        gap = routes.max_gap()
+        start, end = span
+        old = list(
+            cls.objects.using(using)
+            .filter(user_id=user_id, start__lte=end + gap, end__gte=start - gap)
+            .order_by('start', 'pk')
+        )
+        rows = list(
+            ProfilometreLidarData.objects.using(using)
+            .filter(Q(route__in=old) | Q(pk__in=sessions), user_id=user_id)
+            .order_by('timestamp', 'pk').values(*routes.SESSION_FIELDS, 'route_id')
+        )
+        cls._assign(user_id, old, routes.group_sessions(rows, gap), changed=set(sessions), using=using)
+
+    @classmethod
+    def _assign(cls, user_id, old, groups, changed=None, using=None):
+        """
+        Enregistre les groupes de sessions en réutilisant les trajets `old`
+        (ordre chronologique). Un trajet n'est réécrit (version incrémentée,
+        analyses et exports invalidés) que si ses sessions ne sont plus les
+        mêmes ou si l'une d'elles est dans `changed` (None : toutes).
+        """
+        members = {}
+        for group in groups:
+            for row in group:
+                members.setdefault(row['route_id'], set()).add(row['id'])
+        modified = []
+        for index, group in enumerate(groups):
+            route = old[index] if index < len(old) else cls(user_id=user_id, version=0)
+            ids = {row['id'] for row in group}
+            # Session supprimée : absente des lignes, mais encore comptée dans session_count
+            unchanged = (
+                route.pk is not None and changed is not None and not ids & changed
+                and members.get(route.pk) == ids and len(ids) == route.session_count
+            )
+            if unchanged:
+                continue
+            for name, value in routes.summarize(group).items():
+                setattr(route, name, value)
+            route.version += 1
+            route.analytics = {}
+            route.save(using=using)
+            modified.append(route.pk)
+            ProfilometreLidarData.objects.using(using).filter(pk__in=ids).exclude(route=route).update(route=route)
+        removed = [route.pk for route in old[len(groups):]]
+        cls.objects.using(using).filter(pk__in=removed).delete()
+        cls.discard_exports(modified + removed, using=using)
+
+    @classmethod
+    def rebuild(cls):
+        """
+        Regroupe toutes les sessions (après un changement de
+        LIDAR_ROUTE_MAX_GAP_SEC ou des sessions modifiées par QuerySet.update()).
+        """
+        gap = routes.max_gap()
+        sessions = ProfilometreLidarData.objects.order_by('user_id', 'timestamp', 'pk').values(
+            'user_id', *routes.SESSION_FIELDS, 'route_id'
+        )
+        per_user = {}
+        for row in sessions.iterator():
+            per_user.setdefault(row['user_id'], []).append(row)
+        with transaction.atomic():
+            for user_id in set(per_user) | set(cls.objects.values_list('user_id', flat=True)):
+                old = list(cls.objects.filter(user_id=user_id).order_by('start', 'pk'))
+                cls._assign(user_id, old, routes.group_sessions(per_user.get(user_id, []), gap))
+
+    # ------------------------- Points fusionnés -------------------------
+    def iter_points(self, chunk_points=None):
+        """
+        Points du trajet dans l'ordre chronologique, par tranches
+        {x, y, z, t, session} (t en secondes depuis le début du trajet, le
+        premier point de chaque session à son timestamp), fusionnés à la
+        volée depuis les nuages des sessions (cf. routes.py).
+        """
+        clouds = (
+            LidarPointCloud.objects.filter(session__route=self)
+            .select_related('session')
+            .only(
+                'id', 'session_id', 'coord_dtype', 'point_count', 'archive_partition', 'file_path',
+                'time_index', 'timed_count', 'session__timestamp',
+            )
+            .order_by('session__timestamp', 'session_id')
+        )
+        return routes.merge_streams([
+            routes.session_stream(
+                cloud, (cloud.session.timestamp - self.start).total_seconds() - cloud.first_timestamp(), chunk_points
+            )
+            for cloud in clouds
+        ])
+
+    def point_arrays(self):
+        """Colonnes {x, y, z, t, session} de tout le trajet (déjà dans l'ordre)."""
+        chunks = list(self.iter_points())
+        if not chunks:
+            columns = pointcloud.columns_to_arrays([], [], [], [])
+            return {**columns, 'session': np.empty(0, dtype=np.int64)}
+        return {name: np.concatenate([chunk[name] for chunk in chunks]) for name in chunks[0]}
+
+    # ------------------------- Caches -------------------------
+    def cached(self, key, compute):
+        """
+        Résultat d'analyse `key` du trajet, calculé une fois par version.
+        N'est enregistré que si le trajet n'a pas changé entre-temps.
+        """
+        if key in self.analytics:
+            return self.analytics[key]
+        result = compute()
+        self.analytics = {**self.analytics, key: result}
+        type(self).objects.filter(pk=self.pk, version=self.version).update(analytics=self.analytics)
+        return result
+
+    def iri(self, segment_length=None, sample_interval=None):
+        """IRI sur tout le trajet, sans coupure aux frontières de sessions (roughness.ProfileTooShort)."""
+        if segment_length is None:
+            segment_length = settings.LIDAR_IRI_SEGMENT_LENGTH
+        if sample_interval is None:
+            sample_interval = settings.LIDAR_IRI_SAMPLE_INTERVAL
+        return self.cached(
+            f"iri:{segment_length}:{sample_interval}",
+            lambda: {
+                'segment_length': segment_length,
+                'sample_interval': sample_interval,
+                **roughness.compute_iri(self.point_arrays(), segment_length, sample_interval),
+            },
+        )
+
+    @staticmethod
+    def export_dir():
+        return Path(getattr(settings, 'LIDAR_ROUTE_EXPORT_DIR', Path(settings.BASE_DIR) / 'lidar_route_exports'))
+
+    def export_file(self, export_format):
+        """
+        Fichier d'export du trajet (cf. export.py), écrit à la première
+        demande pour cette version puis resservi tel quel.
+        """
+        from .export import EXPORT_FORMATS
+
+        path = self.export_dir() / f"route-{self.pk}-v{self.version}.{export_format}"
+        if not path.exists():
+            encoder = EXPORT_FORMATS[export_format][0]
+            path.parent.mkdir(parents=True, exist_ok=True)
+            partial = path.with_name(f"{path.name}.{uuid.uuid4().hex}.part")
+            with open(partial, 'wb') as output:
+                for block in encoder(self.sessions.all(), points=((chunk, chunk['session']) for chunk in self.iter_points())):
+                    output.write(block)
+            os.replace(partial, path)
+        return path
+
+    @classmethod
+    def discard_exports(cls, route_ids, using=None):
+        """Fichiers d'export des trajets modifiés, effacés une fois la transaction validée."""
+        def remove():
+            for route_id in route_ids:
+                for path in cls.export_dir().glob(f"route-{route_id}-v*"):
+                    path.unlink(missing_ok=True)
+
+        if route_ids:
+            transaction.on_commit(remove, using=using)
+
+    def __str__(self):
+        return f"Trajet {self.user_id} {self.start:%Y-%m-%d %H:%M} ({self.session_count} sessions)"
+
+    class Meta:
+        verbose_name = "Trajet LiDAR"
+        verbose_name_plural = "Trajets LiDAR"
+        ordering = ['-start']
+        indexes = [
+            models.Index(fields=['user_id', 'start']),
+        ]
+
+
 class Subscription(models.Model):
     """
     Modèle pour gérer les abonnements des utilisateurs
@@ -163,6 +1642,15 @@ class Subscription(models.Model):
     is_active = models.BooleanField(default=True)
     max_devices = models.PositiveIntegerField(default=1)  # Nombre maximum d'appareils
     max_distance = models.FloatField(default=50.0)       # Distance maximale autorisée pour l'analyse (ex: km)
+    total_space = models.BigIntegerField(
+        null=True, blank=True,
+        help_text="Quota de stockage des nuages de points (octets) ; vide = illimité"
+    )
+
+    @property
+    def space_consumed(self):
+        """Octets stockés par l'utilisateur (compteur UserUsage, une ligne)."""
+        return UserUsage.stored_bytes_of(self.user_id)
 
     def __str__(self):
         return f"{self.user.email} - {self.plan_name} ({'actif' if self.is_active else 'inactif'})"
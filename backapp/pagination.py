@@ -0,0 +1,132 @@
+"""
+Pagination par curseur (keyset) des listes.
+
+La page suivante est lue par un WHERE sur la clé de tri complète (index),
+sans COUNT(*) ni OFFSET : le coût d'une page ne dépend pas de sa profondeur.
+Le curseur porte les valeurs de tous les champs de tri du dernier élément
+(timestamp, id) : des timestamps égaux sont départagés par l'id, là où le
+CursorPagination de DRF ne filtre que sur le premier champ et saute les
+ex aequo par OFFSET.
+"""
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor, CursorPagination
+from rest_framework.response import Response
+
+
+class KeysetPagination(CursorPagination):
+    """
+    ?page_size= (plafonné à max_page_size) ; ?count=1 ajoute le nombre total
+    d'éléments (COUNT exact, à la demande seulement).
+    """
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    count_query_param = 'count'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count = None
+        if request.query_params.get(self.count_query_param, '').lower() in ('1', 'true'):
+            self.count = queryset.count()
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        self.model = queryset.model
+
+        # Page précédente : tri inversé à partir du premier élément affiché
+        reverse = bool(self.cursor and self.cursor.reverse)
+        ordering = [_invert(field) for field in self.ordering] if reverse else list(self.ordering)
+        queryset = queryset.order_by(*ordering)
+        if self.cursor is not None and self.cursor.position is not None:
+            queryset = queryset.filter(self._after(ordering, self._decode_position(self.cursor.position)))
+
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        has_more = len(results) > self.page_size
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = bool(self.page), has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.cursor is not None
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=self._position(self.page[-1])))
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(Cursor(offset=0, reverse=True, position=self._position(self.page[0])))
+
+    def _fields(self):
+        return [self.model._meta.get_field(field.lstrip('-')) for field in self.ordering]
+
+    def _position(self, item):
+        return json.dumps([field.value_to_string(item) for field in self._fields()])
+
+    def _decode_position(self, position):
+        try:
+            values = json.loads(position)
+            if not isinstance(values, list) or len(values) != len(self.ordering):
+                raise ValueError
+            return [field.to_python(value) for field, value in zip(self._fields(), values)]
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    @staticmethod
+    def _after(ordering, values):
+        """Éléments après `values` dans l'ordre `ordering` : (a, b) > (va, vb) sur l'index."""
+        condition, equal = Q(), Q()
+        for field, value in zip(ordering, values):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        return condition
+
+    def get_paginated_response(self, data):
+        body = {
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        }
+        if self.count is not None:
+            body = {'count': self.count, **body}
+        return Response(body)
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema['properties']['count'] = {'type': 'integer', 'example': 123}
+        return response_schema
+
+
+def _invert(field):
+    return field[1:] if field.startswith('-') else f'-{field}'
+
+
+class SessionPagination(KeysetPagination):
+    """Sessions LiDAR, les plus récentes d'abord (index user_id, timestamp)."""
+    ordering = ('-timestamp', '-id')
+
+
+class RoutePagination(KeysetPagination):
+    """Trajets, les plus récents d'abord (index user_id, start)."""
+    ordering = ('-start', '-id')
+
+
+class VentePagination(KeysetPagination):
+    """Ventes d'un vendeur, les plus récentes d'abord (index vendeur, date)."""
+    ordering = ('-date', '-id')
+
+
+class UserPagination(KeysetPagination):
+    """Utilisateurs, les derniers inscrits d'abord (clé primaire)."""
+    ordering = '-id'
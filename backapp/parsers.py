@@ -0,0 +1,270 @@
+"""
+Parsers DRF pour les formats binaires d'envoi LiDAR.
+
+Les deux formats produisent le même dictionnaire que le JSON, mais les
+points arrivent déjà en colonnes NumPy sous la clé 'lidar_arrays', sans
+passer par un dictionnaire Python par point. Les formulaires (urlencoded,
+multipart) restent acceptés pour les clients d'origine.
+"""
+import io
+import json
+import struct
+import zlib
+
+import msgpack
+import numpy as np
+from django.conf import settings
+from django.core.files.uploadhandler import load_handler
+from django.http.multipartparser import MultiPartParser as DjangoMultiPartParser, MultiPartParserError
+from rest_framework import status
+from rest_framework.exceptions import APIException, ParseError, UnsupportedMediaType
+from rest_framework.parsers import BaseParser, FormParser, JSONParser
+
+from . import pointcloud
+
+try:
+    import zstandard
+except ImportError:  # zstd optionnel : gzip et deflate restent disponibles
+    zstandard = None
+
+DECOMPRESSION_ERRORS = (zlib.error,) + ((zstandard.ZstdError,) if zstandard is not None else ())
+
+# En-tête du format packé (little-endian, 16 octets) :
+#   magic "PLDR" | version u8 | flags u8 | réservé u16 | point_count u32 | metadata_length u32
+PACKED_HEADER = struct.Struct('<4sBBHII')
+PACKED_MAGIC = b'PLDR'
+PACKED_VERSION = 1
+FLAG_T_FLOAT64 = 0x01  # timestamps en float64 au lieu de float32
+
+F32 = np.dtype('<f4')
+F64 = np.dtype('<f8')
+
+READ_CHUNK_SIZE = 64 * 1024
+
+
+class PayloadTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = "Corps décompressé trop volumineux."
+    default_code = 'payload_too_large'
+
+
+def supported_encodings():
+    encodings = ['gzip', 'deflate']
+    if zstandard is not None:
+        encodings.append('zstd')
+    return encodings
+
+
+def _zlib_chunks(stream, encoding):
+    data = stream.read(READ_CHUNK_SIZE)
+    if encoding == 'gzip':
+        wbits = 16 + zlib.MAX_WBITS
+    elif len(data) >= 2 and data[0] & 0x0F == 8 and ((data[0] << 8) | data[1]) % 31 == 0:
+        wbits = zlib.MAX_WBITS  # deflate au sens HTTP : flux zlib (RFC 1950)
+    else:
+        wbits = -zlib.MAX_WBITS  # deflate brut, envoyé par certains clients
+    decompressor = zlib.decompressobj(wbits)
+    while data:
+        yield decompressor.decompress(data, READ_CHUNK_SIZE)
+        # La sortie est bornée par appel : on vide le reste avant de relire
+        while decompressor.unconsumed_tail:
+            yield decompressor.decompress(decompressor.unconsumed_tail, READ_CHUNK_SIZE)
+        data = stream.read(READ_CHUNK_SIZE)
+    yield decompressor.flush()
+    if not decompressor.eof:
+        raise ParseError("Corps compressé tronqué")
+
+
+def _zstd_chunks(stream):
+    reader = zstandard.ZstdDecompressor().stream_reader(stream)
+    while True:
+        data = reader.read(READ_CHUNK_SIZE)
+        if not data:
+            break
+        yield data
+
+
+def decompress_stream(stream, encoding, max_size=None):
+    """
+    Décompresse un corps de requête (Content-Encoding gzip, deflate ou zstd)
+    par blocs, en s'arrêtant dès que max_size octets décompressés sont
+    dépassés : une bombe de décompression ne peut pas saturer la mémoire.
+    """
+    encoding = (encoding or '').strip().lower()
+    if encoding in ('', 'identity'):
+        return stream
+    if encoding not in supported_encodings():
+        raise UnsupportedMediaType(encoding, detail=f"Content-Encoding non supporté : {encoding}")
+    if max_size is None:
+        max_size = getattr(settings, 'LIDAR_MAX_DECOMPRESSED_SIZE', 100 * 1024 * 1024)
+    if stream is None:
+        return None
+
+    chunks = _zstd_chunks(stream) if encoding == 'zstd' else _zlib_chunks(stream, encoding)
+    output = io.BytesIO()
+    try:
+        for chunk in chunks:
+            if output.tell() + len(chunk) > max_size:
+                raise PayloadTooLarge()
+            output.write(chunk)
+    except DECOMPRESSION_ERRORS as exc:
+        raise ParseError(f"Corps compressé invalide : {exc}")
+    output.seek(0)
+    return output
+
+
+class DecompressingParserMixin:
+    """
+    Décompresse le corps selon Content-Encoding avant l'analyse. Le worker
+    d'ingestion transmet l'encodage via parser_context['content_encoding'].
+    Un parser qui redéfinit parse() appelle lui-même decompressed().
+    """
+
+    def decompressed(self, stream, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('content_encoding')
+        request = parser_context.get('request')
+        if encoding is None and request is not None:
+            encoding = request.META.get('HTTP_CONTENT_ENCODING')
+        return decompress_stream(stream, encoding)
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        return super().parse(self.decompressed(stream, parser_context), media_type, parser_context)
+
+
+def _column(value, dtype, name):
+    """Colonne msgpack : binaire little-endian, ou tableau de nombres."""
+    try:
+        if isinstance(value, (bytes, bytearray)):
+            return np.frombuffer(value, dtype=dtype)
+        return np.asarray(value, dtype=np.float64)
+    except (TypeError, ValueError):
+        raise ParseError(f"Colonne LiDAR '{name}' invalide")
+
+
+def lidar_columns(columns):
+    """
+    Convertit {x, y, z, t} (+ dtype optionnel, 'float32' par défaut pour les
+    colonnes binaires) en colonnes NumPy de même longueur.
+    """
+    if not isinstance(columns, dict):
+        raise ParseError("Le champ 'lidar' doit contenir les colonnes x, y, z, t")
+    dtype = F64 if columns.get('dtype') == 'float64' else F32
+    try:
+        x, y, z, t = (_column(columns[axis], dtype, axis) for axis in pointcloud.AXES)
+    except KeyError as exc:
+        raise ParseError(f"Colonne LiDAR manquante : {exc.args[0]}")
+    if not (x.size == y.size == z.size == t.size):
+        raise ParseError("Les colonnes LiDAR n'ont pas la même longueur")
+    return pointcloud.columns_to_arrays(x, y, z, t)
+
+
+class IngestJSONParser(DecompressingParserMixin, JSONParser):
+    pass
+
+
+class MessagePackParser(DecompressingParserMixin, BaseParser):
+    """
+    application/msgpack : même structure que le JSON (session ou liste de
+    sessions). Les points peuvent être envoyés en colonnes dans 'lidar'
+    plutôt qu'en liste d'objets dans json_data.lidar_data.
+    """
+    media_type = 'application/msgpack'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        stream = self.decompressed(stream, parser_context)
+        try:
+            data = msgpack.unpackb(stream.read() if stream is not None else b'', raw=False, strict_map_key=False)
+        except (ValueError, msgpack.UnpackException) as exc:
+            raise ParseError(f"MessagePack invalide : {exc}")
+        for session in (data if isinstance(data, list) else [data]):
+            if isinstance(session, dict) and 'lidar' in session:
+                session['lidar_arrays'] = lidar_columns(session.pop('lidar'))
+        return data
+
+
+class PackedLidarParser(DecompressingParserMixin, BaseParser):
+    """
+    application/vnd.profilometre.lidar : en-tête PACKED_HEADER, métadonnées
+    JSON (user_id, session_id, timestamp, json_data, distance), puis les
+    colonnes x, y, z, t en float32 little-endian (t en float64 si
+    FLAG_T_FLOAT64). Voir IOT_MOBILE_INTEGRATION.md.
+    """
+    media_type = 'application/vnd.profilometre.lidar'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        stream = self.decompressed(stream, parser_context)
+        body = stream.read() if stream is not None else b''
+        if len(body) < PACKED_HEADER.size:
+            raise ParseError("Corps trop court pour l'en-tête LiDAR")
+        magic, version, flags, _, count, meta_length = PACKED_HEADER.unpack_from(body)
+        if magic != PACKED_MAGIC or version != PACKED_VERSION:
+            raise ParseError("En-tête LiDAR inconnu (magic ou version)")
+
+        t_dtype = F64 if flags & FLAG_T_FLOAT64 else F32
+        offset = PACKED_HEADER.size + meta_length
+        expected = offset + count * (3 * F32.itemsize + t_dtype.itemsize)
+        if len(body) != expected:
+            raise ParseError(f"Taille incohérente : {len(body)} octets reçus, {expected} attendus")
+
+        try:
+            data = json.loads(body[PACKED_HEADER.size:offset] or b'{}')
+        except ValueError as exc:
+            raise ParseError(f"Métadonnées JSON invalides : {exc}")
+        if not isinstance(data, dict):
+            raise ParseError("Les métadonnées doivent être un objet JSON")
+
+        columns = []
+        for dtype in (F32, F32, F32, t_dtype):
+            columns.append(np.frombuffer(body, dtype=dtype, count=count, offset=offset))
+            offset += count * dtype.itemsize
+        data['lidar_arrays'] = pointcloud.columns_to_arrays(*columns)
+        return data
+
+
+def form_fields(data):
+    """
+    Champs d'un formulaire (dernière valeur de chaque champ) ; json_data,
+    envoyé en chaîne JSON, est décodé comme le fait le serializer.
+    """
+    fields = data.dict()
+    if isinstance(fields.get('json_data'), str):
+        try:
+            fields['json_data'] = json.loads(fields['json_data'])
+        except ValueError:
+            pass  # refusé ensuite par la validation du serializer
+    return fields
+
+
+class IngestFormParser(DecompressingParserMixin, FormParser):
+    """application/x-www-form-urlencoded, accepté par l'endpoint d'origine."""
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        return form_fields(super().parse(stream, media_type, parser_context))
+
+
+class IngestMultiPartParser(DecompressingParserMixin, BaseParser):
+    """
+    multipart/form-data, accepté par l'endpoint d'origine. Le corps déjà lu
+    (empreinte, file asynchrone) est analysé sans objet request ; seuls les
+    champs sont retenus, les fichiers joints sont ignorés.
+    """
+    media_type = 'multipart/form-data'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        stream = self.decompressed(stream, parser_context)
+        body = stream.read() if stream is not None else b''
+        meta = {'CONTENT_TYPE': media_type, 'CONTENT_LENGTH': str(len(body))}
+        handlers = [load_handler(handler) for handler in settings.FILE_UPLOAD_HANDLERS]
+        encoding = (parser_context or {}).get('encoding', settings.DEFAULT_CHARSET)
+        try:
+            data, _files = DjangoMultiPartParser(meta, io.BytesIO(body), handlers, encoding).parse()
+        except MultiPartParserError as exc:
+            raise ParseError(f"Formulaire multipart invalide : {exc}")
+        return form_fields(data)
+
+
+# Formats acceptés par les endpoints d'ingestion (et rejoués par les workers)
+INGEST_PARSER_CLASSES = [
+    IngestJSONParser, MessagePackParser, PackedLidarParser, IngestFormParser, IngestMultiPartParser,
+]
@@ -0,0 +1,324 @@
+"""
+Outils NumPy pour les nuages de points LiDAR.
+
+Les points arrivent au format JSON historique {x, y, z, timestamp_sec} ; ils
+sont stockés sous forme de tableaux contigus little-endian, une colonne par
+axe, et relus sans passer par des dictionnaires Python.
+"""
+import operator
+
+import numpy as np
+from django.conf import settings
+
+AXES = ('x', 'y', 'z', 't')
+TIMESTAMP_DTYPE = np.dtype('<f8')
+
+
+def coord_dtype(name=None):
+    """Type des colonnes x, y, z (float32 par défaut, configurable)."""
+    name = name or getattr(settings, 'LIDAR_COORD_DTYPE', 'float32')
+    return np.dtype(name).newbyteorder('<')
+
+
+def stored_size(point_count, dtype=None):
+    """Octets occupés par point_count points : colonnes x, y, z et t."""
+    return point_count * (3 * coord_dtype(dtype).itemsize + TIMESTAMP_DTYPE.itemsize)
+
+
+_POINT_KEYS = ('x', 'y', 'z', 'timestamp_sec')
+_get_point = operator.itemgetter(*_POINT_KEYS)
+
+
+def _as_float(value):
+    if value is None:
+        return np.nan
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _tolerant_row(p):
+    if not isinstance(p, dict):
+        return (np.nan,) * 4
+    return tuple(_as_float(p.get(key)) for key in _POINT_KEYS)
+
+
+def points_to_arrays(points, dtype=None):
+    """
+    Convertit une liste de points {x, y, z, timestamp_sec} en colonnes NumPy.
+    Les valeurs absentes ou invalides deviennent NaN.
+    """
+    try:
+        # Chemin rapide : points complets, une seule conversion en matrice (n, 4)
+        matrix = np.array(list(map(_get_point, points)), dtype=np.float64)
+    except (KeyError, TypeError, ValueError):
+        matrix = np.array([_tolerant_row(p) for p in points], dtype=np.float64)
+    matrix = matrix.reshape(-1, 4)
+    return columns_to_arrays(matrix[:, 0], matrix[:, 1], matrix[:, 2], matrix[:, 3], dtype)
+
+
+def columns_to_arrays(x, y, z, t, dtype=None):
+    """Normalise des colonnes déjà numériques (types et contiguïté)."""
+    xyz = coord_dtype(dtype)
+    return {
+        'x': np.ascontiguousarray(x, dtype=xyz),
+        'y': np.ascontiguousarray(y, dtype=xyz),
+        'z': np.ascontiguousarray(z, dtype=xyz),
+        't': np.ascontiguousarray(t, dtype=TIMESTAMP_DTYPE),
+    }
+
+
+def _to_python(column):
+    # float32 -> représentation la plus courte ("1.1" et non 1.100000023841858)
+    if column.dtype.itemsize == 4:
+        column = column.astype(str).astype(np.float64)
+    values = column.tolist()
+    if np.isnan(column).any():
+        values = [None if v != v else v for v in values]
+    return values
+
+
+def arrays_to_points(arrays):
+    """Reconstruit la liste JSON historique à partir des colonnes."""
+    xs, ys, zs, ts = (_to_python(arrays[axis]) for axis in AXES)
+    return [
+        {'x': x, 'y': y, 'z': z, 'timestamp_sec': t}
+        for x, y, z, t in zip(xs, ys, zs, ts)
+    ]
+
+
+def sort_by_time(arrays):
+    """
+    Colonnes triées par timestamp (tri stable, timestamps absents en fin).
+    Renvoie les colonnes telles quelles si elles sont déjà dans l'ordre.
+    """
+    t = arrays['t']
+    timed = int(np.count_nonzero(~np.isnan(t)))
+    if not np.isnan(t[:timed]).any() and not (np.diff(t[:timed]) < 0).any():
+        return arrays
+    order = np.argsort(t, kind='stable')
+    return {axis: np.ascontiguousarray(arrays[axis][order]) for axis in AXES}
+
+
+def _trajectory_points(arrays):
+    # Points valides (t et coordonnées du trajet finies), dans l'ordre des timestamps
+    axes = ('x', 'y', 'z') if getattr(settings, 'LIDAR_TRAJECTORY_3D', False) else ('x', 'y')
+    t = np.asarray(arrays['t'], dtype=np.float64)
+    coords = [np.asarray(arrays[axis], dtype=np.float64) for axis in axes]
+    valid = ~np.isnan(t)
+    for column in coords:
+        valid &= np.isfinite(column)
+    t = t[valid]
+    coords = [column[valid] for column in coords]
+    if (np.diff(t) < 0).any():
+        order = np.argsort(t, kind='stable')
+        t, coords = t[order], [column[order] for column in coords]
+    return t, coords
+
+
+def _trajectory_steps(t, coords):
+    steps = np.sqrt(sum(np.square(np.diff(column)) for column in coords))
+    max_gap = getattr(settings, 'LIDAR_TRAJECTORY_MAX_GAP_SEC', 2.0)
+    if max_gap:
+        steps = steps[np.diff(t) <= max_gap]
+    return float(steps.sum())
+
+
+def trajectory_length(arrays):
+    """
+    Longueur du trajet (m) : somme des pas entre points consécutifs dans
+    l'ordre des timestamps, en x, y (et z si LIDAR_TRAJECTORY_3D). Les points
+    sans coordonnées ou sans timestamp sont ignorés ; un pas qui enjambe une
+    interruption de plus de LIDAR_TRAJECTORY_MAX_GAP_SEC secondes (perte de
+    signal, pause) n'est pas compté.
+    """
+    t, coords = _trajectory_points(arrays)
+    if t.size < 2:
+        return 0.0
+    return _trajectory_steps(t, coords)
+
+
+def trajectory_segment(arrays):
+    """
+    Résumé du trajet d'un morceau de points (upload fractionné) : longueur
+    et premier / dernier point valide [t, x, y(, z)], ou None si le morceau
+    n'a aucun point valide. Cf. joined_trajectory_length.
+    """
+    t, coords = _trajectory_points(arrays)
+    if not t.size:
+        return None
+    return {
+        'length': _trajectory_steps(t, coords) if t.size > 1 else 0.0,
+        'first': [float(t[0])] + [float(column[0]) for column in coords],
+        'last': [float(t[-1])] + [float(column[-1]) for column in coords],
+    }
+
+
+def joined_trajectory_length(segments):
+    """
+    Longueur du trajet de morceaux mis bout à bout (résumés de
+    trajectory_segment, dans l'ordre des index) : longueurs des morceaux
+    plus le pas entre le dernier point d'un morceau et le premier du
+    suivant. Renvoie None si deux morceaux se chevauchent dans le temps :
+    la longueur doit alors être recalculée sur l'ensemble des points.
+    """
+    length, last = 0.0, None
+    for segment in segments:
+        if segment is None:
+            continue
+        first = segment['first']
+        if last is not None:
+            if first[0] < last[0] or len(first) != len(last):
+                return None
+            length += _trajectory_steps(
+                np.array([last[0], first[0]]), [np.array([a, b]) for a, b in zip(last[1:], first[1:])]
+            )
+        length += segment['length']
+        last = segment['last']
+    return length
+
+
+def time_index(t, stride=None):
+    """
+    Index des timestamps d'un nuage trié par t : un timestamp tous les
+    `stride` points, et le nombre de points horodatés (préfixe trié).
+    """
+    if stride is None:
+        stride = getattr(settings, 'LIDAR_TIME_INDEX_STRIDE', 1024)
+    timed = int(np.count_nonzero(~np.isnan(t)))
+    return np.ascontiguousarray(t[:timed:stride], dtype=TIMESTAMP_DTYPE), timed, stride
+
+
+def time_bounds(samples, stride, timed, t_start, t_end):
+    """
+    Plage [début, fin) de points pouvant tomber dans [t_start, t_end],
+    trouvée par recherche dichotomique dans l'index (cf. time_index).
+    """
+    start = 0
+    if t_start is not None:
+        start = max(int(np.searchsorted(samples, t_start, side='left')) - 1, 0) * stride
+    stop = timed
+    if t_end is not None:
+        stop = min(int(np.searchsorted(samples, t_end, side='right')) * stride, timed)
+    return start, max(start, stop)
+
+
+_EMPTY_STATS = {
+    'count': 0,
+    't_count': 0,
+    't_min': None,
+    't_max': None,
+    'xyz_count': 0,
+    'min': None,
+    'max': None,
+    'mean': None,
+    'z_m2': 0.0,
+}
+
+
+def empty_stats():
+    return dict(_EMPTY_STATS)
+
+
+def compute_stats(arrays):
+    """
+    Statistiques fusionnables d'un lot de points (cf. merge_stats), d'où
+    sont tirés les champs dérivés de ProfilometreLidarData.
+    Les colonnes ne sont parcourues qu'en NumPy, jamais point par point.
+    """
+    stats = empty_stats()
+    t = arrays['t']
+    stats['count'] = int(t.size)
+
+    valid_t = t[~np.isnan(t)]
+    if valid_t.size:
+        stats['t_count'] = int(valid_t.size)
+        stats['t_min'] = float(valid_t.min())
+        stats['t_max'] = float(valid_t.max())
+
+    xyz = np.column_stack((arrays['x'], arrays['y'], arrays['z'])).astype(np.float64, copy=False)
+    xyz = xyz[np.isfinite(xyz).all(axis=1)]
+    if xyz.size:
+        mean = xyz.mean(axis=0)
+        stats['xyz_count'] = int(xyz.shape[0])
+        stats['min'] = xyz.min(axis=0).tolist()
+        stats['max'] = xyz.max(axis=0).tolist()
+        stats['mean'] = mean.tolist()
+        stats['z_m2'] = float(np.square(xyz[:, 2] - mean[2]).sum())
+    return stats
+
+
+def merge_stats(a, b):
+    """Combine les statistiques de deux lots (upload par morceaux)."""
+    a = {**_EMPTY_STATS, **a}
+    b = {**_EMPTY_STATS, **b}
+    merged = {'count': a['count'] + b['count'], 't_count': a['t_count'] + b['t_count']}
+    t_min = [v for v in (a['t_min'], b['t_min']) if v is not None]
+    t_max = [v for v in (a['t_max'], b['t_max']) if v is not None]
+    merged['t_min'] = min(t_min) if t_min else None
+    merged['t_max'] = max(t_max) if t_max else None
+
+    na, nb = a['xyz_count'], b['xyz_count']
+    merged['xyz_count'] = na + nb
+    if not na or not nb:
+        source = a if na else b
+        for key in ('min', 'max', 'mean', 'z_m2'):
+            merged[key] = source[key]
+        return merged
+    n = na + nb
+    merged['min'] = np.minimum(a['min'], b['min']).tolist()
+    merged['max'] = np.maximum(a['max'], b['max']).tolist()
+    mean_a, mean_b = np.asarray(a['mean']), np.asarray(b['mean'])
+    merged['mean'] = ((mean_a * na + mean_b * nb) / n).tolist()
+    # Variance de z : fusion de Chan (stable numériquement)
+    delta = mean_b[2] - mean_a[2]
+    merged['z_m2'] = a['z_m2'] + b['z_m2'] + delta * delta * na * nb / n
+    return merged
+
+
+def derived_fields(stats):
+    """Champs extraits pour requêtes rapides, à partir des statistiques."""
+    stats = {**_EMPTY_STATS, **stats}
+    count = stats['count']
+    fields = {
+        'has_lidar_data': count > 0,
+        'lidar_point_count': count,
+        'lidar_capture_duration_sec': None,
+        'sampling_rate_hz': None,
+    }
+    if stats['t_count'] >= 2:
+        duration = stats['t_max'] - stats['t_min']
+        fields['lidar_capture_duration_sec'] = duration
+        if duration > 0:
+            fields['sampling_rate_hz'] = (stats['t_count'] - 1) / duration
+
+    has_xyz = stats['xyz_count'] > 0
+    (x_min, y_min, z_min) = stats['min'] if has_xyz else (None,) * 3
+    (x_max, y_max, z_max) = stats['max'] if has_xyz else (None,) * 3
+    (x_mean, y_mean, z_mean) = stats['mean'] if has_xyz else (None,) * 3
+    fields.update({
+        'bbox_min_x': x_min,
+        'bbox_max_x': x_max,
+        'bbox_min_y': y_min,
+        'bbox_max_y': y_max,
+        'z_min': z_min,
+        'z_max': z_max,
+        'centroid_x': x_mean,
+        'centroid_y': y_mean,
+        'z_mean': z_mean,
+        'z_std': float(np.sqrt(stats['z_m2'] / stats['xyz_count'])) if has_xyz else None,
+    })
+    return fields
+
+
+def pack(column):
+    """Sérialise une colonne en octets (little-endian, contigu)."""
+    return np.ascontiguousarray(column).tobytes()
+
+
+def unpack(blob, dtype):
+    """Vue NumPy en lecture seule sur un blob, sans copie."""
+    if blob is None:
+        return np.empty(0, dtype=dtype)
+    return np.frombuffer(blob, dtype=dtype)
@@ -0,0 +1,59 @@
+"""
+Stockage des nuages de points sur disque (LIDAR_POINT_STORAGE = 'file').
+
+Chaque nuage est un répertoire LIDAR_POINT_DATA_DIR/<aa>/<uuid>/ contenant
+une colonne par fichier .npy (x.npy, y.npy, z.npy, t.npy). La base ne garde
+que le chemin relatif, l'empreinte SHA-256 des colonnes et les métadonnées.
+Les lectures projettent les fichiers en mémoire (mmap) : un découpage ne lit
+que les pages concernées.
+"""
+import hashlib
+import shutil
+import uuid
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+
+from . import pointcloud
+
+
+def storage_mode():
+    return getattr(settings, 'LIDAR_POINT_STORAGE', 'database')
+
+
+def data_dir():
+    return Path(getattr(settings, 'LIDAR_POINT_DATA_DIR', Path(settings.BASE_DIR) / 'lidar_points'))
+
+
+def checksum(arrays):
+    """SHA-256 des colonnes x, y, z, t (octets little-endian, dans cet ordre)."""
+    digest = hashlib.sha256()
+    for axis in pointcloud.AXES:
+        digest.update(np.ascontiguousarray(arrays[axis]).data)
+    return digest.hexdigest()
+
+
+def write_columns(arrays):
+    """
+    Écrit les colonnes d'un nuage dans un nouveau répertoire.
+    Renvoie (chemin relatif, empreinte).
+    """
+    name = uuid.uuid4().hex
+    relative = f"{name[:2]}/{name}"
+    directory = data_dir() / relative
+    directory.mkdir(parents=True)
+    for axis in pointcloud.AXES:
+        np.save(directory / f"{axis}.npy", arrays[axis], allow_pickle=False)
+    return relative, checksum(arrays)
+
+
+def open_columns(relative):
+    """Colonnes {x, y, z, t} projetées en mémoire, en lecture seule."""
+    directory = data_dir() / relative
+    return {axis: np.load(directory / f"{axis}.npy", mmap_mode='r') for axis in pointcloud.AXES}
+
+
+def remove(relative):
+    if relative:
+        shutil.rmtree(data_dir() / relative, ignore_errors=True)
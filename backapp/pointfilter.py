@@ -0,0 +1,160 @@
+"""
+Filtrage des points à l'ingestion (retours parasites des appareils).
+
+Trois étapes, chacune activée par son réglage et appliquée dans cet ordre
+sur les colonnes triées par timestamp :
+- fenêtrage : bornes par axe (LIDAR_FILTER_RANGE), les points hors bornes
+  sont retirés ;
+- points aberrants (SOR) : distance moyenne de chaque point à ses k plus
+  proches voisins (LIDAR_FILTER_SOR_NEIGHBOURS), retiré au-delà de
+  moyenne + LIDAR_FILTER_SOR_STD_RATIO écarts-types ;
+- filtre médian du profil z (LIDAR_FILTER_MEDIAN_WINDOW points) : z est
+  remplacé par la médiane glissante, sans retirer de points.
+
+Les voisins sont cherchés dans une grille de voxels (~k points par voxel
+occupé, cf. spatial.py) : chaque point ne compare que les points de son voxel et des
+voxels voisins, par blocs NumPy. Les points non finis ne sont ni évalués ni
+retirés par le SOR (déjà ignorés par les calculs en aval).
+"""
+import itertools
+
+import numpy as np
+from django.conf import settings
+
+from . import pointcloud, spatial
+
+CHUNK_POINTS = 8192      # points traités par bloc lors de la recherche de voisins
+CANDIDATES_PER_K = 4     # au plus 4 k points lus par voxel voisin (voxels très denses)
+MAX_VOXEL_ITERATIONS = 8  # ajustements de la taille de voxel visant ~k points par voxel occupé
+
+
+def configured_params():
+    """Paramètres des étapes activées (dict vide : filtrage désactivé)."""
+    params = {}
+    gates = getattr(settings, 'LIDAR_FILTER_RANGE', None)
+    if gates:
+        params['range'] = {axis: list(bounds) for axis, bounds in gates.items()}
+    neighbours = getattr(settings, 'LIDAR_FILTER_SOR_NEIGHBOURS', 0)
+    if neighbours:
+        params['sor'] = {'k': int(neighbours), 'std_ratio': float(getattr(settings, 'LIDAR_FILTER_SOR_STD_RATIO', 2.0))}
+    window = getattr(settings, 'LIDAR_FILTER_MEDIAN_WINDOW', 0)
+    if window and window > 1:
+        params['median'] = {'window': int(window) | 1}  # fenêtre impaire, centrée
+    return params
+
+
+def enabled():
+    return bool(configured_params())
+
+
+def range_mask(arrays, gates):
+    """Points dont chaque axe borné est dans [bas, haut] (None : non borné)."""
+    keep = np.ones(len(arrays['t']), dtype=bool)
+    for axis, (low, high) in gates.items():
+        column = arrays[axis]
+        if low is not None:
+            keep &= column >= low
+        if high is not None:
+            keep &= column <= high
+    return keep
+
+
+def knn_mean_distances(xyz, k):
+    """
+    Distance moyenne de chaque point à ses k plus proches voisins (inf s'il
+    a moins de k voisins dans les voxels adjacents : point isolé).
+    """
+    n = len(xyz)
+    mins, maxs = xyz.min(axis=0), xyz.max(axis=0)
+    voxel_size = spatial.choose_voxel_size(mins, maxs, n, points_per_voxel=k)
+    for _ in range(MAX_VOXEL_ITERATIONS):
+        dims, keys = spatial._cell_keys(xyz, mins, maxs, voxel_size)
+        occupancy = n / np.unique(keys).size
+        if k / 2 <= occupancy <= 2 * k:
+            break
+        # Points par voxel occupé ~ taille^d sur les d axes découpés (axes minces : une seule couche)
+        voxel_size *= (k / occupancy) ** (1.0 / max(int((dims > 1).sum()), 1))
+    order = np.argsort(keys, kind='stable')
+    points = xyz[order]
+    cells = np.minimum(np.floor((points - mins) / voxel_size).astype(np.int64), dims - 1)
+    unique, starts, counts = np.unique(keys[order], return_index=True, return_counts=True)
+
+    cap = CANDIDATES_PER_K * k
+    span = np.arange(cap)
+    offsets = [np.array(offset) for offset in itertools.product(*((-1, 0, 1) if d > 1 else (0,) for d in dims))]
+    distances = np.empty(n)
+    for first in range(0, n, CHUNK_POINTS):
+        stop = min(first + CHUNK_POINTS, n)
+        block, block_cells, own = points[first:stop], cells[first:stop], np.arange(first, stop)
+        best = np.full((stop - first, k), np.inf)
+        for offset in offsets:
+            neighbour = block_cells + offset
+            inside = ((neighbour >= 0) & (neighbour < dims)).all(axis=1)
+            wanted = (neighbour[:, 0] * dims[1] + neighbour[:, 1]) * dims[2] + neighbour[:, 2]
+            position = np.minimum(np.searchsorted(unique, wanted), unique.size - 1)
+            count = np.where(inside & (unique[position] == wanted), np.minimum(counts[position], cap), 0)
+            width = int(count.max())
+            if not width:
+                continue
+            valid = span[:width] < count[:, None]
+            index = np.where(valid, starts[position][:, None] + span[:width], 0)
+            d = np.sqrt(np.square(points[index] - block[:, None, :]).sum(axis=2))
+            d[~valid | (index == own[:, None])] = np.inf
+            best = np.partition(np.concatenate((best, d), axis=1), k - 1, axis=1)[:, :k]
+        distances[first:stop] = best.mean(axis=1)
+    result = np.empty(n)
+    result[order] = distances
+    return result
+
+
+def outlier_mask(arrays, k, std_ratio):
+    """Points conservés par le SOR (les points non finis sont conservés)."""
+    xyz = np.column_stack([np.asarray(arrays[axis], dtype=np.float64) for axis in ('x', 'y', 'z')])
+    finite = np.flatnonzero(np.isfinite(xyz).all(axis=1))
+    keep = np.ones(len(xyz), dtype=bool)
+    if finite.size <= k:
+        return keep
+    distances = knn_mean_distances(xyz[finite], k)
+    measured = distances[np.isfinite(distances)]
+    if not measured.size:
+        return keep
+    limit = measured.mean() + std_ratio * measured.std()
+    keep[finite] = distances <= limit
+    return keep
+
+
+def median_z(z, window):
+    """Médiane glissante centrée de z (points finis, bords répétés) ; NaN conservés."""
+    z = np.array(z)
+    finite = np.flatnonzero(np.isfinite(z))
+    if finite.size < 2:
+        return z
+    half = window // 2
+    padded = np.pad(z[finite], half, mode='edge')
+    z[finite] = np.median(np.lib.stride_tricks.sliding_window_view(padded, window), axis=1)
+    return z
+
+
+def apply(arrays, params=None):
+    """
+    Filtre des colonnes {x, y, z, t} triées par timestamp. Renvoie
+    (colonnes filtrées, rapport) ; le rapport (paramètres, points bruts,
+    retirés par étape, z lissés) est enregistré sur la session.
+    """
+    if params is None:
+        params = configured_params()
+    report = {'params': params, 'raw_point_count': len(arrays['t']), 'removed': {}, 'z_smoothed': 0}
+    if 'range' in params:
+        keep = range_mask(arrays, params['range'])
+        report['removed']['range'] = int(keep.size - np.count_nonzero(keep))
+        arrays = {axis: arrays[axis][keep] for axis in pointcloud.AXES}
+    if 'sor' in params:
+        keep = outlier_mask(arrays, params['sor']['k'], params['sor']['std_ratio'])
+        report['removed']['outliers'] = int(keep.size - np.count_nonzero(keep))
+        arrays = {axis: arrays[axis][keep] for axis in pointcloud.AXES}
+    if 'median' in params:
+        z = median_z(arrays['z'], params['median']['window']).astype(arrays['z'].dtype, copy=False)
+        report['z_smoothed'] = int(np.count_nonzero((z != arrays['z']) & np.isfinite(z)))
+        arrays = {**arrays, 'z': z}
+    report['point_count'] = len(arrays['t'])
+    return arrays, report
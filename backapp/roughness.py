@@ -0,0 +1,130 @@
+"""
+Indice de rugosité international (IRI) d'une session LiDAR.
+
+Le profil z est reparamétré par la distance parcourue (trajectoire x, y dans
+l'ordre des timestamps), rééchantillonné à pas constant, puis passé dans le
+modèle quart de véhicule de référence (« Golden Car », ASTM E1926) à 80 km/h.
+La récurrence du modèle est linéaire : elle est évaluée d'un bloc comme une
+convolution (FFT) par sa réponse impulsionnelle, sans boucle Python.
+"""
+import numpy as np
+from django.conf import settings
+
+# Golden Car : raideurs et amortissement rapportés à la masse suspendue
+K1 = 653.0   # pneu
+K2 = 63.3    # suspension
+MU = 0.15    # masse non suspendue / masse suspendue
+C = 6.0      # amortisseur
+SPEED = 80.0 / 3.6          # m/s
+SMOOTHING_BASE = 0.25       # moyenne glissante du profil (m)
+INIT_BASE = 11.0            # longueur servant à initialiser le modèle (m)
+
+
+class ProfileTooShort(ValueError):
+    pass
+
+
+def travelled_profile(arrays):
+    """
+    Profil (distance parcourue, z) : points valides triés par timestamp,
+    distance cumulée dans le plan x, y. Les points immobiles sont ignorés.
+    """
+    x, y, z, t = (np.asarray(arrays[axis], dtype=np.float64) for axis in ('x', 'y', 'z', 't'))
+    valid = np.isfinite(x) & np.isfinite(y) & np.isfinite(z)
+    order = np.argsort(t[valid], kind='stable')  # NaN en dernier
+    x, y, z = x[valid][order], y[valid][order], z[valid][order]
+    distance = np.concatenate(([0.0], np.cumsum(np.hypot(np.diff(x), np.diff(y)))))
+    moving = np.concatenate(([True], np.diff(distance) > 0))
+    return distance[moving], z[moving]
+
+
+def resample(distance, z, sample_interval):
+    """Profil à pas constant (interpolation linéaire)."""
+    if distance.size < 2:
+        raise ProfileTooShort("Profil trop court pour calculer l'IRI.")
+    count = int(np.floor(distance[-1] / sample_interval)) + 1
+    if count < 2:
+        raise ProfileTooShort("Profil trop court pour calculer l'IRI.")
+    grid = np.arange(count) * sample_interval
+    return np.interp(grid, distance, z)
+
+
+def _modal_form(dt):
+    """
+    Forme modale de la récurrence discrète x[i] = ST x[i-1] + PR s[i], avec
+    ST = exp(A dt) et PR = A^-1 (ST - I) B. Renvoie les valeurs propres de ST,
+    les poids de sortie (x1 - x3), la matrice de passage vers la base modale
+    et les poids de la réponse impulsionnelle C ST^m PR.
+    """
+    a = np.array([
+        [0.0, 1.0, 0.0, 0.0],
+        [-K2, -C, K2, C],
+        [0.0, 0.0, 0.0, 1.0],
+        [K2 / MU, C / MU, -(K1 + K2) / MU, -C / MU],
+    ])
+    b = np.array([0.0, 0.0, 0.0, K1 / MU])
+    eigenvalues, vectors = np.linalg.eig(a)
+    to_modal = np.linalg.inv(vectors)
+    decay = np.exp(eigenvalues * dt)
+    output = vectors[0] - vectors[2]          # C V, avec C = [1, 0, -1, 0]
+    input_weights = output * (decay - 1.0) / eigenvalues * (to_modal @ b)
+    return decay, output, to_modal, input_weights
+
+
+def rectified_slope(elevation, sample_interval):
+    """Pente rectifiée |x1 - x3| du quart de véhicule pour chaque pas du profil."""
+    smoothing = max(int(round(SMOOTHING_BASE / sample_interval)), 1)
+    if elevation.size <= smoothing:
+        raise ProfileTooShort("Profil trop court pour calculer l'IRI.")
+    # Pente du profil lissé par moyenne glissante sur SMOOTHING_BASE
+    slope = (elevation[smoothing:] - elevation[:-smoothing]) / (smoothing * sample_interval)
+    n = slope.size
+
+    init_index = min(int(round(INIT_BASE / sample_interval)), elevation.size - 1)
+    init_slope = (elevation[init_index] - elevation[0]) / (init_index * sample_interval)
+    x0 = np.array([init_slope, 0.0, init_slope, 0.0])
+
+    decay, output, to_modal, input_weights = _modal_form(sample_interval / SPEED)
+    powers = decay[None, :] ** np.arange(n + 1)[:, None]       # ST^m en base modale
+    impulse = (powers[:n] @ input_weights).real                 # C ST^m PR
+    free = (powers[1:] @ (output * (to_modal @ x0))).real       # C ST^(i+1) x0
+
+    size = 1 << int(2 * n - 1).bit_length()
+    forced = np.fft.irfft(np.fft.rfft(slope, size) * np.fft.rfft(impulse, size), size)[:n]
+    return np.abs(free + forced)
+
+
+def compute_iri(arrays, segment_length=None, sample_interval=None):
+    """
+    IRI (m/km) d'une session : valeur globale et valeur par segment de
+    `segment_length` mètres de trajet (le dernier segment peut être plus court).
+    """
+    if segment_length is None:
+        segment_length = getattr(settings, 'LIDAR_IRI_SEGMENT_LENGTH', 100.0)
+    if sample_interval is None:
+        sample_interval = getattr(settings, 'LIDAR_IRI_SAMPLE_INTERVAL', 0.25)
+
+    distance, z = travelled_profile(arrays)
+    elevation = resample(distance, z, sample_interval)
+    slopes = rectified_slope(elevation, sample_interval)
+
+    # Pas i : tronçon [i, i + 1) * sample_interval
+    starts = np.arange(slopes.size) * sample_interval
+    segment_index = np.floor(starts / segment_length).astype(np.int64)
+    counts = np.bincount(segment_index)
+    sums = np.bincount(segment_index, weights=slopes)
+    length = slopes.size * sample_interval
+
+    segments = []
+    for index in np.flatnonzero(counts):
+        start = index * segment_length
+        segments.append({
+            'start_m': float(start),
+            'end_m': float(min(start + segment_length, length)),
+            'iri': float(sums[index] / counts[index] * 1000.0),
+        })
+    return {
+        'length_m': float(length),
+        'iri': float(slopes.mean() * 1000.0),
+        'segments': segments,
+    }
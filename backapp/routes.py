@@ -0,0 +1,165 @@
+"""
+Trajets : sessions consécutives d'un même user_id réunies en un parcours
+continu (cf. Route).
+
+Regroupement : les sessions d'un utilisateur, triées par date, restent dans
+le même trajet tant qu'une session commence au plus LIDAR_ROUTE_MAX_GAP_SEC
+secondes après la fin (timestamp + durée de capture) des précédentes. Une
+session qui commence avant cette fin (sessions qui se chevauchent) ouvre un
+nouveau trajet : ses points seraient sinon entrelacés avec ceux des autres.
+
+Points d'un trajet : l'origine de timestamp_sec est propre à chaque appareil
+(0, horloge de l'appareil...) ; le premier point d'une session est placé au
+timestamp de la session, puis les temps sont ramenés au début du trajet.
+Chaque nuage étant déjà trié par timestamp, la vue fusionnée est produite
+par une fusion à k voies de flux triés, tranche par tranche : seules les
+tranches en cours de chaque session sont en mémoire, rien n'est trié à
+nouveau.
+"""
+import datetime
+
+import numpy as np
+from django.conf import settings
+
+from . import pointcloud
+
+
+# Colonnes de session lues pour regrouper et résumer un trajet
+SESSION_FIELDS = (
+    'id', 'timestamp', 'lidar_capture_duration_sec', 'lidar_point_count', 'travelled_distance',
+    'bbox_min_x', 'bbox_max_x', 'bbox_min_y', 'bbox_max_y',
+)
+
+
+def max_gap():
+    return datetime.timedelta(seconds=getattr(settings, 'LIDAR_ROUTE_MAX_GAP_SEC', 300))
+
+
+def session_end(timestamp, duration_sec):
+    return timestamp + datetime.timedelta(seconds=duration_sec or 0.0)
+
+
+def group_sessions(rows, gap=None):
+    """
+    Regroupe des sessions {'id', 'timestamp', 'lidar_capture_duration_sec'...}
+    triées par timestamp : liste de groupes (listes de lignes). Une session
+    qui chevauche le groupe en cours en commence un nouveau.
+    """
+    if gap is None:
+        gap = max_gap()
+    groups, group_end = [], None
+    for row in rows:
+        end = session_end(row['timestamp'], row['lidar_capture_duration_sec'])
+        if group_end is None or not group_end <= row['timestamp'] <= group_end + gap:
+            groups.append([])
+            group_end = end
+        groups[-1].append(row)
+        group_end = max(group_end, end)
+    return groups
+
+
+def _sort_keys(t):
+    # Points sans timestamp en dernier, comme dans les nuages
+    return np.where(np.isnan(t), np.inf, t)
+
+
+def _merge_two(a, b):
+    """Fusion stable de deux tranches triées (a avant b à timestamp égal)."""
+    size = a['key'].size + b['key'].size
+    slots = np.searchsorted(a['key'], b['key'], side='right') + np.arange(b['key'].size)
+    from_b = np.zeros(size, dtype=bool)
+    from_b[slots] = True
+    merged = {}
+    for name, column in a.items():
+        out = np.empty(size, dtype=np.result_type(column, b[name]))
+        out[~from_b] = column
+        out[from_b] = b[name]
+        merged[name] = out
+    return merged
+
+
+def _merge_all(pieces):
+    """Fusion deux à deux (arbre équilibré) de tranches triées : O(n log k)."""
+    while len(pieces) > 1:
+        pieces = [
+            _merge_two(pieces[i], pieces[i + 1]) if i + 1 < len(pieces) else pieces[i]
+            for i in range(0, len(pieces), 2)
+        ]
+    return pieces[0]
+
+
+def merge_streams(streams):
+    """
+    Fusion à k voies de flux triés. Chaque flux produit des tranches
+    {'x', 'y', 'z', 't', 'session'} triées par t (NaN en fin). À chaque
+    étape, tout ce qui précède la plus petite dernière valeur des tranches
+    en cours est fusionné et produit : au moins une tranche est épuisée.
+    """
+    streams = [iter(stream) for stream in streams]
+    buffers = [None] * len(streams)
+    exhausted = [False] * len(streams)
+
+    def refill(i):
+        while not exhausted[i] and (buffers[i] is None or not buffers[i]['key'].size):
+            chunk = next(streams[i], None)
+            if chunk is None:
+                exhausted[i] = True
+                buffers[i] = None
+            else:
+                buffers[i] = {**chunk, 'key': _sort_keys(np.asarray(chunk['t'], dtype=np.float64))}
+
+    for i in range(len(streams)):
+        refill(i)
+    while True:
+        active = [i for i, buffer in enumerate(buffers) if buffer is not None and buffer['key'].size]
+        if not active:
+            return
+        # Un flux qui peut encore produire des points borne ce qui est sûr de sortir
+        bound = min((buffers[i]['key'][-1] for i in active if not exhausted[i]), default=np.inf)
+        pieces = []
+        for i in active:
+            taken = int(np.searchsorted(buffers[i]['key'], bound, side='right'))
+            if taken:
+                pieces.append({name: column[:taken] for name, column in buffers[i].items()})
+                buffers[i] = {name: column[taken:] for name, column in buffers[i].items()}
+        merged = _merge_all(pieces)
+        del merged['key']
+        yield merged
+        for i in active:
+            refill(i)
+
+
+def session_stream(cloud, offset_sec, chunk_points=None):
+    """
+    Tranches d'un nuage, id de session par point ; offset_sec est ajouté aux
+    temps pour les ramener au début du trajet (cf. Route.iter_points).
+    """
+    if chunk_points is None:
+        chunk_points = getattr(settings, 'LIDAR_EXPORT_CHUNK_POINTS', 65536)
+    for start in range(0, cloud.point_count, chunk_points):
+        arrays = cloud.read_range(start, min(start + chunk_points, cloud.point_count))
+        yield {
+            **{axis: arrays[axis] for axis in ('x', 'y', 'z')},
+            't': np.asarray(arrays['t'], dtype=pointcloud.TIMESTAMP_DTYPE) + offset_sec,
+            'session': np.full(arrays['t'].size, cloud.session_id, dtype=np.int64),
+        }
+
+
+def summarize(group):
+    """Champs de Route tirés des lignes de sessions d'un groupe."""
+    def bound(field, pick):
+        values = [row[field] for row in group if row[field] is not None]
+        return pick(values) if values else None
+
+    distances = [row['travelled_distance'] for row in group if row['travelled_distance'] is not None]
+    return {
+        'start': group[0]['timestamp'],
+        'end': max(session_end(row['timestamp'], row['lidar_capture_duration_sec']) for row in group),
+        'session_count': len(group),
+        'point_count': sum(row['lidar_point_count'] or 0 for row in group),
+        'travelled_distance': sum(distances) if distances else None,
+        'bbox_min_x': bound('bbox_min_x', min),
+        'bbox_max_x': bound('bbox_max_x', max),
+        'bbox_min_y': bound('bbox_min_y', min),
+        'bbox_max_y': bound('bbox_max_y', max),
+    }
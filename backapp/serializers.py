@@ -2,7 +2,8 @@ from rest_framework import serializers
 from django.contrib.auth import get_user_model
 from .models import ClientProfile
 from .models import (
-    ProfilometreLidarData, DeviceModel, DeviceInstance, Vente, VendeurProfile
+    ProfilometreLidarData, LidarUpload, IngestJob, IriAnalysis, ChangeDetection, Route, UserUsage, LidarPartition,
+    DeviceModel, DeviceInstance, Vente, VendeurProfile
 )
 
 User = get_user_model()
@@ -63,7 +64,22 @@ class PasswordResetConfirmSerializer(serializers.Serializer):
 # -------------------------------
 # Profilomètre Lidar
 # -------------------------------
-class ProfilometreLidarDataSerializer(serializers.ModelSerializer):
+class SparseFieldsMixin:
+    """
+    Sélection des champs à la construction : fields=[...] garde seulement ces
+    champs, exclude=[...] retire ceux-là (cf. ?fields= / ?exclude= des vues).
+    """
+
+    def __init__(self, *args, fields=None, exclude=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        keep = set(self.fields) if fields is None else set(fields)
+        keep -= set(exclude or ())
+        for name in list(self.fields):
+            if name not in keep:
+                self.fields.pop(name)
+
+
+class ProfilometreLidarDataSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = ProfilometreLidarData
         fields = [
@@ -76,6 +92,20 @@ class ProfilometreLidarDataSerializer(serializers.ModelSerializer):
             'has_personality_data',
             'lidar_point_count',
             'lidar_capture_duration_sec',
+            'bbox_min_x',
+            'bbox_max_x',
+            'bbox_min_y',
+            'bbox_max_y',
+            'centroid_x',
+            'centroid_y',
+            'z_min',
+            'z_max',
+            'z_mean',
+            'z_std',
+            'sampling_rate_hz',
+            'distance',
+            'stored_bytes',
+            'point_filter',
             'created_at',
             'updated_at',
         ]
@@ -84,10 +114,217 @@ class ProfilometreLidarDataSerializer(serializers.ModelSerializer):
             'has_personality_data',
             'lidar_point_count',
             'lidar_capture_duration_sec',
+            'bbox_min_x',
+            'bbox_max_x',
+            'bbox_min_y',
+            'bbox_max_y',
+            'centroid_x',
+            'centroid_y',
+            'z_min',
+            'z_max',
+            'z_mean',
+            'z_std',
+            'sampling_rate_hz',
+            'stored_bytes',
+            'point_filter',
             'created_at',
             'updated_at',
         ]
 
+    def validate_json_data(self, value):
+        if not isinstance(value, dict):
+            raise serializers.ValidationError("json_data doit être un objet JSON")
+        if 'lidar_data' in value and not isinstance(value['lidar_data'], list):
+            raise serializers.ValidationError("lidar_data doit être une liste de points")
+        return value
+
+    def create(self, validated_data):
+        # Colonnes NumPy déjà décodées par un parser binaire (cf. parsers.py)
+        lidar_arrays = validated_data.pop('lidar_arrays', None)
+        instance = ProfilometreLidarData(**validated_data)
+        if lidar_arrays is not None:
+            instance.set_point_arrays(lidar_arrays)
+        instance.save()
+        return instance
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        if 'json_data' in data:
+            # Format historique : lidar_data reconstruit depuis le stockage colonnaire
+            # (ou depuis les colonnes passées en contexte : niveau de détail)
+            data['json_data'] = instance.legacy_json_data(self.context.get('lidar_arrays'))
+        return data
+
+
+class ProfilometreLidarDataBatchItemSerializer(ProfilometreLidarDataSerializer):
+    """Session d'un envoi groupé : l'unicité de session_id est vérifiée pour tout le lot."""
+
+    class Meta(ProfilometreLidarDataSerializer.Meta):
+        extra_kwargs = {'session_id': {'validators': []}}
+
+
+class LidarUploadSerializer(serializers.ModelSerializer):
+    received_chunks = serializers.SerializerMethodField()
+    missing_chunks = serializers.SerializerMethodField()
+
+    class Meta:
+        model = LidarUpload
+        fields = [
+            'session_id',
+            'user_id',
+            'timestamp',
+            'json_data',
+            'total_chunks',
+            'status',
+            'stats',
+            'received_chunks',
+            'missing_chunks',
+            'lidar_session',
+            'created_at',
+            'updated_at',
+        ]
+        read_only_fields = ['status', 'stats', 'lidar_session', 'created_at', 'updated_at']
+
+    def get_received_chunks(self, obj):
+        return obj.received_chunks()
+
+    def get_missing_chunks(self, obj):
+        return obj.missing_chunks()
+
+    def validate_session_id(self, value):
+        if ProfilometreLidarData.objects.filter(session_id=value).exists():
+            raise serializers.ValidationError("Une session avec cet identifiant existe déjà")
+        return value
+
+    def validate_json_data(self, value):
+        if not isinstance(value, dict):
+            raise serializers.ValidationError("json_data doit être un objet JSON")
+        if 'lidar_data' in value:
+            raise serializers.ValidationError("Les points LiDAR sont envoyés par morceaux, pas dans json_data")
+        return value
+
+
+class LidarChunkSerializer(serializers.Serializer):
+    points = serializers.JSONField()
+
+    def validate_points(self, value):
+        if not isinstance(value, list):
+            raise serializers.ValidationError("points doit être une liste de points")
+        return value
+
+
+class IngestJobSerializer(serializers.ModelSerializer):
+    job_id = serializers.UUIDField(source='id', read_only=True)
+
+    class Meta:
+        model = IngestJob
+        fields = [
+            'job_id',
+            'kind',
+            'status',
+            'status_code',
+            'result',
+            'attempts',
+            'created_at',
+            'started_at',
+            'finished_at',
+        ]
+        read_only_fields = fields
+
+
+class UserUsageSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = UserUsage
+        fields = [
+            'session_count',
+            'point_count',
+            'capture_duration_sec',
+            'distance',
+            'stored_bytes',
+            'updated_at',
+        ]
+        read_only_fields = fields
+
+
+class LidarPartitionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = LidarPartition
+        fields = [
+            'key',
+            'status',
+            'session_count',
+            'point_count',
+            'stored_bytes',
+            'archived_bytes',
+            'archived_at',
+            'updated_at',
+        ]
+        read_only_fields = fields
+
+
+class IriAnalysisSerializer(serializers.ModelSerializer):
+    session = serializers.IntegerField(source='cloud.session_id', read_only=True)
+
+    class Meta:
+        model = IriAnalysis
+        fields = [
+            'session',
+            'segment_length',
+            'sample_interval',
+            'length_m',
+            'iri',
+            'segments',
+            'created_at',
+        ]
+        read_only_fields = fields
+
+
+class ChangeDetectionSerializer(serializers.ModelSerializer):
+    reference_session = serializers.IntegerField(source='reference.session_id', read_only=True)
+    compared_session = serializers.IntegerField(source='compared.session_id', read_only=True)
+
+    class Meta:
+        model = ChangeDetection
+        fields = [
+            'reference_session',
+            'compared_session',
+            'cell_size',
+            'threshold',
+            'compared_points',
+            'matched_points',
+            'cell_count',
+            'changed_cells',
+            'mean_delta',
+            'median_delta',
+            'std_delta',
+            'rmse',
+            'min_delta',
+            'max_delta',
+            'created_at',
+        ]
+        read_only_fields = fields
+
+
+class RouteSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Route
+        fields = [
+            'id',
+            'user_id',
+            'start',
+            'end',
+            'session_count',
+            'point_count',
+            'travelled_distance',
+            'bbox_min_x',
+            'bbox_max_x',
+            'bbox_min_y',
+            'bbox_max_y',
+            'version',
+            'updated_at',
+        ]
+        read_only_fields = fields
+
 
 # -------------------------------
 # Device Models & Instances
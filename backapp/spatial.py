@@ -0,0 +1,187 @@
+"""
+Index spatial par voxels (hachage de grille) d'une session LiDAR.
+
+Les points sont recopiés, triés par voxel, dans un blob d'enregistrements
+RECORD_DTYPE. Un répertoire de voxels non vides (clés triées + offsets)
+permet de ne relire que les plages d'enregistrements utiles à une requête
+(boîte, rayon, k plus proches voisins).
+"""
+import numpy as np
+from django.conf import settings
+
+from .pointcloud import arrays_to_points
+
+RECORD_DTYPE = np.dtype([
+    ('x', '<f4'),
+    ('y', '<f4'),
+    ('z', '<f4'),
+    ('t', '<f8'),
+    ('i', '<u4'),  # index du point dans le nuage d'origine
+])
+KEY_DTYPE = np.dtype('<i8')
+OFFSET_DTYPE = np.dtype('<i8')
+MAX_CELLS_PER_AXIS = 1 << 20  # clé linéaire sur 60 bits
+
+
+def choose_voxel_size(mins, maxs, point_count, points_per_voxel=None):
+    """
+    Taille de voxel visant ~points_per_voxel points par voxel non vide.
+    Les axes plats (profil routier : z presque constant) sont ignorés.
+    """
+    if points_per_voxel is None:
+        points_per_voxel = getattr(settings, 'LIDAR_SPATIAL_POINTS_PER_VOXEL', 64)
+    extents = np.asarray(maxs, dtype=np.float64) - np.asarray(mins, dtype=np.float64)
+    spread = extents[extents > 1e-9]
+    if point_count == 0 or spread.size == 0:
+        return 1.0
+    cells = max(point_count / points_per_voxel, 1.0)
+    size = float(np.prod(spread) / cells) ** (1.0 / spread.size)
+    # Borne basse : au plus MAX_CELLS_PER_AXIS voxels par axe
+    return max(size, float(spread.max()) / (MAX_CELLS_PER_AXIS - 1), 1e-6)
+
+
+def _cell_keys(xyz, mins, maxs, voxel_size):
+    """Dimensions de la grille et clé linéaire du voxel de chaque point."""
+    dims = np.minimum(np.floor((maxs - mins) / voxel_size).astype(np.int64) + 1, MAX_CELLS_PER_AXIS)
+    cells = np.minimum(np.floor((xyz - mins) / voxel_size).astype(np.int64), dims - 1)
+    return dims, (cells[:, 0] * dims[1] + cells[:, 1]) * dims[2] + cells[:, 2]
+
+
+class VoxelGrid:
+    """Répertoire des voxels non vides : clés linéaires triées et offsets."""
+
+    def __init__(self, voxel_size, origin, dims, keys, offsets):
+        self.voxel_size = float(voxel_size)
+        self.origin = np.asarray(origin, dtype=np.float64)
+        self.dims = np.asarray(dims, dtype=np.int64)
+        self.keys = keys
+        self.offsets = offsets
+
+    @classmethod
+    def build(cls, arrays, voxel_size=None):
+        """
+        Construit la grille et les enregistrements triés par voxel.
+        Renvoie (grid, records). Les points non finis sont ignorés.
+        """
+        xyz = np.column_stack((arrays['x'], arrays['y'], arrays['z'])).astype(np.float64)
+        valid = np.flatnonzero(np.isfinite(xyz).all(axis=1))
+        xyz = xyz[valid]
+        if xyz.size:
+            mins, maxs = xyz.min(axis=0), xyz.max(axis=0)
+        else:
+            mins = maxs = np.zeros(3)
+        if voxel_size is None:
+            voxel_size = getattr(settings, 'LIDAR_SPATIAL_VOXEL_SIZE', None)
+        if not voxel_size:
+            voxel_size = choose_voxel_size(mins, maxs, len(valid))
+        dims, point_keys = _cell_keys(xyz, mins, maxs, voxel_size)
+        order = np.argsort(point_keys, kind='stable')
+        point_keys = point_keys[order]
+        source = valid[order]
+
+        records = np.empty(source.size, dtype=RECORD_DTYPE)
+        for axis in ('x', 'y', 'z', 't'):
+            records[axis] = arrays[axis][source]
+        records['i'] = source
+
+        keys, starts = np.unique(point_keys, return_index=True)
+        offsets = np.append(starts, source.size).astype(OFFSET_DTYPE)
+        return cls(voxel_size, mins, dims, keys.astype(KEY_DTYPE), offsets), records
+
+    def cell_coords(self):
+        """Coordonnées (ix, iy, iz) de chaque voxel non vide."""
+        nz = self.dims[2]
+        ny = self.dims[1]
+        iz = self.keys % nz
+        iy = (self.keys // nz) % ny
+        ix = self.keys // (nz * ny)
+        return np.column_stack((ix, iy, iz))
+
+    def ranges_for_box(self, lo, hi):
+        """
+        Plages [début, fin) d'enregistrements des voxels qui intersectent la
+        boîte [lo, hi], fusionnées quand elles sont contiguës.
+        """
+        if not self.keys.size:
+            return []
+        lo = np.floor((np.asarray(lo, dtype=np.float64) - self.origin) / self.voxel_size)
+        hi = np.floor((np.asarray(hi, dtype=np.float64) - self.origin) / self.voxel_size)
+        coords = self.cell_coords()
+        hit = np.flatnonzero(((coords >= lo) & (coords <= hi)).all(axis=1))
+        if not hit.size:
+            return []
+        # Voxels consécutifs dans le répertoire = enregistrements contigus
+        breaks = np.flatnonzero(np.diff(hit) > 1)
+        first = hit[np.r_[0, breaks + 1]]
+        last = hit[np.r_[breaks, hit.size - 1]]
+        return list(zip(self.offsets[first].tolist(), self.offsets[last + 1].tolist()))
+
+
+def in_box(records, lo, hi):
+    lo = [-np.inf if v is None else v for v in lo]
+    hi = [np.inf if v is None else v for v in hi]
+    mask = np.ones(records.size, dtype=bool)
+    for axis, low, high in zip('xyz', lo, hi):
+        mask &= (records[axis] >= low) & (records[axis] <= high)
+    return records[mask]
+
+
+def squared_distances(records, center):
+    return (
+        np.square(records['x'] - center[0], dtype=np.float64)
+        + np.square(records['y'] - center[1], dtype=np.float64)
+        + np.square(records['z'] - center[2], dtype=np.float64)
+    )
+
+
+def records_to_points(records):
+    """Enregistrements -> points JSON {x, y, z, timestamp_sec, index}."""
+    points = arrays_to_points({axis: records[axis] for axis in ('x', 'y', 'z', 't')})
+    for point, index in zip(points, records['i'].tolist()):
+        point['index'] = index
+    return points
+
+
+# -------------------- NIVEAUX DE DÉTAIL --------------------
+def voxel_downsample(arrays, target, max_iterations=8):
+    """
+    Sous-échantillonnage par grille de voxels : un point par voxel non vide
+    (barycentre x, y, z et timestamp moyen), avec une taille de voxel ajustée
+    pour obtenir environ `target` points. Renvoie (colonnes, taille de voxel),
+    les points restant dans l'ordre chronologique.
+    """
+    xyz = np.column_stack((arrays['x'], arrays['y'], arrays['z'])).astype(np.float64)
+    valid = np.isfinite(xyz).all(axis=1)
+    xyz = xyz[valid]
+    t = np.asarray(arrays['t'], dtype=np.float64)[valid]
+    if not xyz.size:
+        return {axis: np.empty(0, dtype=arrays[axis].dtype) for axis in ('x', 'y', 'z', 't')}, None
+    mins, maxs = xyz.min(axis=0), xyz.max(axis=0)
+    spread_axes = int(((maxs - mins) > 1e-9).sum()) or 1
+
+    voxel_size = choose_voxel_size(mins, maxs, xyz.shape[0], max(xyz.shape[0] / target, 1.0))
+    best = None
+    for _ in range(max_iterations):
+        _, point_keys = _cell_keys(xyz, mins, maxs, voxel_size)
+        keys, inverse = np.unique(point_keys, return_inverse=True)
+        if best is None or abs(keys.size - target) < abs(best[1].size - target):
+            best = (voxel_size, keys, inverse)
+        if abs(keys.size - target) <= 0.1 * target:
+            break
+        # Nombre de voxels occupés ~ taille^-d sur les d axes non plats
+        voxel_size *= (keys.size / target) ** (1.0 / spread_axes)
+    voxel_size, keys, inverse = best
+
+    counts = np.bincount(inverse, minlength=keys.size)
+    columns = {
+        axis: np.bincount(inverse, weights=xyz[:, i], minlength=keys.size) / counts
+        for i, axis in enumerate(('x', 'y', 'z'))
+    }
+    t_valid = ~np.isnan(t)
+    t_counts = np.bincount(inverse[t_valid], minlength=keys.size)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        columns['t'] = np.bincount(inverse[t_valid], weights=t[t_valid], minlength=keys.size) / t_counts
+
+    order = np.argsort(columns['t'], kind='stable')
+    return {axis: columns[axis][order].astype(arrays[axis].dtype) for axis in ('x', 'y', 'z', 't')}, voxel_size
+
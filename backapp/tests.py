@@ -1,3 +1,1505 @@
-from django.test import TestCase
+import csv
+import datetime
+import gzip
+import json
+import math
+import os
+import subprocess
+import sys
+import tempfile
+import zlib
+from pathlib import Path
+from io import StringIO
+from unittest import mock, skipUnless
+from urllib.parse import urlencode
 
-# Create your tests here.
+import msgpack
+import numpy as np
+from django.contrib.auth.models import User
+from django.conf import settings
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from . import (
+    archive, bboxindex, changes, entitlements, export, ingest, parsers, pointcloud, pointfiles, pointfilter,
+    roughness, routes,
+)
+from .management.commands import run_ingest_workers
+from .models import (
+    ChangeDetection, IngestJob, IriAnalysis, LidarLevelOfDetail, LidarPartition, LidarPointCloud,
+    LidarRawPointCloud, LidarSpatialIndex, ProfilometreLidarData, Route, Subscription, UserUsage,
+)
+from .serializers import ProfilometreLidarDataSerializer
+
+
+def lidar_points(count, t0=0.0):
+    """Points d'une ligne droite, 0,01 s entre deux points."""
+    return [
+        {'x': i * 0.1, 'y': i * 0.05, 'z': (i % 7) * 0.01, 'timestamp_sec': t0 + i * 0.01}
+        for i in range(count)
+    ]
+
+
+def packed_body(metadata, count, t64=False):
+    """Corps au format packé (cf. parsers.PACKED_HEADER) : x = i, y = 2i, z = i % 3, t = 0,5 i."""
+    meta = json.dumps(metadata).encode()
+    x = np.arange(count, dtype=parsers.F32)
+    t = np.arange(count, dtype=parsers.F64 if t64 else parsers.F32) * 0.5
+    header = parsers.PACKED_HEADER.pack(
+        parsers.PACKED_MAGIC, parsers.PACKED_VERSION, parsers.FLAG_T_FLOAT64 if t64 else 0, 0, count, len(meta)
+    )
+    return header + meta + x.tobytes() + (x * 2).tobytes() + (x % 3).tobytes() + t.tobytes()
+
+
+class LidarTestCase(APITestCase):
+    """Utilisateur authentifié avec un abonnement actif (max_distance 1000 km)."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('mobile', 'mobile@example.com', 'pw')
+        self.subscription = Subscription.objects.create(user=self.user, plan_name='Pro', max_distance=1000)
+        self.client.force_authenticate(self.user)
+
+    def session_body(self, session_id, count=10, **extra):
+        return {
+            'user_id': str(self.user.id),
+            'session_id': session_id,
+            'json_data': {'lidar_data': lidar_points(count)},
+            **extra,
+        }
+
+    def create_session(self, session_id, count=10, **fields):
+        fields.setdefault('user_id', str(self.user.id))
+        return ProfilometreLidarData.objects.create(
+            session_id=session_id, json_data={'lidar_data': lidar_points(count)}, **fields
+        )
+
+
+# ---------------------------------------------------------
+# Quota de stockage et refus anticipé
+# ---------------------------------------------------------
+class StorageQuotaTests(LidarTestCase):
+    def fill_quota(self):
+        # 200 points float32 = 4000 octets : quota exactement atteint
+        self.subscription.total_space = 4000
+        self.subscription.save()
+        body = json.dumps(self.session_body('full', 200))
+        response = self.client.post('/profilometre-lidar/', body, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(UserUsage.stored_bytes_of(self.user.id), 4000)
+        return body, response
+
+    def test_quota_refuses_upload_before_parsing(self):
+        self.fill_quota()
+        response = self.client.post('/profilometre-lidar/', '{invalide', content_type='application/json')
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(response.json()['error'], "Quota de stockage dépassé.")
+
+    def test_retry_of_upload_that_filled_quota_is_replayed(self):
+        body, first = self.fill_quota()
+        response = self.client.post('/profilometre-lidar/', body, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response['Idempotent-Replayed'], 'true')
+        self.assertEqual(response.json()['id'], first.json()['id'])
+
+    def test_async_retry_of_upload_that_filled_quota_is_replayed(self):
+        body, first = self.fill_quota()
+        response = self.client.post('/profilometre-lidar/async/', body, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['id'], first.json()['id'])
+
+    def test_upload_for_another_user_is_refused(self):
+        other = User.objects.create_user('other', 'other@example.com', 'pw')
+        Subscription.objects.create(user=other, plan_name='Pro', max_distance=1000)
+        body = {**self.session_body('other'), 'user_id': str(other.id)}
+        response = self.client.post('/profilometre-lidar/', body, format='json')
+        self.assertEqual(response.status_code, 403)
+        response = self.client.post('/profilometre-lidar/batch/', [body], format='json')
+        self.assertEqual(response.json()['results'][0]['status'], 403)
+        self.assertFalse(ProfilometreLidarData.objects.exists())
+
+    def test_staff_quota_is_checked_on_the_owner(self):
+        self.fill_quota()
+        staff = User.objects.create_user('staff', 'staff@example.com', 'pw', is_staff=True)
+        self.client.force_authenticate(staff)
+        # Le quota plein du staff ne compte pas : celui du propriétaire seul
+        Subscription.objects.create(user=staff, plan_name='Pro', max_distance=1000, total_space=0)
+        other = User.objects.create_user('other', 'other@example.com', 'pw')
+        Subscription.objects.create(user=other, plan_name='Pro', max_distance=1000)
+        body = {**self.session_body('for-other'), 'user_id': str(other.id)}
+        response = self.client.post(f'/profilometre-lidar/?user_id={other.id}', body, format='json')
+        self.assertEqual(response.status_code, 201)
+        # Propriétaire au quota atteint : refusé avant l'analyse du corps
+        response = self.client.post(
+            f'/profilometre-lidar/?user_id={self.user.id}', '{invalide', content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 403)
+
+    def test_session_over_quota_is_refused_and_deletion_frees_space(self):
+        self.subscription.total_space = pointcloud.stored_size(250)
+        self.subscription.save()
+        response = self.client.post('/profilometre-lidar/', self.session_body('a', 200), format='json')
+        self.assertEqual(response.status_code, 201)
+        response = self.client.post('/profilometre-lidar/', self.session_body('b', 100), format='json')
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(response.json()['space_consumed'], pointcloud.stored_size(200))
+        response = self.client.post(
+            '/profilometre-lidar/batch/', [self.session_body('c', 30), self.session_body('d', 30)], format='json'
+        )
+        self.assertEqual([result['status'] for result in response.json()['results']], [201, 403])
+        ProfilometreLidarData.objects.get(session_id='c').delete()
+        self.assertEqual(UserUsage.stored_bytes_of(self.user.id), pointcloud.stored_size(200))
+
+    def test_reconcile_command_fixes_drift(self):
+        self.create_session('a', 200)
+        UserUsage.objects.update(stored_bytes=1, session_count=9)
+        ProfilometreLidarData.objects.update(stored_bytes=7)
+        call_command('reconcile_storage_quota', '--dry-run', stdout=StringIO())
+        self.assertEqual(UserUsage.stored_bytes_of(self.user.id), 1)
+        call_command('reconcile_storage_quota', stdout=StringIO())
+        usage = UserUsage.objects.get(user_id=str(self.user.id))
+        self.assertEqual((usage.stored_bytes, usage.session_count), (pointcloud.stored_size(200), 1))
+        self.assertEqual(ProfilometreLidarData.objects.get().stored_bytes, pointcloud.stored_size(200))
+
+    def test_uploader_without_subscription_is_refused_before_parsing(self):
+        self.subscription.delete()
+        response = self.client.post('/profilometre-lidar/', '{invalide', content_type='application/json')
+        self.assertEqual(response.status_code, 404)
+
+
+# ---------------------------------------------------------
+# Droits des abonnements en cache
+# ---------------------------------------------------------
+class EntitlementTests(LidarTestCase):
+    def test_subscription_change_invalidates_the_cache(self):
+        user_id = str(self.user.id)
+        self.assertEqual(entitlements.for_users([user_id])[user_id].max_distance, 1000)
+        with self.assertNumQueries(0):
+            entitlements.for_users([user_id])
+        self.subscription.max_distance = 5
+        self.subscription.save()
+        self.assertEqual(entitlements.for_users([user_id])[user_id].max_distance, 5)
+        self.subscription.delete()
+        self.assertEqual(entitlements.for_users([user_id]), {})
+
+    def test_process_local_cache_is_reported(self):
+        locmem = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        with override_settings(CACHES=locmem):
+            self.assertEqual([warning.id for warning in entitlements.check_shared_cache()], ['backapp.W001'])
+            with override_settings(LIDAR_ENTITLEMENT_CACHE_TTL=0):
+                self.assertEqual(entitlements.check_shared_cache(), [])
+        redis = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://cache'}}
+        with override_settings(CACHES=redis):
+            self.assertEqual(entitlements.check_shared_cache(), [])
+
+
+# ---------------------------------------------------------
+# Champs dérivés (statistiques vectorisées)
+# ---------------------------------------------------------
+class DerivedMetricsTests(LidarTestCase):
+    def test_metrics_skip_invalid_points(self):
+        points = lidar_points(101)
+        points[5] = {'x': 'invalide', 'y': None}
+        session = ProfilometreLidarData.objects.create(
+            user_id=str(self.user.id), session_id='metrics', json_data={'lidar_data': points}
+        )
+        session.refresh_from_db()
+        z = np.array([p['z'] for i, p in enumerate(points) if i != 5], dtype=np.float32).astype(np.float64)
+        self.assertAlmostEqual(session.z_mean, z.mean(), places=5)
+        self.assertAlmostEqual(session.z_std, z.std(), places=5)
+        self.assertAlmostEqual(session.bbox_max_x, 10.0, places=4)
+        self.assertAlmostEqual(session.sampling_rate_hz, 99.0, places=3)
+
+    def test_merged_stats_match_a_single_pass(self):
+        arrays = pointcloud.points_to_arrays(lidar_points(100))
+        head = pointcloud.compute_stats({axis: column[:37] for axis, column in arrays.items()})
+        tail = pointcloud.compute_stats({axis: column[37:] for axis, column in arrays.items()})
+        merged = pointcloud.merge_stats(pointcloud.merge_stats(pointcloud.empty_stats(), head), tail)
+        for key, value in pointcloud.compute_stats(arrays).items():
+            np.testing.assert_allclose(np.array(merged[key], dtype=float), np.array(value, dtype=float), rtol=1e-9)
+
+
+# ---------------------------------------------------------
+# Envoi groupé
+# ---------------------------------------------------------
+class BatchIngestTests(LidarTestCase):
+    def test_each_session_gets_its_own_status(self):
+        self.create_session('existing')
+        body = [self.session_body(f's{i}', 10 + i) for i in range(5)]
+        body += [self.session_body('existing'), self.session_body('s1'), {'session_id': 'invalid'}, 5]
+        response = self.client.post('/profilometre-lidar/batch/', {'sessions': body}, format='json')
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(response.json()['created'], 5)
+        statuses = [result['status'] for result in response.json()['results']]
+        self.assertEqual(statuses, [201] * 5 + [409, 409, 400, 400])
+        session = ProfilometreLidarData.objects.get(session_id='s3')
+        self.assertEqual(session.lidar_point_count, 13)
+        self.assertEqual(LidarPointCloud.objects.count(), 6)
+
+    @override_settings(LIDAR_BATCH_MAX_SESSIONS=2)
+    def test_too_many_sessions_are_refused(self):
+        body = [self.session_body(f's{i}') for i in range(3)]
+        response = self.client.post('/profilometre-lidar/batch/', body, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(ProfilometreLidarData.objects.exists())
+
+
+# ---------------------------------------------------------
+# Formats binaires d'envoi (packé, MessagePack)
+# ---------------------------------------------------------
+class WireFormatTests(LidarTestCase):
+    packed_type = 'application/vnd.profilometre.lidar'
+
+    def test_packed_session(self):
+        body = packed_body({'user_id': str(self.user.id), 'session_id': 'packed', 'json_data': {}}, 100)
+        response = self.client.post('/profilometre-lidar/', body, content_type=self.packed_type)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            response.json()['json_data']['lidar_data'][3], {'x': 3.0, 'y': 6.0, 'z': 0.0, 'timestamp_sec': 1.5}
+        )
+        session = ProfilometreLidarData.objects.get(session_id='packed')
+        self.assertEqual((session.lidar_point_count, session.lidar_capture_duration_sec), (100, 49.5))
+
+    def test_truncated_packed_body_is_refused(self):
+        body = packed_body({'user_id': str(self.user.id), 'session_id': 'packed', 'json_data': {}}, 100)
+        response = self.client.post('/profilometre-lidar/', body[:-3], content_type=self.packed_type)
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(ProfilometreLidarData.objects.exists())
+
+    def test_msgpack_batch_with_binary_and_list_columns(self):
+        x = np.arange(10, dtype=parsers.F32).tobytes()
+        sessions = [
+            {**self.session_body('binary'), 'json_data': {}, 'lidar': {'x': x, 'y': x, 'z': x, 't': x}},
+            {
+                **self.session_body('lists'),
+                'json_data': {},
+                'lidar': {'x': [1, 2], 'y': [1, 2], 'z': [0, 1], 't': [0, 1]},
+            },
+        ]
+        response = self.client.post(
+            '/profilometre-lidar/batch/', msgpack.packb(sessions), content_type='application/msgpack'
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(ProfilometreLidarData.objects.get(session_id='binary').lidar_point_count, 10)
+        self.assertEqual(ProfilometreLidarData.objects.get(session_id='lists').z_max, 1.0)
+
+    def test_packed_chunk(self):
+        self.client.post(
+            '/profilometre-lidar/uploads/', {'user_id': str(self.user.id), 'session_id': 'chunked'}, format='json'
+        )
+        response = self.client.put(
+            '/profilometre-lidar/uploads/chunked/chunks/0/', packed_body({}, 8, t64=True), content_type=self.packed_type
+        )
+        self.assertEqual(response.status_code, 201)
+        self.client.post('/profilometre-lidar/uploads/chunked/finalize/')
+        self.assertEqual(ProfilometreLidarData.objects.get(session_id='chunked').lidar_point_count, 8)
+
+    def test_form_bodies_are_still_accepted(self):
+        def form(session_id):
+            return {**self.session_body(session_id), 'json_data': json.dumps({'lidar_data': lidar_points(10)})}
+
+        response = self.client.post(
+            '/profilometre-lidar/', urlencode(form('urlencoded')), content_type='application/x-www-form-urlencoded'
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.client.post('/profilometre-lidar/', form('multipart')).status_code, 201)
+        self.assertEqual(self.client.post('/profilometre-lidar/async/', form('async')).status_code, 202)
+        self.assertEqual(ingest.process_job(ingest.claim_next_job()).status_code, 201)
+        counts = ProfilometreLidarData.objects.order_by('session_id').values_list('session_id', 'lidar_point_count')
+        self.assertEqual(list(counts), [('async', 10), ('multipart', 10), ('urlencoded', 10)])
+        response = self.client.post('/profilometre-lidar/', 'texte', content_type='text/plain')
+        self.assertEqual(response.status_code, 415)
+
+
+# ---------------------------------------------------------
+# Corps compressés
+# ---------------------------------------------------------
+class CompressedBodyTests(LidarTestCase):
+    def post(self, url, body, encoding):
+        return self.client.generic(
+            'POST', url, body, content_type='application/json', HTTP_CONTENT_ENCODING=encoding
+        )
+
+    def test_gzip_and_deflate_bodies(self):
+        codecs = [('gzip', gzip.compress), ('deflate', zlib.compress), ('deflate', lambda b: zlib.compress(b)[2:-4])]
+        for i, (encoding, compress) in enumerate(codecs):
+            body = json.dumps(self.session_body(f'compressed-{i}', 50)).encode()
+            self.assertEqual(self.post('/profilometre-lidar/', compress(body), encoding).status_code, 201)
+        self.assertEqual(ProfilometreLidarData.objects.count(), 3)
+
+    @skipUnless(parsers.zstandard, "zstandard non installé")
+    def test_zstd_body(self):
+        body = json.dumps(self.session_body('zstd', 50)).encode()
+        response = self.post('/profilometre-lidar/', parsers.zstandard.compress(body), 'zstd')
+        self.assertEqual(response.status_code, 201)
+
+    def test_compressed_binary_bodies(self):
+        packed = packed_body({'user_id': str(self.user.id), 'session_id': 'packed-gzip', 'json_data': {}}, 50)
+        response = self.client.generic(
+            'POST', '/profilometre-lidar/', gzip.compress(packed),
+            content_type='application/vnd.profilometre.lidar', HTTP_CONTENT_ENCODING='gzip',
+        )
+        self.assertEqual(response.status_code, 201)
+        body = msgpack.packb({**self.session_body('msgpack-gzip'), 'json_data': {}, 'lidar': {
+            'x': [1, 2], 'y': [1, 2], 'z': [0, 1], 't': [0, 1],
+        }})
+        response = self.client.generic(
+            'POST', '/profilometre-lidar/', gzip.compress(body),
+            content_type='application/msgpack', HTTP_CONTENT_ENCODING='gzip',
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(ProfilometreLidarData.objects.get(session_id='msgpack-gzip').lidar_point_count, 2)
+
+    def test_invalid_and_unsupported_bodies(self):
+        self.assertEqual(self.post('/profilometre-lidar/', b'invalide', 'gzip').status_code, 400)
+        self.assertEqual(self.post('/profilometre-lidar/', b'x', 'br').status_code, 415)
+
+    @override_settings(LIDAR_MAX_DECOMPRESSED_SIZE=1024 * 1024)
+    def test_decompression_is_bounded(self):
+        bomb = gzip.compress(b'[' + b' ' * (20 * 1024 * 1024) + b']')
+        self.assertEqual(self.post('/profilometre-lidar/batch/', bomb, 'gzip').status_code, 413)
+
+    def test_async_job_replays_the_compressed_body(self):
+        body = gzip.compress(json.dumps(self.session_body('async-gzip')).encode())
+        self.assertEqual(self.post('/profilometre-lidar/async/', body, 'gzip').status_code, 202)
+        job = ingest.process_job(ingest.claim_next_job())
+        self.assertEqual(job.status_code, 201)
+
+
+# ---------------------------------------------------------
+# Renvois idempotents
+# ---------------------------------------------------------
+class IdempotencyTests(LidarTestCase):
+    def post(self, body, url='/profilometre-lidar/', **extra):
+        return self.client.post(url, body, content_type='application/json', **extra)
+
+    def test_identical_body_is_replayed_without_parsing(self):
+        body = json.dumps(self.session_body('replay', 50))
+        first = self.post(body)
+        self.assertEqual(first.status_code, 201)
+        with mock.patch.object(ingest, 'parse_payload', side_effect=AssertionError("corps analysé")):
+            second = self.post(body)
+        self.assertEqual(second.status_code, 201)
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(second.json()['id'], first.json()['id'])
+        self.assertEqual(ProfilometreLidarData.objects.count(), 1)
+
+    def test_different_body_for_same_session_conflicts(self):
+        self.post(json.dumps(self.session_body('replay', 50)))
+        self.assertEqual(self.post(json.dumps(self.session_body('replay', 51))).status_code, 409)
+
+    def test_compressed_body_is_hashed_as_received(self):
+        body = gzip.compress(json.dumps(self.session_body('gzip', 5)).encode())
+        self.assertEqual(self.post(body, HTTP_CONTENT_ENCODING='gzip').status_code, 201)
+        self.assertEqual(self.post(body, HTTP_CONTENT_ENCODING='gzip')['Idempotent-Replayed'], 'true')
+
+    def test_async_retry_returns_the_same_job_then_the_session(self):
+        body = json.dumps(self.session_body('async'))
+        url = '/profilometre-lidar/async/'
+        self.assertEqual(self.post(body, url).json()['job_id'], self.post(body, url).json()['job_id'])
+        ingest.process_job(ingest.claim_next_job())
+        self.assertEqual(self.post(body, url).status_code, 201)
+
+    def test_replay_is_limited_to_the_uploader(self):
+        body = json.dumps(self.session_body('mine'))
+        self.post(body)
+        other = User.objects.create_user('other', 'other@example.com', 'pw')
+        Subscription.objects.create(user=other, plan_name='Pro', max_distance=1000)
+        self.client.force_authenticate(other)
+        self.assertEqual(self.post(body).status_code, 403)
+
+
+# ---------------------------------------------------------
+# File d'ingestion asynchrone
+# ---------------------------------------------------------
+class IngestJobTests(LidarTestCase):
+    def enqueue(self, body):
+        response = self.client.post('/profilometre-lidar/async/', body, format='json')
+        self.assertEqual(response.status_code, 202)
+        return IngestJob.objects.get(pk=response.json()['job_id'])
+
+    def test_job_is_processed_and_reported(self):
+        job = self.enqueue(self.session_body('async'))
+        ingest.process_job(ingest.claim_next_job())
+        response = self.client.get(f'/profilometre-lidar/jobs/{job.pk}/')
+        self.assertEqual(response.json()['status'], IngestJob.STATUS_DONE)
+        self.assertEqual(response.json()['status_code'], 201)
+        self.assertTrue(ProfilometreLidarData.objects.filter(session_id='async').exists())
+
+    def test_unexpected_error_fails_the_job(self):
+        job = self.enqueue(self.session_body('boom'))
+        with mock.patch.object(ingest, 'ingest_session', side_effect=ValueError("colonnes invalides")):
+            ingest.process_job(ingest.claim_next_job())
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.status_code), (IngestJob.STATUS_FAILED, 500))
+        self.assertIn("ValueError", job.result['detail'])
+        self.assertIsNone(ingest.claim_next_job())
+
+    def test_interrupted_job_is_abandoned_after_max_attempts(self):
+        job = self.enqueue(self.session_body('poison'))
+        for _ in range(ingest.max_attempts()):
+            self.assertEqual(ingest.claim_next_job().pk, job.pk)
+            # Worker arrêté en plein traitement : le job reste 'running'
+            ingest.requeue_interrupted_jobs()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.status_code), (IngestJob.STATUS_FAILED, 500))
+        self.assertIsNone(ingest.claim_next_job())
+
+    def test_worker_loop_processes_pending_jobs(self):
+        job = self.enqueue(self.session_body('worker'))
+        with mock.patch.object(run_ingest_workers.signal, 'signal'):
+            run_ingest_workers._worker_loop(0, once=True)
+        job.refresh_from_db()
+        self.assertEqual(job.status, IngestJob.STATUS_DONE)
+
+    def test_worker_module_imports_before_django_setup(self):
+        # Ce que fait un processus fils démarré par spawn / forkserver
+        code = 'from backapp.management.commands.run_ingest_workers import _worker_loop'
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': 'profilometre.settings'}
+        result = subprocess.run([sys.executable, '-c', code], cwd=settings.BASE_DIR, env=env, capture_output=True)
+        self.assertEqual(result.returncode, 0, result.stderr.decode())
+
+
+# ---------------------------------------------------------
+# Stockage colonnaire des points
+# ---------------------------------------------------------
+class PointCloudStorageTests(LidarTestCase):
+    def test_points_are_moved_out_of_json_data(self):
+        session = self.create_session('cloud', 50)
+        self.assertNotIn('lidar_data', session.json_data)
+        cloud = LidarPointCloud.objects.get(session=session)
+        self.assertEqual(cloud.point_count, 50)
+        expected = pointcloud.points_to_arrays(lidar_points(50))
+        for axis, column in cloud.as_arrays().items():
+            np.testing.assert_array_equal(column, expected[axis])
+
+    def test_serializer_round_trip(self):
+        points = [
+            {'x': 1.1, 'y': 2.2, 'z': 0.5, 'timestamp_sec': 10.0},
+            {'x': 1.2, 'y': 2.3, 'z': 0.6, 'timestamp_sec': 12.5},
+            {'x': 1.3, 'y': 2.4, 'z': 0.7},
+        ]
+        serializer = ProfilometreLidarDataSerializer(data={
+            **self.session_body('round-trip'),
+            'json_data': {'profile_data': {'personality_traits': {'a': 1}}, 'lidar_data': points},
+        })
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        session = ProfilometreLidarData.objects.get(pk=serializer.save().pk)
+        self.assertEqual((session.lidar_point_count, session.lidar_capture_duration_sec), (3, 2.5))
+        self.assertTrue(session.has_personality_data)
+        data = ProfilometreLidarDataSerializer(session).data
+        self.assertEqual(data['json_data']['lidar_data'][:2], points[:2])
+        self.assertIsNone(data['json_data']['lidar_data'][2]['timestamp_sec'])
+
+    def test_replacing_and_deleting_the_points(self):
+        session = self.create_session('cloud', 50)
+        session.json_data = {'lidar_data': lidar_points(20)}
+        session.save()
+        self.assertEqual(list(LidarPointCloud.objects.values_list('point_count', flat=True)), [20])
+        self.assertEqual(UserUsage.objects.get(user_id=str(self.user.id)).point_count, 20)
+        session.delete()
+        self.assertFalse(LidarPointCloud.objects.exists())
+        self.assertEqual(UserUsage.objects.get(user_id=str(self.user.id)).session_count, 0)
+
+
+# ---------------------------------------------------------
+# Partitions mensuelles et archivage
+# ---------------------------------------------------------
+class PartitionArchiveTests(LidarTestCase):
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(LIDAR_ARCHIVE_DIR=Path(directory.name))
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.old_timestamp = timezone.now() - datetime.timedelta(days=800)
+        self.old = self.create_session('old', 400, timestamp=self.old_timestamp)
+        self.recent = self.create_session('recent', 400)
+
+    def test_old_partition_is_archived_and_still_readable(self):
+        self.assertEqual(self.old.partition, archive.partition_key(self.old_timestamp))
+        before = {axis: column.copy() for axis, column in self.old.point_cloud.as_arrays().items()}
+        call_command('archive_lidar_partitions', '--dry-run', stdout=StringIO())
+        self.assertEqual(LidarPointCloud.objects.get(session=self.old).archive_partition, '')
+
+        call_command('archive_lidar_partitions', stdout=StringIO())
+        cloud = LidarPointCloud.objects.get(session=self.old)
+        self.assertEqual((cloud.archive_partition, bytes(cloud.x)), (self.old.partition, b''))
+        self.assertEqual(LidarPointCloud.objects.get(session=self.recent).archive_partition, '')
+        partition = LidarPartition.objects.get(key=self.old.partition)
+        self.assertEqual((partition.status, partition.session_count), ('archived', 1))
+        for axis, column in before.items():
+            np.testing.assert_array_equal(cloud.as_arrays()[axis], column)
+        np.testing.assert_array_equal(cloud.read_range(10, 20)['x'], before['x'][10:20])
+
+        response = self.client.get(f'/profilometre-lidar/sessions/{self.old.pk}/points/', {'t_start': 1, 't_end': 1.5})
+        self.assertEqual(response.json()['count'], 51)
+        response = self.client.get(f'/profilometre-lidar/sessions/{self.old.pk}/export/csv/')
+        self.assertEqual(b''.join(response.streaming_content).count(b'\n'), 401)
+
+    def test_restore(self):
+        before = self.old.point_cloud.as_arrays()['t'].copy()
+        call_command('archive_lidar_partitions', stdout=StringIO())
+        call_command('archive_lidar_partitions', '--restore', self.old.partition, stdout=StringIO())
+        cloud = LidarPointCloud.objects.get(session=self.old)
+        self.assertEqual(cloud.archive_partition, '')
+        np.testing.assert_array_equal(cloud.as_arrays()['t'], before)
+        self.assertFalse(archive.archive_path(self.old.partition).exists())
+
+    def test_partitions_endpoint_is_staff_only(self):
+        self.assertEqual(self.client.get('/profilometre-lidar/partitions/').status_code, 403)
+        self.user.is_staff = True
+        self.user.save()
+        self.assertEqual(len(self.client.get('/profilometre-lidar/partitions/').json()), 2)
+
+
+# ---------------------------------------------------------
+# Points en fichiers projetés en mémoire
+# ---------------------------------------------------------
+class PointFileTests(LidarTestCase):
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+        settings_override = override_settings(
+            LIDAR_POINT_DATA_DIR=self.directory / 'points', LIDAR_ARCHIVE_DIR=self.directory / 'archive'
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_points_are_written_to_files_and_served(self):
+        with self.settings(LIDAR_POINT_STORAGE='file'), self.captureOnCommitCallbacks(execute=True):
+            session = self.create_session('file', 300)
+        cloud = LidarPointCloud.objects.get(session=session)
+        self.assertTrue(cloud.file_path)
+        self.assertEqual(bytes(cloud.x), b'')
+        arrays = cloud.as_arrays()
+        self.assertIsInstance(arrays['x'], np.memmap)
+        self.assertEqual(session.stored_bytes, cloud.nbytes)
+        self.assertEqual(cloud.nbytes, sum(column.nbytes for column in arrays.values()))
+        self.assertEqual(cloud.checksum, pointfiles.checksum(arrays))
+        response = self.client.get(f'/profilometre-lidar/sessions/{session.pk}/points/', {'t_start': 1, 't_end': 1.5})
+        self.assertEqual(response.json()['count'], 51)
+
+        path = settings.LIDAR_POINT_DATA_DIR / cloud.file_path
+        with self.captureOnCommitCallbacks(execute=True):
+            session.delete()
+        self.assertFalse(path.exists())
+
+    def test_existing_points_are_moved_and_orphans_pruned(self):
+        session = self.create_session('database', 300)
+        orphan = self.directory / 'points' / 'zz' / 'orphan'
+        orphan.mkdir(parents=True)
+        with self.settings(LIDAR_POINT_STORAGE='file'):
+            call_command('move_lidar_points_to_files', '--verify', '--prune', stdout=StringIO())
+        self.assertFalse(orphan.exists())
+        cloud = LidarPointCloud.objects.get(session=session)
+        self.assertTrue(cloud.file_path)
+        self.assertEqual(bytes(cloud.t), b'')
+        np.testing.assert_array_equal(cloud.as_arrays()['x'], pointcloud.points_to_arrays(lidar_points(300))['x'])
+
+    def test_move_requires_file_storage(self):
+        with self.assertRaises(CommandError):
+            call_command('move_lidar_points_to_files', stdout=StringIO())
+
+    def test_archived_file_points_are_restored_to_files(self):
+        with self.settings(LIDAR_POINT_STORAGE='file'):
+            with self.captureOnCommitCallbacks(execute=True):
+                session = self.create_session('old', 100, timestamp=timezone.now() - datetime.timedelta(days=900))
+            cloud = LidarPointCloud.objects.get(session=session)
+            path = settings.LIDAR_POINT_DATA_DIR / cloud.file_path
+            before = np.array(cloud.as_arrays()['z'])
+            with self.captureOnCommitCallbacks(execute=True):
+                call_command('archive_lidar_partitions', stdout=StringIO())
+            cloud = LidarPointCloud.objects.get(session=session)
+            self.assertEqual(cloud.file_path, '')
+            self.assertFalse(path.exists())
+            np.testing.assert_array_equal(cloud.as_arrays()['z'], before)
+            call_command('archive_lidar_partitions', '--restore', session.partition, stdout=StringIO())
+            cloud = LidarPointCloud.objects.get(session=session)
+            self.assertTrue(cloud.file_path)
+            np.testing.assert_array_equal(cloud.as_arrays()['z'], before)
+
+
+# ---------------------------------------------------------
+# Détection de changements entre deux passages
+# ---------------------------------------------------------
+def grid_points(dz=0.0, shift=0.0, bump=None):
+    """Grille 40 x 10 au pas de 0,25 m ; bump = (x_min, x_max) relevé de 5 cm."""
+    points = []
+    for i in range(40):
+        for j in range(10):
+            x, y = i * 0.25 + shift, j * 0.25 + shift
+            z = dz + (0.05 if bump and bump[0] <= x < bump[1] else 0.0)
+            points.append({'x': x, 'y': y, 'z': z, 'timestamp_sec': len(points) * 0.001})
+    return points
+
+
+class ChangeDetectionTests(LidarTestCase):
+    def grid_session(self, session_id, user_id=None, **grid):
+        return ProfilometreLidarData.objects.create(
+            user_id=str(user_id or self.user.id), session_id=session_id, json_data={'lidar_data': grid_points(**grid)}
+        )
+
+    def test_compare(self):
+        reference = pointcloud.points_to_arrays(grid_points())
+        result = changes.compare(reference, pointcloud.points_to_arrays(grid_points(dz=0.02, shift=0.05)), 0.5, 0.01)
+        self.assertEqual(result['compared_points'], 400)
+        self.assertGreater(result['matched_points'], 380)
+        self.assertAlmostEqual(result['mean_delta'], 0.02, places=5)
+        self.assertEqual(result['changed_cells'], result['cell_count'])
+        far = pointcloud.points_to_arrays([{'x': 1000, 'y': 1000, 'z': 0, 'timestamp_sec': 0}])
+        result = changes.compare(reference, far, 0.5, 0.01)
+        self.assertEqual((result['matched_points'], result['mean_delta'], result['cell_count']), (0, None, 0))
+        negative = {axis: -column if axis in 'xy' else column for axis, column in reference.items()}
+        result = changes.compare(negative, negative, 0.5, 0.01)
+        self.assertEqual((result['matched_points'], result['changed_cells']), (400, 0))
+
+    def test_endpoint_locates_the_change_and_caches_it(self):
+        reference = self.grid_session('a')
+        compared = self.grid_session('b', bump=(4.0, 6.0))
+        url = f'/profilometre-lidar/sessions/{reference.pk}/changes/{compared.pk}/'
+        data = self.client.get(url).json()
+        self.assertEqual((data['reference_session'], data['compared_session']), (reference.pk, compared.pk))
+        self.assertEqual(data['matched_points'], 400)
+        self.assertAlmostEqual(data['max_delta'], 0.05, places=5)
+        changed = [cell for cell in data['cells'] if abs(cell['dz']) > 0.01]
+        self.assertEqual(len(changed), data['changed_cells'])
+        self.assertTrue(all(4.0 <= cell['x'] < 6.0 for cell in changed))
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(url).json(), data)
+        self.assertFalse(any('INSERT' in query['sql'] for query in queries.captured_queries))
+        self.assertNotIn('cells', self.client.get(url, {'cells': 0}).json())
+        self.client.get(url, {'cell_size': 1})
+        self.assertEqual(ChangeDetection.objects.count(), 2)
+
+        # Nuage remplacé : comparaisons en cache supprimées
+        compared.json_data = {'lidar_data': grid_points()}
+        compared.save()
+        self.assertFalse(ChangeDetection.objects.exists())
+        self.assertEqual(self.client.get(url).json()['changed_cells'], 0)
+
+    def test_invalid_requests(self):
+        reference = self.grid_session('a')
+        other = self.grid_session('other', user_id=999)
+        empty = ProfilometreLidarData.objects.create(user_id=str(self.user.id), session_id='empty', json_data={})
+        url = f'/profilometre-lidar/sessions/{reference.pk}/changes/'
+        self.assertEqual(self.client.get(f'{url}{reference.pk}/', {'cell_size': 0}).status_code, 400)
+        self.assertEqual(self.client.get(f'{url}{reference.pk}/', {'threshold': -1}).status_code, 400)
+        self.assertEqual(self.client.get(f'{url}{other.pk}/').status_code, 404)
+        self.assertEqual(self.client.get(f'{url}{empty.pk}/').status_code, 422)
+
+
+# ---------------------------------------------------------
+# Filtrage des retours parasites à l'ingestion
+# ---------------------------------------------------------
+class PointFilterTests(LidarTestCase):
+    def test_outliers_are_removed(self):
+        rng = np.random.default_rng(0)
+        count = 2000
+        arrays = pointcloud.columns_to_arrays(
+            rng.uniform(0, 10, count), rng.uniform(0, 10, count), rng.normal(0, 0.01, count), np.arange(count) * 0.01
+        )
+        arrays['z'][::200] = 5.0
+        filtered, report = pointfilter.apply(arrays, {'sor': {'k': 8, 'std_ratio': 2.0}})
+        self.assertGreaterEqual(report['removed']['outliers'], 10)
+        self.assertLess(np.abs(filtered['z']).max(), 1.0)
+        self.assertEqual(report['point_count'], len(filtered['t']))
+
+    def test_knn_distances_match_brute_force(self):
+        rng = np.random.default_rng(0)
+        xyz = np.column_stack((rng.uniform(0, 20, 800), rng.uniform(0, 3, 800), rng.normal(0, 0.002, 800)))
+        distances = np.linalg.norm(xyz[:, None] - xyz[None], axis=-1)
+        np.fill_diagonal(distances, np.inf)
+        exact = np.sort(distances, axis=1)[:, :6].mean(axis=1)
+        approx = pointfilter.knn_mean_distances(xyz, 6)
+        self.assertGreater(np.mean(np.isclose(approx, exact)), 0.97)
+        self.assertTrue((approx >= exact - 1e-12).all())
+
+    @override_settings(
+        LIDAR_FILTER_RANGE={'z': (-1.0, 1.0)}, LIDAR_FILTER_SOR_NEIGHBOURS=8, LIDAR_FILTER_MEDIAN_WINDOW=5
+    )
+    def test_configured_filters_run_at_ingest(self):
+        rng = np.random.default_rng(0)
+        columns = zip(rng.uniform(0, 20, 500), rng.uniform(0, 3, 500), rng.normal(0, 0.002, 500))
+        points = [{'x': x, 'y': y, 'z': z, 'timestamp_sec': i * 0.001} for i, (x, y, z) in enumerate(columns)]
+        points.append({'x': 5, 'y': 1, 'z': 9.0, 'timestamp_sec': 0.2505})
+        body = {**self.session_body('filtered'), 'json_data': {'lidar_data': points}}
+        response = self.client.post('/profilometre-lidar/', body, format='json')
+        self.assertEqual(response.status_code, 201)
+        session = ProfilometreLidarData.objects.get()
+        self.assertEqual(session.point_filter['removed']['range'], 1)
+        self.assertGreater(session.point_filter['z_smoothed'], 0)
+        self.assertEqual(session.lidar_point_count, session.point_filter['point_count'])
+        self.assertLess(session.z_max, 1)
+        raw = LidarRawPointCloud.objects.get(session=session)
+        self.assertEqual(session.stored_bytes, session.point_cloud.nbytes + raw.nbytes)
+        self.assertEqual(UserUsage.stored_bytes_of(self.user.id), session.stored_bytes)
+
+        # Filtrage désactivé : la session réenregistrée perd ses points bruts
+        with self.settings(LIDAR_FILTER_RANGE=None, LIDAR_FILTER_SOR_NEIGHBOURS=0, LIDAR_FILTER_MEDIAN_WINDOW=0):
+            session.json_data = {'lidar_data': points[:10]}
+            session.save()
+        session.refresh_from_db()
+        self.assertIsNone(session.point_filter)
+        self.assertFalse(LidarRawPointCloud.objects.exists())
+
+    def test_median_filter_keeps_every_point(self):
+        z = np.zeros(21)
+        z[10] = 1.0
+        np.testing.assert_array_equal(pointfilter.median_z(z, 3), np.zeros(21))
+
+    @override_settings(LIDAR_FILTER_RANGE={'z': (None, 0.03)})
+    def test_raw_points_are_kept_and_counted(self):
+        session = self.create_session('filtered', 70)
+        self.assertEqual(session.lidar_point_count, 40)  # z = (i % 7) * 0,01 : 4 valeurs sur 7 gardées
+        self.assertEqual(session.point_filter['removed'], {'range': 30})
+        raw = LidarRawPointCloud.objects.get(session=session)
+        self.assertEqual(raw.point_count, 70)
+        self.assertEqual(session.stored_bytes, pointcloud.stored_size(40) + pointcloud.stored_size(70))
+        response = self.client.get(f'/profilometre-lidar/sessions/{session.pk}/?raw=1&fields=id,json_data')
+        self.assertEqual(len(response.json()['json_data']['lidar_data']), 70)
+
+    @override_settings(LIDAR_FILTER_RANGE={'z': (None, 0.03)}, LIDAR_POINT_STORAGE='file')
+    def test_raw_points_follow_file_storage_and_archiving(self):
+        with tempfile.TemporaryDirectory() as directory, override_settings(
+            LIDAR_POINT_DATA_DIR=Path(directory) / 'points', LIDAR_ARCHIVE_DIR=Path(directory) / 'archive'
+        ):
+            session = self.create_session('filtered', 70)
+            raw = LidarRawPointCloud.objects.get(session=session)
+            self.assertTrue(raw.file_path)
+            self.assertEqual(bytes(raw.x), b'')
+
+            partition = LidarPartition.refresh([session.partition])[0]
+            partition.archive()
+            raw = LidarRawPointCloud.objects.get(session=session)
+            self.assertEqual((raw.file_path, raw.archive_partition), ('', session.partition))
+            self.assertEqual(raw.as_arrays()['t'].size, 70)
+
+            partition.restore()
+            raw = LidarRawPointCloud.objects.get(session=session)
+            self.assertEqual(raw.archive_partition, '')
+            self.assertEqual(raw.as_arrays()['t'].size, 70)
+
+
+# ---------------------------------------------------------
+# Distance parcourue
+# ---------------------------------------------------------
+class TravelledDistanceTests(LidarTestCase):
+    def test_trajectory_length(self):
+        t = np.array([0, 1, 2, 10, 11, np.nan, 12.0])
+        x = np.array([0, 3, 6, 100, 103, 500, 106.0])
+        z = np.array([0, 4, 0, 0, 0, 0, 0.0])
+        arrays = pointcloud.columns_to_arrays(x, np.zeros(7), z, t)
+        # Pas 2 -> 10 : interruption, non compté ; point sans timestamp ignoré
+        self.assertAlmostEqual(pointcloud.trajectory_length(arrays), 12.0)
+        shuffled = {axis: column[[3, 0, 6, 1, 4, 2, 5]] for axis, column in arrays.items()}
+        self.assertAlmostEqual(pointcloud.trajectory_length(shuffled), 12.0)
+        with self.settings(LIDAR_TRAJECTORY_MAX_GAP_SEC=None):
+            self.assertAlmostEqual(pointcloud.trajectory_length(arrays), 106.0)
+        with self.settings(LIDAR_TRAJECTORY_3D=True):
+            self.assertAlmostEqual(pointcloud.trajectory_length(arrays), 16.0)
+
+    @override_settings(LIDAR_DISTANCE_UNIT_M=1.0)
+    def test_computed_distance_replaces_the_declared_one_and_is_limited(self):
+        self.subscription.max_distance = 5.0
+        self.subscription.save()
+        response = self.client.post('/profilometre-lidar/', self.session_body('long', 100, distance=0.1), format='json')
+        self.assertEqual(response.status_code, 403)
+        response = self.client.post('/profilometre-lidar/', self.session_body('short', 10, distance=99), format='json')
+        self.assertEqual(response.status_code, 201)
+        session = ProfilometreLidarData.objects.get(session_id='short')
+        self.assertAlmostEqual(session.travelled_distance, 9 * math.hypot(0.1, 0.05), places=5)
+        self.assertAlmostEqual(session.distance, session.travelled_distance)
+        # Sans points, la distance déclarée compte
+        body = {**self.session_body('empty', distance=99), 'json_data': {}}
+        self.assertEqual(self.client.post('/profilometre-lidar/', body, format='json').status_code, 403)
+
+
+# ---------------------------------------------------------
+# Upload fractionné
+# ---------------------------------------------------------
+class ChunkedUploadTests(LidarTestCase):
+    def upload(self, session_id, chunks):
+        self.client.post(
+            '/profilometre-lidar/uploads/',
+            {'user_id': str(self.user.id), 'session_id': session_id, 'total_chunks': len(chunks)},
+            format='json',
+        )
+        for index, points in chunks:
+            response = self.client.put(
+                f'/profilometre-lidar/uploads/{session_id}/chunks/{index}/', {'points': points}, format='json'
+            )
+            self.assertEqual(response.status_code, 201)
+        response = self.client.post(f'/profilometre-lidar/uploads/{session_id}/finalize/')
+        self.assertEqual(response.status_code, 201)
+        return ProfilometreLidarData.objects.get(session_id=session_id)
+
+    def test_chunks_are_assembled_in_index_order(self):
+        points = lidar_points(30)
+        session = self.upload('chunks', [(2, points[20:]), (0, points[:10]), (1, points[10:20])])
+        self.assertEqual(session.lidar_point_count, 30)
+        expected = pointcloud.points_to_arrays(points)
+        np.testing.assert_array_equal(session.point_arrays()['t'], expected['t'])
+
+    def test_upload_can_be_resumed(self):
+        self.client.post(
+            '/profilometre-lidar/uploads/',
+            {
+                'user_id': str(self.user.id),
+                'session_id': 'resume',
+                'json_data': {'metadata': {'a': 1}},
+                'total_chunks': 3,
+            },
+            format='json',
+        )
+        url = '/profilometre-lidar/uploads/resume/'
+        self.client.put(url + 'chunks/2/', {'points': lidar_points(4, 2.0)}, format='json')
+        self.client.put(url + 'chunks/0/', {'points': lidar_points(3)}, format='json')
+        # Renvoi d'un morceau déjà reçu : accepté sans être compté deux fois
+        response = self.client.put(url + 'chunks/0/', {'points': lidar_points(3)}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get(url).json()['missing_chunks'], [1])
+        self.assertEqual(self.client.post(url + 'finalize/').status_code, 409)
+
+        self.client.put(url + 'chunks/1/', {'points': lidar_points(2, 1.0)}, format='json')
+        self.assertEqual(self.client.post(url + 'finalize/').status_code, 201)
+        session = ProfilometreLidarData.objects.get(session_id='resume')
+        self.assertEqual(session.lidar_point_count, 9)
+        self.assertAlmostEqual(session.lidar_capture_duration_sec, 2.03)
+        self.assertEqual(session.json_data, {'metadata': {'a': 1}})
+        # Finalisation renvoyée (réponse perdue) : même session
+        response = self.client.post(url + 'finalize/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(ProfilometreLidarData.objects.filter(session_id='resume').count(), 1)
+
+    def test_distance_is_joined_from_chunks_without_rereading_points(self):
+        points = lidar_points(30)
+        single = self.create_session('single', 30)
+        with mock.patch.object(pointcloud, 'trajectory_length', side_effect=AssertionError):
+            session = self.upload('chunks', [(1, points[10:]), (0, points[:10])])
+        self.assertAlmostEqual(session.travelled_distance, single.travelled_distance, places=4)
+
+    def test_overlapping_chunks_fall_back_to_all_points(self):
+        points = lidar_points(30)
+        session = self.upload('overlap', [(0, points[::2]), (1, points[1::2])])
+        self.assertAlmostEqual(
+            session.travelled_distance,
+            pointcloud.trajectory_length(pointcloud.points_to_arrays(points)),
+            places=4,
+        )
+
+
+# ---------------------------------------------------------
+# Cumuls par utilisateur
+# ---------------------------------------------------------
+class UserUsageTests(LidarTestCase):
+    step = math.hypot(0.1, 0.05)  # pas entre deux points de lidar_points
+
+    def usage(self):
+        return UserUsage.objects.get(user_id=str(self.user.id))
+
+    def test_usage_follows_creation_update_and_deletion(self):
+        self.client.post('/profilometre-lidar/', self.session_body('a', 100), format='json')
+        batch = [self.session_body(f'b{i}', 10) for i in range(3)]
+        self.client.post('/profilometre-lidar/batch/', batch, format='json')
+        usage = self.usage()
+        self.assertEqual((usage.session_count, usage.point_count), (4, 130))
+
+        session = ProfilometreLidarData.objects.get(session_id='b0')
+        session.json_data = {'lidar_data': lidar_points(50)}
+        session.save()
+        self.assertEqual(self.usage().point_count, 170)
+        session.delete()
+        ProfilometreLidarData.objects.filter(session_id='b1').delete()
+        usage = self.usage()
+        self.assertEqual((usage.session_count, usage.point_count), (2, 110))
+
+    def test_usage_counts_stored_bytes(self):
+        self.create_session('a', 100)
+        session = self.create_session('b', 30)
+        self.assertEqual(self.usage().stored_bytes, pointcloud.stored_size(130))
+        session.delete()
+        self.assertEqual(self.usage().stored_bytes, pointcloud.stored_size(100))
+
+    def test_usage_counts_travelled_distance(self):
+        self.client.post('/profilometre-lidar/', self.session_body('a', 100), format='json')
+        self.client.post('/profilometre-lidar/', self.session_body('b', 10), format='json')
+        self.assertAlmostEqual(self.usage().distance, 108 * self.step / 1000)
+        ProfilometreLidarData.objects.filter(session_id='b').delete()
+        self.assertAlmostEqual(self.usage().distance, 99 * self.step / 1000)
+
+    def test_rebuild_command_fixes_drift(self):
+        self.create_session('a', 100)
+        UserUsage.objects.update(point_count=0, session_count=7)
+        call_command('rebuild_user_usage', stdout=StringIO())
+        usage = self.usage()
+        self.assertEqual((usage.session_count, usage.point_count), (1, 100))
+
+    def test_user_details_read_the_aggregates(self):
+        for i in range(3):
+            self.create_session(f's{i}', 10)
+        response = self.client.get('/profilometre-lidar/list/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['usage']['session_count'], 3)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/profilometre-lidar/list/')
+        self.assertFalse(any('backapp_profilometrelidardata' in query['sql'] for query in queries.captured_queries))
+
+
+# ---------------------------------------------------------
+# Champs à la demande (fields / exclude)
+# ---------------------------------------------------------
+class SparseFieldsTests(LidarTestCase):
+    def setUp(self):
+        super().setUp()
+        for i in range(3):
+            self.create_session(f's{i}', 20)
+
+    def test_list_does_not_load_points_or_json_data(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/profilometre-lidar/sessions/')
+        result = response.json()['results'][0]
+        self.assertNotIn('json_data', result)
+        self.assertIn('lidar_point_count', result)
+        selects = [
+            query['sql'] for query in queries.captured_queries
+            if 'backapp_profilometrelidardata' in query['sql'] and 'COUNT' not in query['sql']
+        ]
+        self.assertFalse(any('json_data' in sql for sql in selects))
+        self.assertFalse(any('lidarpointcloud' in query['sql'] for query in queries.captured_queries))
+
+    def test_fields_and_exclude(self):
+        response = self.client.get('/profilometre-lidar/sessions/', {'fields': 'id,session_id'})
+        self.assertEqual(set(response.json()['results'][0]), {'id', 'session_id'})
+        response = self.client.get('/profilometre-lidar/sessions/', {'fields': 'id,json_data'})
+        self.assertEqual(len(response.json()['results'][0]['json_data']['lidar_data']), 20)
+        self.assertEqual(self.client.get('/profilometre-lidar/sessions/', {'fields': 'inconnu'}).status_code, 400)
+        pk = ProfilometreLidarData.objects.get(session_id='s0').pk
+        self.assertIn('json_data', self.client.get(f'/profilometre-lidar/sessions/{pk}/').json())
+        data = self.client.get(f'/profilometre-lidar/sessions/{pk}/', {'exclude': 'json_data'}).json()
+        self.assertNotIn('json_data', data)
+        self.assertIn('z_std', data)
+
+
+# ---------------------------------------------------------
+# Pagination par curseur
+# ---------------------------------------------------------
+class CursorPaginationTests(LidarTestCase):
+    def setUp(self):
+        super().setUp()
+        now = timezone.now()
+        # Deux sessions par heure : le curseur doit départager les timestamps égaux
+        ProfilometreLidarData.objects.bulk_create([
+            ProfilometreLidarData(
+                user_id=str(self.user.id), session_id=f's{i}', json_data={},
+                timestamp=now - datetime.timedelta(hours=i // 2),
+            )
+            for i in range(25)
+        ])
+        ProfilometreLidarData.objects.create(user_id='999', session_id='other', json_data={})
+
+    def test_pages_cover_every_session_once_without_count_or_offset(self):
+        seen = []
+        url, params = '/profilometre-lidar/sessions/', {'page_size': 7, 'fields': 'session_id'}
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                data = self.client.get(url, params).json()
+            for query in queries.captured_queries:
+                self.assertNotIn('COUNT', query['sql'].upper())
+                self.assertNotIn('OFFSET', query['sql'].upper())
+            self.assertNotIn('count', data)
+            seen += [result['session_id'] for result in data['results']]
+            url, params = data['next'], None
+        self.assertEqual(sorted(seen), sorted(f's{i}' for i in range(25)))
+
+    def test_previous_page(self):
+        first = self.client.get('/profilometre-lidar/sessions/', {'page_size': 7, 'fields': 'session_id'}).json()
+        second = self.client.get(first['next']).json()
+        self.assertEqual(self.client.get(second['previous']).json()['results'], first['results'])
+
+    def test_count_is_optional_and_page_size_capped(self):
+        data = self.client.get('/profilometre-lidar/sessions/', {'page_size': 1000, 'count': 'true'}).json()
+        self.assertEqual((data['count'], len(data['results'])), (25, 25))
+        self.assertEqual(self.client.get('/profilometre-lidar/sessions/', {'cursor': 'zz'}).status_code, 404)
+
+
+# ---------------------------------------------------------
+# Recherche de sessions par zone (index R*Tree)
+# ---------------------------------------------------------
+def square_points(x0, y0, count=5):
+    return [{'x': x0 + i, 'y': y0 + i, 'z': 0, 'timestamp_sec': i * 0.1} for i in range(count)]
+
+
+class AreaSearchTests(LidarTestCase):
+    url = '/profilometre-lidar/sessions/area/'
+
+    def square_session(self, session_id, x0, y0, user_id=None, **fields):
+        return ProfilometreLidarData.objects.create(
+            user_id=str(user_id or self.user.id), session_id=session_id,
+            json_data={'lidar_data': square_points(x0, y0)}, **fields
+        )
+
+    def indexed_ids(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT id FROM {bboxindex.TABLE} ORDER BY id")
+            return [row[0] for row in cursor.fetchall()]
+
+    def session_ids(self, params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return sorted(result['session_id'] for result in response.json()['results'])
+
+    def test_index_follows_sessions(self):
+        near = self.square_session('near', 0, 0)
+        self.square_session('far', 100, 100)
+        self.create_session('empty', 0)
+        ProfilometreLidarData.objects.bulk_create([ProfilometreLidarData(
+            user_id=str(self.user.id), session_id='bulk', json_data={'lidar_data': square_points(50, 50)}
+        )])
+        self.assertEqual(len(self.indexed_ids()), 3)
+        near.json_data = {'lidar_data': square_points(500, 500)}
+        near.save()
+        self.assertEqual(self.session_ids({'min_x': 499, 'min_y': 499, 'max_x': 501, 'max_y': 501}), ['near'])
+        near.delete()
+        ProfilometreLidarData.objects.filter(session_id='far').delete()
+        self.assertEqual(self.indexed_ids(), [ProfilometreLidarData.objects.get(session_id='bulk').pk])
+
+    def test_search_by_area_user_and_period(self):
+        self.square_session('a', 0, 0)
+        old = self.square_session('old', 100, 100, timestamp=timezone.now() - datetime.timedelta(days=40))
+        self.square_session('other', 0, 0, user_id=999)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.session_ids({'min_x': 1, 'min_y': 1, 'max_x': 2, 'max_y': 2}), ['a'])
+        self.assertFalse(any('json_data' in query['sql'] for query in queries.captured_queries))
+        self.assertTrue(any(bboxindex.TABLE in query['sql'] for query in queries.captured_queries))
+
+        everywhere = {'min_x': -10, 'min_y': -10, 'max_x': 200, 'max_y': 200}
+        self.user.is_staff = True
+        self.user.save()
+        self.assertEqual(self.session_ids(everywhere), ['a', 'old', 'other'])
+        self.assertEqual(self.session_ids({**everywhere, 'user_id': '999'}), ['other'])
+        period = {'start': old.timestamp.isoformat(), 'end': old.timestamp.isoformat()}
+        self.assertEqual(self.session_ids({**everywhere, **period}), ['old'])
+        response = self.client.get('/profilometre-lidar/sessions/', {'bbox': '99,99,101,101'})
+        self.assertEqual([result['session_id'] for result in response.json()['results']], ['old'])
+
+    def test_invalid_area_is_refused(self):
+        self.assertEqual(self.client.get(self.url, {'min_x': 1}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'min_x': 3, 'min_y': 0, 'max_x': 1, 'max_y': 1}).status_code, 400)
+
+    def test_rebuild_command(self):
+        self.square_session('a', 0, 0)
+        self.square_session('b', 5, 5)
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {bboxindex.TABLE}")
+        output = StringIO()
+        call_command('rebuild_lidar_bbox_index', '--check', stdout=output)
+        self.assertIn('2 session(s) absente', output.getvalue())
+        call_command('rebuild_lidar_bbox_index', stdout=StringIO())
+        self.assertEqual(len(self.indexed_ids()), 2)
+
+
+# ---------------------------------------------------------
+# Requêtes spatiales (boîte, rayon, plus proches voisins)
+# ---------------------------------------------------------
+class SpatialQueryTests(LidarTestCase):
+    def setUp(self):
+        super().setUp()
+        rng = np.random.default_rng(0)
+        count = 5000
+        self.xyz = np.column_stack(
+            [rng.uniform(0, 100, count), rng.uniform(0, 5, count), rng.normal(0, 0.01, count)]
+        ).astype(np.float32).astype(np.float64)
+        session = ProfilometreLidarData(user_id=str(self.user.id), session_id='spatial', json_data={})
+        session.set_point_arrays(pointcloud.columns_to_arrays(*self.xyz.T, np.arange(count) * 0.001))
+        session.save()
+        self.url = f'/profilometre-lidar/sessions/{session.pk}/points/'
+
+    def indexes(self, response):
+        self.assertEqual(response.status_code, 200)
+        return [point['index'] for point in response.json()['points']]
+
+    def test_box_and_radius(self):
+        response = self.client.get(self.url + 'box/', {'min_x': 10, 'max_x': 12.5, 'min_y': 1})
+        expected = np.flatnonzero((self.xyz[:, 0] >= 10) & (self.xyz[:, 0] <= 12.5) & (self.xyz[:, 1] >= 1))
+        self.assertEqual(sorted(self.indexes(response)), expected.tolist())
+        response = self.client.get(self.url + 'radius/', {'x': 50, 'y': 2.5, 'z': 0, 'r': 1.5})
+        distances = np.linalg.norm(self.xyz - [50, 2.5, 0], axis=1)
+        self.assertEqual(sorted(self.indexes(response)), np.flatnonzero(distances <= 1.5).tolist())
+
+    def test_nearest(self):
+        response = self.client.get(self.url + 'nearest/', {'x': 50, 'y': 2.5, 'z': 0, 'k': 10})
+        distances = np.linalg.norm(self.xyz - [50, 2.5, 0], axis=1)
+        self.assertEqual(self.indexes(response), np.argsort(distances, kind='stable')[:10].tolist())
+
+    def test_index_is_built_once_and_dropped_with_the_points(self):
+        self.client.get(self.url + 'box/')
+        self.client.get(self.url + 'radius/', {'x': 0, 'y': 0, 'z': 0, 'r': 1})
+        self.assertEqual(LidarSpatialIndex.objects.count(), 1)
+        session = ProfilometreLidarData.objects.get(session_id='spatial')
+        session.set_point_arrays(pointcloud.columns_to_arrays([1], [1], [1], [0]))
+        session.save()
+        self.assertFalse(LidarSpatialIndex.objects.exists())
+
+    @override_settings(LIDAR_SPATIAL_MAX_RESULTS=5)
+    def test_results_are_truncated(self):
+        response = self.client.get(self.url + 'box/')
+        self.assertEqual(len(self.indexes(response)), 5)
+        self.assertTrue(response.json()['truncated'])
+
+    def test_invalid_parameters_and_other_users_sessions(self):
+        self.assertEqual(self.client.get(self.url + 'radius/', {'x': 1}).status_code, 400)
+        other = ProfilometreLidarData.objects.create(user_id='999', session_id='other', json_data={})
+        response = self.client.get(f'/profilometre-lidar/sessions/{other.pk}/points/box/')
+        self.assertEqual(response.status_code, 404)
+
+    def test_invalid_k_is_refused(self):
+        for k in ('abc', '0', '-1', '1.5'):
+            response = self.client.get(self.url + 'nearest/', {'x': 0, 'y': 0, 'z': 0, 'k': k})
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json()['error'], "Paramètre 'k' doit être entre 1 et 100000.")
+
+
+# ---------------------------------------------------------
+# Niveaux de détail
+# ---------------------------------------------------------
+@override_settings(LIDAR_LOD_LEVELS=[100, 1000, 100000])
+class LevelOfDetailTests(LidarTestCase):
+    def setUp(self):
+        super().setUp()
+        rng = np.random.default_rng(1)
+        count = 20000
+        session = ProfilometreLidarData(user_id=str(self.user.id), session_id='lod', json_data={'k': 1})
+        session.set_point_arrays(pointcloud.columns_to_arrays(
+            np.sort(rng.uniform(0, 500, count)), rng.uniform(0, 3, count), rng.normal(0, 0.02, count),
+            np.arange(count) * 0.001,
+        ))
+        session.save()
+        self.url = f'/profilometre-lidar/sessions/{session.pk}/'
+
+    def test_levels_are_downsampled_in_time_order(self):
+        data = self.client.get(self.url, {'lod': 0}).json()
+        self.assertTrue(80 <= data['lod']['point_count'] <= 120)
+        self.assertEqual(len(data['json_data']['lidar_data']), data['lod']['point_count'])
+        self.assertEqual(data['json_data']['k'], 1)
+        timestamps = [point['timestamp_sec'] for point in data['json_data']['lidar_data']]
+        self.assertEqual(timestamps, sorted(timestamps))
+        self.assertTrue(800 <= self.client.get(self.url, {'lod': 1}).json()['lod']['point_count'] <= 1200)
+
+    def test_small_cloud_is_served_whole_and_levels_are_cached(self):
+        level = self.client.get(self.url, {'lod': 2}).json()['lod']
+        self.assertEqual((level['point_count'], level['voxel_size']), (20000, None))
+        self.client.get(self.url, {'lod': 0})
+        self.client.get(self.url, {'lod': 0})
+        self.assertEqual(LidarLevelOfDetail.objects.count(), 1)
+
+    def test_unknown_level_is_refused(self):
+        self.assertEqual(self.client.get(self.url, {'lod': 7}).status_code, 400)
+
+
+# ---------------------------------------------------------
+# IRI
+# ---------------------------------------------------------
+def road(count, amplitude, seed=0):
+    """Profil en ligne droite (x tous les 0,1 m), z en marche aléatoire."""
+    rng = np.random.default_rng(seed)
+    return pointcloud.columns_to_arrays(
+        np.arange(count) * 0.1, np.zeros(count), np.cumsum(rng.normal(0, amplitude, count)), np.arange(count) * 0.01
+    )
+
+
+class IriTests(LidarTestCase):
+    def road_session(self, session_id, arrays):
+        session = ProfilometreLidarData(user_id=str(self.user.id), session_id=session_id, json_data={})
+        session.set_point_arrays(arrays)
+        session.save()
+        return session
+
+    def test_flat_and_constant_grade_profiles_are_smooth(self):
+        x = np.arange(3000) * 0.1
+        for z in (np.zeros_like(x), x * 0.05):
+            arrays = pointcloud.columns_to_arrays(x, np.zeros_like(x), z, np.arange(x.size) * 0.01)
+            # Coordonnées float32 : arrondi de l'ordre de 1e-4 m/km
+            self.assertAlmostEqual(roughness.compute_iri(arrays)['iri'], 0.0, places=3)
+
+    def test_iri_is_linear_in_the_profile(self):
+        arrays = road(3000, 0.002)
+        doubled = {**arrays, 'z': arrays['z'] * 2}
+        result = roughness.compute_iri(arrays, segment_length=50)
+        self.assertAlmostEqual(roughness.compute_iri(doubled, segment_length=50)['iri'], 2 * result['iri'], places=6)
+        self.assertEqual(len(result['segments']), 6)
+        self.assertAlmostEqual(result['length_m'], 299.75)
+
+    def test_session_iri_is_cached(self):
+        session = self.road_session('road', road(3000, 0.001))
+        url = f'/profilometre-lidar/sessions/{session.pk}/iri/'
+        response = self.client.get(url, {'segment_length': 50})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['segments']), 6)
+        self.client.get(url, {'segment_length': 50})
+        self.assertEqual(IriAnalysis.objects.count(), 1)
+        self.assertEqual(self.client.get(url, {'segment_length': 0}).status_code, 400)
+
+    def test_batch_reports_each_session(self):
+        smooth = self.road_session('smooth', road(3000, 0.001))
+        rough = self.road_session('rough', road(3000, 0.004))
+        short = self.road_session('short', road(2, 0.004))
+        response = self.client.post('/profilometre-lidar/iri/batch/', {'segment_length': 50}, format='json')
+        results = {result['session']: result for result in response.json()['results']}
+        self.assertEqual(response.json()['analysed'], 2)
+        self.assertGreater(results[rough.pk]['iri'], 3 * results[smooth.pk]['iri'])
+        self.assertEqual(results[short.pk]['status'], 422)
+        response = self.client.get(f'/profilometre-lidar/sessions/{short.pk}/iri/')
+        self.assertEqual(response.status_code, 422)
+
+
+# ---------------------------------------------------------
+# Exports en flux
+# ---------------------------------------------------------
+@override_settings(LIDAR_EXPORT_CHUNK_POINTS=7)
+class ExportTests(LidarTestCase):
+    def setUp(self):
+        super().setUp()
+        points = lidar_points(30)
+        points[3] = {'x': None, 'y': 1, 'z': 2, 'timestamp_sec': 0.03}
+        self.first = ProfilometreLidarData.objects.create(
+            user_id=str(self.user.id), session_id='a', timestamp='2025-01-01T00:00:00Z',
+            json_data={'lidar_data': points},
+        )
+        self.create_session('b', 10, timestamp='2025-02-01T00:00:00Z')
+        ProfilometreLidarData.objects.create(user_id='999', session_id='c', json_data={'lidar_data': lidar_points(10)})
+
+    def content(self, response):
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content)
+
+    def test_ndjson_and_csv(self):
+        lines = self.content(self.client.get('/profilometre-lidar/export/ndjson/')).decode().splitlines()
+        rows = [json.loads(line) for line in lines]
+        self.assertEqual(len(rows), 40)
+        self.assertIsNone(rows[3]['x'])
+        self.assertEqual(rows[29], {'session_id': 'a', 'x': 2.9, 'y': 1.45, 'z': 0.01, 'timestamp_sec': 0.29})
+        response = self.client.get('/profilometre-lidar/export/csv/', {'start': '2025-01-15'}, HTTP_ACCEPT='text/csv')
+        rows = list(csv.reader(StringIO(self.content(response).decode())))
+        self.assertEqual(rows[0], list(export.EXPORT_COLUMNS))
+        self.assertEqual(len(rows), 11)
+
+    def test_ply_and_las(self):
+        data = self.content(self.client.get(f'/profilometre-lidar/sessions/{self.first.pk}/export/ply/'))
+        header, _, body = data.partition(b'end_header\n')
+        self.assertIn(b'element vertex 30', header)
+        vertices = np.frombuffer(body, dtype=[('x', '<f4'), ('y', '<f4'), ('z', '<f4'), ('t', '<f8'), ('s', '<i4')])
+        self.assertAlmostEqual(float(vertices['x'][29]), 2.9, places=5)
+
+        data = self.content(self.client.get('/profilometre-lidar/export/las/', {'bbox': '0,0,100,100'}))
+        header = export.LAS_HEADER.unpack(data[:export.LAS_HEADER.size])
+        self.assertEqual((header[0], header[18]), (b'LASF', 40))
+        records = np.frombuffer(data[export.LAS_HEADER.size:], dtype=export.LAS_POINT_DTYPE)
+        self.assertEqual(records.size, 40)
+        self.assertAlmostEqual(records['X'][29] * header[24] + header[27], 2.9, places=3)
+        self.assertEqual(records['classification'][3], 7)  # point sans coordonnées : bruit
+
+    def test_invalid_requests(self):
+        self.assertEqual(self.client.get('/profilometre-lidar/export/xyz/').status_code, 400)
+        response = self.client.get('/profilometre-lidar/export/csv/', {'bbox': '1,2'}, HTTP_ACCEPT='text/csv')
+        self.assertEqual(response.status_code, 400)
+
+    def test_export_command(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = Path(directory) / 'export.las'
+            call_command('export_lidar', 'las', '-o', str(output), '--user', str(self.user.id), stdout=StringIO())
+            self.assertEqual(output.stat().st_size, export.LAS_HEADER.size + export.LAS_POINT_DTYPE.itemsize * 40)
+
+
+# ---------------------------------------------------------
+# Fenêtre temporelle
+# ---------------------------------------------------------
+@override_settings(LIDAR_TIME_INDEX_STRIDE=16)
+class TimeWindowTests(LidarTestCase):
+    def setUp(self):
+        super().setUp()
+        count = 5000
+        # Points reçus dans le désordre, deux sans timestamp ; x = rang d'origine
+        self.t = np.random.default_rng(3).permutation(np.arange(count) * 0.01)
+        self.t[[5, 9]] = np.nan
+        x = np.arange(count, dtype=np.float64)
+        session = ProfilometreLidarData(user_id=str(self.user.id), session_id='window', json_data={})
+        session.set_point_arrays(pointcloud.columns_to_arrays(x, x * 0, x * 0, self.t))
+        session.save()
+        self.cloud = LidarPointCloud.objects.get(session=session)
+        self.url = f'/profilometre-lidar/sessions/{session.pk}/points/'
+
+    def test_points_are_stored_in_time_order(self):
+        self.assertEqual(self.cloud.timed_count, 4998)
+        self.assertTrue((np.diff(self.cloud.as_arrays()['t'][:4998]) >= 0).all())
+
+    def test_window_reads_only_the_indexed_blocks(self):
+        with CaptureQueriesContext(connection) as queries:
+            data = self.client.get(self.url, {'t_start': 10.005, 't_end': 10.5}).json()
+        expected = np.sort(self.t[(self.t >= 10.005) & (self.t <= 10.5)])
+        self.assertEqual([point['timestamp_sec'] for point in data['points']], expected.tolist())
+        self.assertEqual(data['count'], expected.size)
+        for point in data['points']:
+            self.assertEqual(self.t[int(point['x'])], point['timestamp_sec'])
+        cloud_queries = [query['sql'] for query in queries.captured_queries if 'lidarpointcloud' in query['sql']]
+        self.assertTrue(all('SUBSTR' in sql.upper() or '"x"' not in sql for sql in cloud_queries))
+
+    def test_downsampling_and_bounds(self):
+        data = self.client.get(self.url, {'t_start': 0, 't_end': 49.99, 'max_points': 300}).json()
+        self.assertTrue(data['downsampled'])
+        self.assertLess(len(data['points']), 400)
+        self.assertEqual(data['count'], 4998)
+        self.assertEqual(self.client.get(self.url, {'t_start': 100}).json()['count'], 0)
+        self.assertEqual(self.client.get(self.url).json()['count'], 4998)
+        self.assertEqual(self.client.get(self.url, {'max_points': 'x'}).status_code, 400)
+
+
+# ---------------------------------------------------------
+# Trajets
+# ---------------------------------------------------------
+class RouteTests(LidarTestCase):
+    start = timezone.make_aware(datetime.datetime(2026, 1, 1, 8, 0))
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.export_dir = Path(directory.name)
+        settings_override = override_settings(LIDAR_ROUTE_EXPORT_DIR=self.export_dir, LIDAR_ROUTE_MAX_GAP_SEC=300)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def session_at(self, session_id, seconds, t0=0.0, count=100):
+        return ProfilometreLidarData.objects.create(
+            user_id=str(self.user.id),
+            session_id=session_id,
+            timestamp=self.start + datetime.timedelta(seconds=seconds),
+            json_data={'lidar_data': lidar_points(count, t0)},
+        )
+
+    def test_points_are_placed_at_their_session_timestamp(self):
+        # Horloges d'appareil différentes : les temps ne partent pas de 0
+        self.session_at('a', 0, t0=5000.0)
+        self.session_at('b', 60, t0=12.0)
+        route = Route.objects.get()
+        self.assertEqual(route.session_count, 2)
+        arrays = route.point_arrays()
+        self.assertAlmostEqual(float(arrays['t'][0]), 0.0)
+        self.assertAlmostEqual(float(arrays['t'][100]), 60.0)
+        self.assertTrue((np.diff(arrays['t']) >= 0).all())
+        np.testing.assert_array_equal(arrays['session'][:100], ProfilometreLidarData.objects.get(session_id='a').pk)
+
+    def test_overlapping_sessions_are_not_merged(self):
+        first = self.session_at('a', 0)
+        second = self.session_at('b', 0.5)
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertNotEqual(first.route_id, second.route_id)
+        for route in Route.objects.all():
+            self.assertEqual(route.session_count, 1)
+
+    def test_merge_streams_is_a_sorted_k_way_merge(self):
+        rng = np.random.default_rng(0)
+        streams, expected = [], []
+        for session in range(5):
+            t = np.sort(rng.uniform(0, 100, 1000))
+            if session == 2:
+                t[-3:] = np.nan
+            expected.append(t)
+            slices = [t[i:i + 37] for i in range(0, 1000, 37)]
+            streams.append([
+                {'x': part, 'y': part, 'z': part, 't': part, 'session': np.full(part.size, session)} for part in slices
+            ])
+        merged = np.concatenate([chunk['t'] for chunk in routes.merge_streams(streams)])
+        expected = np.concatenate(expected)
+        expected = expected[np.argsort(np.where(np.isnan(expected), np.inf, expected), kind='stable')]
+        np.testing.assert_array_equal(merged, expected)
+        self.assertEqual(list(routes.merge_streams([])), [])
+
+    def test_sessions_are_grouped_and_regrouped(self):
+        first = self.session_at('a', 0)
+        second = self.session_at('b', 180)
+        later = self.session_at('c', 1800)
+        for session in (first, second, later):
+            session.refresh_from_db()
+        self.assertEqual(first.route_id, second.route_id)
+        self.assertNotEqual(first.route_id, later.route_id)
+        route = first.route
+        self.assertEqual((route.session_count, route.point_count, route.start), (2, 200, self.start))
+        self.assertAlmostEqual(route.travelled_distance, first.travelled_distance + second.travelled_distance)
+
+        # Sessions qui comblent l'écart : un seul trajet, qui garde le plus ancien id
+        for minutes in (7, 11, 19, 23, 27, 15):
+            self.session_at(f'm{minutes}', minutes * 60)
+        self.assertEqual(Route.objects.get().pk, route.pk)
+        self.assertEqual(Route.objects.get().session_count, 9)
+        ProfilometreLidarData.objects.get(session_id='m15').delete()
+        self.assertEqual(Route.objects.count(), 2)
+
+        with override_settings(LIDAR_ROUTE_MAX_GAP_SEC=10):
+            call_command('rebuild_lidar_routes', stdout=StringIO())
+        self.assertEqual(Route.objects.count(), 8)
+        self.assertFalse(ProfilometreLidarData.objects.filter(route__isnull=True).exists())
+
+    def test_route_iri_and_export_are_cached_per_version(self):
+        self.session_at('a', 0, count=300)
+        second = self.session_at('b', 60, count=300)
+        route = Route.objects.get()
+        url = f'/profilometre-lidar/routes/{route.pk}/'
+        arrays = route.point_arrays()
+        chunks = list(route.iter_points(chunk_points=50))
+        np.testing.assert_array_equal(np.concatenate([chunk['x'] for chunk in chunks]), arrays['x'])
+        response = self.client.get(url + 'iri/', {'segment_length': 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['iri'], roughness.compute_iri(arrays, 1.0)['iri'])
+        self.assertEqual(response.json()['version'], route.version)
+
+        body = b''.join(self.client.get(url + 'export/csv/').streaming_content).decode()
+        self.assertEqual(len(body.strip().splitlines()), 601)
+        self.assertEqual(len(list(self.export_dir.iterdir())), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            second.json_data = {'lidar_data': lidar_points(50)}
+            second.save()
+        self.assertEqual(list(self.export_dir.iterdir()), [])
+        route.refresh_from_db()
+        self.assertEqual((route.analytics, route.point_count), ({}, 350))
+        body = b''.join(self.client.get(url + 'export/csv/').streaming_content).decode()
+        self.assertEqual(len(body.strip().splitlines()), 351)
+        self.assertEqual(self.client.get(url + 'export/xyz/').status_code, 400)
+
+    def test_unchanged_routes_keep_their_caches(self):
+        self.session_at('a', 0)
+        route = Route.objects.get()
+        self.client.get(f'/profilometre-lidar/routes/{route.pk}/iri/', {'segment_length': 1})
+        route.refresh_from_db()
+        self.assertTrue(route.analytics)
+        cached = (route.version, route.analytics)
+        # Session qui chevauche le trajet : regroupée à part, le trajet existant n'est pas réécrit
+        self.session_at('overlap', 0.5)
+        self.assertEqual(Route.objects.count(), 2)
+        route.refresh_from_db()
+        self.assertEqual((route.version, route.analytics), cached)
+
+    def test_endpoints(self):
+        first = self.session_at('a', 0)
+        self.session_at('b', 3600)
+        other = ProfilometreLidarData.objects.create(
+            user_id='999', session_id='other', timestamp=self.start, json_data={'lidar_data': lidar_points(10)}
+        )
+        results = self.client.get('/profilometre-lidar/routes/').json()['results']
+        self.assertEqual(len(results), 2)
+        self.assertGreater(results[0]['start'], results[1]['start'])
+        response = self.client.get('/profilometre-lidar/routes/', {'end': '2026-01-01T08:30:00Z'})
+        self.assertEqual(len(response.json()['results']), 1)
+        first.refresh_from_db()
+        data = self.client.get(f'/profilometre-lidar/routes/{first.route_id}/').json()
+        self.assertEqual([session['id'] for session in data['sessions']], [first.pk])
+        other.refresh_from_db()
+        self.assertEqual(self.client.get(f'/profilometre-lidar/routes/{other.route_id}/').status_code, 404)
+        self.assertEqual(self.client.get(f'/profilometre-lidar/routes/{other.route_id}/iri/').status_code, 404)
@@ -7,6 +7,29 @@ from .views import (
     UserAdminViewSet,
     get_user_details,
     send_profilometre_lidar_data,
+    send_profilometre_lidar_batch,
+    send_profilometre_lidar_async,
+    ingest_job_status,
+    open_lidar_upload,
+    lidar_upload_status,
+    upload_lidar_chunk,
+    finalize_lidar_upload,
+    profilometre_lidar_sessions,
+    profilometre_lidar_sessions_in_area,
+    profilometre_lidar_session_detail,
+    profilometre_lidar_session_iri,
+    profilometre_lidar_session_changes,
+    export_profilometre_lidar,
+    profilometre_lidar_iri_batch,
+    lidar_points_in_time_window,
+    lidar_points_in_box,
+    lidar_points_in_radius,
+    lidar_points_nearest,
+    lidar_partitions,
+    profilometre_lidar_routes,
+    profilometre_lidar_route_detail,
+    profilometre_lidar_route_iri,
+    export_profilometre_lidar_route,
     ClientViewSet,
 )
 
@@ -28,7 +51,31 @@ urlpatterns = [
 
     # ---------------- PROFILOMETRE / LIDAR ----------------
     path('profilometre-lidar/', send_profilometre_lidar_data, name='profilometre_lidar_post'),
+    path('profilometre-lidar/batch/', send_profilometre_lidar_batch, name='profilometre_lidar_batch'),
+    path('profilometre-lidar/async/', send_profilometre_lidar_async, name='profilometre_lidar_async'),
+    path('profilometre-lidar/jobs/<uuid:job_id>/', ingest_job_status, name='ingest_job_status'),
     path('profilometre-lidar/list/', get_user_details, name='get_user_details'),
+    path('profilometre-lidar/uploads/', open_lidar_upload, name='lidar_upload_open'),
+    path('profilometre-lidar/uploads/<str:session_id>/', lidar_upload_status, name='lidar_upload_status'),
+    path('profilometre-lidar/uploads/<str:session_id>/chunks/<int:index>/', upload_lidar_chunk, name='lidar_upload_chunk'),
+    path('profilometre-lidar/uploads/<str:session_id>/finalize/', finalize_lidar_upload, name='lidar_upload_finalize'),
+    path('profilometre-lidar/sessions/', profilometre_lidar_sessions, name='profilometre_lidar_sessions'),
+    path('profilometre-lidar/sessions/area/', profilometre_lidar_sessions_in_area, name='profilometre_lidar_sessions_in_area'),
+    path('profilometre-lidar/sessions/<int:pk>/', profilometre_lidar_session_detail, name='profilometre_lidar_session_detail'),
+    path('profilometre-lidar/export/<str:export_format>/', export_profilometre_lidar, name='profilometre_lidar_export'),
+    path('profilometre-lidar/sessions/<int:pk>/export/<str:export_format>/', export_profilometre_lidar, name='profilometre_lidar_session_export'),
+    path('profilometre-lidar/sessions/<int:pk>/iri/', profilometre_lidar_session_iri, name='profilometre_lidar_session_iri'),
+    path('profilometre-lidar/sessions/<int:pk>/changes/<int:other_pk>/', profilometre_lidar_session_changes, name='profilometre_lidar_session_changes'),
+    path('profilometre-lidar/iri/batch/', profilometre_lidar_iri_batch, name='profilometre_lidar_iri_batch'),
+    path('profilometre-lidar/sessions/<int:pk>/points/', lidar_points_in_time_window, name='lidar_points_time_window'),
+    path('profilometre-lidar/sessions/<int:pk>/points/box/', lidar_points_in_box, name='lidar_points_box'),
+    path('profilometre-lidar/sessions/<int:pk>/points/radius/', lidar_points_in_radius, name='lidar_points_radius'),
+    path('profilometre-lidar/sessions/<int:pk>/points/nearest/', lidar_points_nearest, name='lidar_points_nearest'),
+    path('profilometre-lidar/routes/', profilometre_lidar_routes, name='profilometre_lidar_routes'),
+    path('profilometre-lidar/routes/<int:pk>/', profilometre_lidar_route_detail, name='profilometre_lidar_route_detail'),
+    path('profilometre-lidar/routes/<int:pk>/iri/', profilometre_lidar_route_iri, name='profilometre_lidar_route_iri'),
+    path('profilometre-lidar/routes/<int:pk>/export/<str:export_format>/', export_profilometre_lidar_route, name='profilometre_lidar_route_export'),
+    path('profilometre-lidar/partitions/', lidar_partitions, name='lidar_partitions'),
 
     # ---------------- VENDEUR ----------------
     path('api/vendeurs/modeles/', DeviceModelViewSet.as_view({'get': 'list', 'post': 'create'}), name='vendeur-modeles'),
@@ -1,13 +1,25 @@
+import datetime
+
 from rest_framework import status, viewsets, permissions
-from rest_framework.decorators import api_view, permission_classes, authentication_classes, action
+from rest_framework.decorators import (
+    api_view, permission_classes, authentication_classes, parser_classes, renderer_classes, action
+)
 from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.authentication import JWTAuthentication
+from django.conf import settings
 from django.contrib.auth import get_user_model, logout
 from django.utils.http import urlsafe_base64_decode
 from django.utils.encoding import force_str
 from django.contrib.auth.tokens import default_token_generator
+from django.db import transaction
+from django.http import FileResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from django.views.decorators.gzip import gzip_page
 from allauth.account.utils import perform_login
 from allauth.account.models import EmailAddress, EmailConfirmation
 from drf_spectacular.utils import extend_schema, OpenApiExample
@@ -15,10 +27,18 @@ from drf_spectacular.utils import extend_schema, OpenApiExample
 from .serializers import (
     UserSerializer, LoginSerializer, SignupSerializer,
     PasswordResetSerializer, PasswordResetConfirmSerializer,
-    ProfilometreLidarDataSerializer, DeviceModelSerializer,
-    DeviceInstanceSerializer, VenteSerializer, UserAdminSerializer
+    ProfilometreLidarDataSerializer, LidarUploadSerializer, LidarChunkSerializer, IngestJobSerializer,
+    IriAnalysisSerializer, ChangeDetectionSerializer, RouteSerializer, UserUsageSerializer, LidarPartitionSerializer,
+    DeviceModelSerializer, DeviceInstanceSerializer, VenteSerializer, UserAdminSerializer
+)
+from .models import (
+    DeviceModel, DeviceInstance, Vente, ProfilometreLidarData, LidarUpload, IngestJob,
+    LidarPointCloud, LidarRawPointCloud, LidarSpatialIndex, LidarLevelOfDetail, IriAnalysis, ChangeDetection, Route, UserUsage, LidarPartition,
+    Subscription, ClientProfile
 )
-from .models import DeviceModel, DeviceInstance, Vente, ProfilometreLidarData, Subscription, ClientProfile
+from . import changes, export, ingest, pointcloud, roughness, spatial
+from .pagination import RoutePagination, SessionPagination, UserPagination, VentePagination
+from .parsers import INGEST_PARSER_CLASSES
 from .permissions import IsSuperUser, IsVendeur
 from .serializers import ClientProfileSerializer
 from .permissions import IsVendeur, IsSuperUser
@@ -160,45 +180,728 @@ def password_reset_confirm(request):
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def send_profilometre_lidar_data(request):
-    user_id = request.data.get('user_id')
-    distance = request.data.get('distance')
+    """
+    Envoi d'une session. Le corps est d'abord haché (sans être analysé) : un
+    renvoi identique reçoit la réponse 201 d'origine, sans nouvelle ingestion,
+    même si cet envoi a rempli le quota. Sinon, quota de stockage déjà
+    atteint : refus avant d'analyser le corps.
+    """
+    content_encoding = request.META.get('HTTP_CONTENT_ENCODING', '')
+    content_hash, body = ingest.hash_body(request.stream, request.content_type, content_encoding)
+    duplicate = ingest.find_duplicate(content_hash, request.user)
+    if duplicate is not None:
+        return Response(ProfilometreLidarDataSerializer(duplicate).data, status=201, headers={'Idempotent-Replayed': 'true'})
 
     try:
-        subscription = Subscription.objects.get(user__id=user_id)
-        if not subscription.is_active() or subscription.space_consumed >= subscription.total_space or distance > subscription.distance_limit:
-            return Response({"error": "Limite dépassée."}, status=403)
-
-        serializer = ProfilometreLidarDataSerializer(data=request.data)
-        if serializer.is_valid():
-            serializer.save()
-            return Response(serializer.data, status=201)
-    except Subscription.DoesNotExist:
-        return Response({"error": "Aucun abonnement trouvé."}, status=404)
+        ingest.check_uploader_quota(request.user, request.query_params.get('user_id'))
+        data = ingest.parse_payload(body, request.content_type, content_encoding)
+        session = ingest.ingest_session(data, content_hash=content_hash, uploader=request.user)
+    except ingest.IngestError as exc:
+        return Response(exc.data, status=exc.status)
+    return Response(ProfilometreLidarDataSerializer(session).data, status=201)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@parser_classes(INGEST_PARSER_CLASSES)
+def send_profilometre_lidar_batch(request):
+    """
+    Envoi groupé de sessions (appareil resté hors ligne).
+    Corps : liste de sessions, ou {"sessions": [...]}. Réponse : un résultat par session.
+    """
+    try:
+        ingest.check_uploader_quota(request.user, request.query_params.get('user_id'))
+        status_code, body = ingest.ingest_batch(request.data, uploader=request.user)
+    except ingest.IngestError as exc:
+        return Response(exc.data, status=exc.status)
+    return Response(body, status=status_code)
+
+
+# Ingestion asynchrone : le corps brut est mis en file, un worker le traite
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def send_profilometre_lidar_async(request):
+    """
+    Même corps que profilometre-lidar/ (ou batch/ avec ?kind=batch).
+    Répond 202 avec l'identifiant du job, sans analyser le corps. Les renvois
+    identiques sont reconnus avant le contrôle du quota.
+    """
+    kind = request.query_params.get('kind', IngestJob.KIND_SESSION)
+    if kind not in dict(IngestJob.KIND_CHOICES):
+        return Response({"error": "Type de job inconnu."}, status=400)
+    content_encoding = request.META.get('HTTP_CONTENT_ENCODING', '')
+    content_hash, body = ingest.hash_body(request.stream, request.content_type, content_encoding)
+    if kind == IngestJob.KIND_SESSION:
+        # Renvoi identique : session déjà enregistrée, ou job déjà en file pour ce corps
+        duplicate = ingest.find_duplicate(content_hash, request.user)
+        if duplicate is not None:
+            return Response(ProfilometreLidarDataSerializer(duplicate).data, status=201, headers={'Idempotent-Replayed': 'true'})
+        job = IngestJob.objects.filter(owner=request.user, kind=kind, content_hash=content_hash).exclude(
+            status=IngestJob.STATUS_FAILED
+        ).first()
+        if job is not None:
+            return Response({
+                "job_id": str(job.id),
+                "status": job.status,
+                "status_url": reverse('backapp:ingest_job_status', args=[job.id]),
+            }, status=202, headers={'Idempotent-Replayed': 'true'})
+    try:
+        ingest.check_uploader_quota(request.user, request.query_params.get('user_id'))
+    except ingest.IngestError as exc:
+        return Response(exc.data, status=exc.status)
+    if ingest.queue_is_full():
+        return Response({"error": "File d'ingestion pleine, réessayez plus tard."}, status=503)
+
+    job = IngestJob.objects.create(
+        owner=request.user,
+        kind=kind,
+        content_type=request.content_type or '',
+        content_encoding=content_encoding,
+        content_hash=content_hash,
+        payload=body.read(),
+    )
+    return Response({
+        "job_id": str(job.id),
+        "status": job.status,
+        "status_url": reverse('backapp:ingest_job_status', args=[job.id]),
+    }, status=202)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def ingest_job_status(request, job_id):
+    job = IngestJob.objects.filter(pk=job_id, owner=request.user).first()
+    if job is None:
+        return Response({"error": "Job introuvable."}, status=404)
+    return Response(IngestJobSerializer(job).data)
+
+
+# Upload fractionné : open -> chunks (dans n'importe quel ordre) -> finalize
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def open_lidar_upload(request):
+    upload = LidarUpload.objects.filter(
+        session_id=request.data.get('session_id'), owner=request.user
+    ).first()
+    if upload is not None:
+        # Reprise d'un upload déjà ouvert
+        return Response(LidarUploadSerializer(upload).data, status=200)
+
+    try:
+        ingest.check_owner(request.user, request.data.get('user_id'))
+        ingest.check_subscription(request.data.get('user_id'), request.data.get('distance'))
+    except ingest.IngestError as exc:
+        return Response(exc.data, status=exc.status)
+
+    serializer = LidarUploadSerializer(data=request.data)
+    if serializer.is_valid():
+        serializer.save(owner=request.user, coord_dtype=pointcloud.coord_dtype().name)
+        return Response(serializer.data, status=201)
+    return Response(serializer.errors, status=400)
 
-    return Response({"error": "Données invalides."}, status=400)
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def lidar_upload_status(request, session_id):
+    upload = LidarUpload.objects.filter(session_id=session_id, owner=request.user).first()
+    if upload is None:
+        return Response({"error": "Upload introuvable."}, status=404)
+    return Response(LidarUploadSerializer(upload).data)
+
+
+@api_view(['PUT'])
+@permission_classes([IsAuthenticated])
+@parser_classes(INGEST_PARSER_CLASSES)
+def upload_lidar_chunk(request, session_id, index):
+    upload = LidarUpload.objects.filter(session_id=session_id, owner=request.user).first()
+    if upload is None:
+        return Response({"error": "Upload introuvable."}, status=404)
+    if upload.status != LidarUpload.STATUS_OPEN:
+        return Response({"error": "Upload déjà finalisé."}, status=409)
+    if upload.total_chunks is not None and index >= upload.total_chunks:
+        return Response({"error": "Index de morceau hors limites."}, status=400)
+    try:
+        # Morceaux déjà reçus compris : refus avant de lire ce morceau
+        subscription = ingest.subscriptions_for([upload.user_id]).get(str(upload.user_id))
+        ingest.check_quota(subscription, pointcloud.stored_size(upload.stats['count'], upload.coord_dtype) + 1)
+    except ingest.IngestError as exc:
+        return Response(exc.data, status=exc.status)
+
+    arrays = request.data.get('lidar_arrays') if isinstance(request.data, dict) else None
+    if arrays is None:
+        serializer = LidarChunkSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=400)
+        arrays = pointcloud.points_to_arrays(serializer.validated_data['points'])
+
+    created = upload.add_chunk(index, arrays)
+    return Response({
+        "index": index,
+        "created": created,
+        "point_count": upload.stats['count'],
+    }, status=201 if created else 200)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def finalize_lidar_upload(request, session_id):
+    upload = LidarUpload.objects.filter(session_id=session_id, owner=request.user).first()
+    if upload is None:
+        return Response({"error": "Upload introuvable."}, status=404)
+    if upload.status == LidarUpload.STATUS_FINALIZED:
+        return Response(LidarUploadSerializer(upload).data, status=200)
+
+    missing = upload.missing_chunks()
+    if missing:
+        return Response({"error": "Morceaux manquants.", "missing_chunks": missing}, status=409)
+
+    subscription = ingest.subscriptions_for([upload.user_id]).get(str(upload.user_id))
+    try:
+        ingest.check_quota(subscription, pointcloud.stored_size(upload.stats['count'], upload.coord_dtype))
+        with transaction.atomic():
+            session = upload.finalize()
+            ingest.check_limits(subscription, session.distance)
+            ingest.check_quota(subscription)
+    except ingest.IngestError as exc:
+        return Response(exc.data, status=exc.status)
+    return Response(LidarUploadSerializer(upload).data, status=201)
+
+
+def _visible_sessions(request):
+    """Sessions consultables : toutes pour le staff, sinon celles de l'utilisateur."""
+    sessions = ProfilometreLidarData.objects.all()
+    if not request.user.is_staff:
+        sessions = sessions.filter(user_id=str(request.user.id))
+    return sessions
+
+
+def _sparse_fields(request, default_exclude=()):
+    """
+    Champs demandés par ?fields=a,b et/ou ?exclude=c (ValueError si un champ
+    est inconnu). Sans ?fields=, tous les champs sauf default_exclude.
+    """
+    available = ProfilometreLidarDataSerializer.Meta.fields
+
+    def parse(name):
+        names = [field.strip() for field in request.query_params.get(name, '').split(',') if field.strip()]
+        unknown = [field for field in names if field not in available]
+        if unknown:
+            raise ValueError(f"Champ(s) inconnu(s) dans '{name}' : {', '.join(unknown)}.")
+        return names
+
+    fields, exclude = parse('fields'), parse('exclude')
+    if not fields:
+        fields = [field for field in available if field not in default_exclude]
+    return [field for field in fields if field not in exclude]
+
+
+def _session_filters(request):
+    """
+    Filtres de la liste et des exports : ?user_id=, ?start= / ?end= (date ou
+    date-heure ISO 8601) et ?bbox=min_x,min_y,max_x,max_y (ValueError si invalide).
+    """
+    params = request.query_params
+    filters = {'user_id': params.get('user_id') or None}
+    for name in ('start', 'end'):
+        value = params.get(name)
+        if value:
+            try:
+                parsed = parse_datetime(value) or parse_date(value)
+            except ValueError:
+                parsed = None
+            if parsed is None:
+                raise ValueError(f"Paramètre '{name}' invalide (date ISO 8601).")
+            if not isinstance(parsed, datetime.datetime):
+                time = datetime.time.max if name == 'end' else datetime.time.min
+                parsed = datetime.datetime.combine(parsed, time)
+            if timezone.is_naive(parsed):
+                parsed = timezone.make_aware(parsed)
+            filters[name] = parsed
+    if params.get('bbox'):
+        try:
+            bbox = [float(value) for value in params['bbox'].split(',')]
+        except ValueError:
+            bbox = []
+        if len(bbox) != 4:
+            raise ValueError("Paramètre 'bbox' invalide (min_x,min_y,max_x,max_y).")
+        filters['bbox'] = bbox
+    return filters
+
+
+def _only_fields(queryset, fields):
+    """Ne lit que les colonnes utiles : json_data (blob) n'est chargé que s'il est demandé."""
+    return queryset.only('id', *fields)
+
+
+# Détail d'une session ; ?lod=N : aperçu sous-échantillonné (LIDAR_LOD_LEVELS[N] points environ) ;
+# ?raw=1 : points bruts d'une session filtrée à l'ingestion
+@gzip_page
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def profilometre_lidar_session_detail(request, pk):
+    try:
+        fields = _sparse_fields(request)
+    except ValueError as exc:
+        return Response({"error": str(exc)}, status=400)
+    session = _only_fields(_visible_sessions(request), fields).filter(pk=pk).first()
+    if session is None:
+        return Response({"error": "Session introuvable."}, status=404)
+
+    lod = request.query_params.get('lod')
+    if request.query_params.get('raw', '').lower() in ('1', 'true') and 'json_data' in fields:
+        # Points tels que reçus, avant le filtrage à l'ingestion (s'il en a retiré ou modifié)
+        raw = LidarRawPointCloud.objects.filter(session=session).first()
+        if raw is not None:
+            context = {'lidar_arrays': raw.as_arrays()}
+            return Response(ProfilometreLidarDataSerializer(session, fields=fields, context=context).data)
+    if lod is None or 'json_data' not in fields:
+        return Response(ProfilometreLidarDataSerializer(session, fields=fields).data)
+
+    levels = settings.LIDAR_LOD_LEVELS
+    if not lod.isdigit() or int(lod) >= len(levels):
+        return Response({"error": f"Paramètre 'lod' doit être entre 0 et {len(levels) - 1}."}, status=400)
+    level = int(lod)
+    # Colonnes chargées seulement si le nuage complet doit être relu
+    cloud = LidarPointCloud.objects.defer('x', 'y', 'z', 't').filter(session=session).first()
+    detail = LidarLevelOfDetail.for_cloud(cloud, level) if cloud is not None else None
+    if detail is not None:
+        arrays, voxel_size = detail.as_arrays(), detail.voxel_size
+    else:
+        # Nuage déjà plus petit que le niveau demandé : servi en entier
+        arrays = cloud.as_arrays() if cloud is not None else session.point_arrays()
+        voxel_size = None
+
+    data = ProfilometreLidarDataSerializer(session, fields=fields, context={'lidar_arrays': arrays}).data
+    data['lod'] = {
+        "level": level,
+        "levels": levels,
+        "point_count": len(arrays['t']) if arrays is not None else 0,
+        "voxel_size": voxel_size,
+    }
+    return Response(data)
+
+
+# Fenêtre temporelle : points rangés par timestamp, index temporel du nuage (cf. LidarPointCloud.time_slice)
+@gzip_page
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def lidar_points_in_time_window(request, pk):
+    try:
+        t_start, t_end = _float_params(request, ('t_start', 't_end'), required=False)
+    except ValueError as exc:
+        return Response({"error": str(exc)}, status=400)
+    max_points = request.query_params.get('max_points') or str(settings.LIDAR_SLICE_MAX_POINTS)
+    if not max_points.isdigit() or int(max_points) < 1:
+        return Response({"error": "Paramètre 'max_points' invalide."}, status=400)
+    max_points = int(max_points)
+    session = _visible_sessions(request).filter(pk=pk).only('id').first()
+    if session is None:
+        return Response({"error": "Session introuvable."}, status=404)
+    cloud = LidarPointCloud.objects.defer('x', 'y', 'z', 't').filter(session=session).first()
+    if cloud is None:
+        return Response({"count": 0, "offset": 0, "downsampled": False, "points": []})
+
+    offset, arrays = cloud.time_slice(t_start, t_end)
+    count = len(arrays['t'])
+    downsampled = count > max_points
+    if downsampled:
+        # Fenêtre longue : un barycentre par voxel, dans l'ordre chronologique
+        arrays, _ = spatial.voxel_downsample(arrays, max_points)
+    return Response({
+        "count": count,
+        "offset": offset,
+        "downsampled": downsampled,
+        "points": pointcloud.arrays_to_points(arrays),
+    })
+
+
+# Export en flux (cf. export.py) : une session, ou toutes celles qui passent les filtres de la liste
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@renderer_classes([JSONRenderer, export.PassthroughRenderer])
+def export_profilometre_lidar(request, export_format, pk=None):
+    if export_format not in export.EXPORT_FORMATS:
+        formats = ', '.join(export.EXPORT_FORMATS)
+        return Response({"error": f"Format inconnu (formats : {formats})."}, status=400)
+    try:
+        filters = _session_filters(request)
+    except ValueError as exc:
+        return Response({"error": str(exc)}, status=400)
+    sessions = _visible_sessions(request).matching(**filters)
+    if pk is not None:
+        sessions = sessions.filter(pk=pk)
+        if not sessions.exists():
+            return Response({"error": "Session introuvable."}, status=404)
+
+    encoder, content_type = export.EXPORT_FORMATS[export_format]
+    response = StreamingHttpResponse(encoder(sessions), content_type=content_type)
+    name = f"session-{pk}" if pk is not None else "sessions"
+    response['Content-Disposition'] = f'attachment; filename="profilometre-{name}.{export_format}"'
+    return response
+
+
+# IRI (indice de rugosité, cf. roughness.py), conservé par session et longueur de segment
+def _segment_length(value):
+    if value in (None, ''):
+        return settings.LIDAR_IRI_SEGMENT_LENGTH
+    segment_length = float(value)
+    if not 1.0 <= segment_length <= 1e6:
+        raise ValueError
+    return segment_length
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def profilometre_lidar_session_iri(request, pk):
+    try:
+        segment_length = _segment_length(request.query_params.get('segment_length'))
+    except ValueError:
+        return Response({"error": "Paramètre 'segment_length' invalide (mètres, >= 1)."}, status=400)
+    session = _visible_sessions(request).filter(pk=pk).only('id').first()
+    if session is None:
+        return Response({"error": "Session introuvable."}, status=404)
+    cloud = LidarPointCloud.objects.defer('x', 'y', 'z', 't').filter(session=session).first()
+    if cloud is None:
+        return Response({"error": "Aucun point LiDAR."}, status=422)
+    try:
+        analysis = IriAnalysis.for_cloud(cloud, segment_length)
+    except roughness.ProfileTooShort as exc:
+        return Response({"error": str(exc)}, status=422)
+    return Response(IriAnalysisSerializer(analysis).data)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def profilometre_lidar_iri_batch(request):
+    """
+    Mode lot : IRI de toutes les sessions de l'utilisateur (ou de celles
+    listées dans "sessions"), LIDAR_BATCH_MAX_SESSIONS au plus par appel.
+    """
+    data = request.data if isinstance(request.data, dict) else {}
+    try:
+        segment_length = _segment_length(data.get('segment_length'))
+    except (TypeError, ValueError):
+        return Response({"error": "Paramètre 'segment_length' invalide (mètres, >= 1)."}, status=400)
+
+    sessions = _visible_sessions(request).filter(has_lidar_data=True).order_by('id')
+    if data.get('sessions') is not None:
+        if not isinstance(data['sessions'], list):
+            return Response({"error": "'sessions' doit être une liste d'identifiants."}, status=400)
+        sessions = sessions.filter(id__in=[pk for pk in data['sessions'] if isinstance(pk, int)])
+    max_sessions = getattr(settings, 'LIDAR_BATCH_MAX_SESSIONS', 100)
+    if sessions.count() > max_sessions:
+        return Response({"error": f"Maximum {max_sessions} sessions par lot."}, status=400)
+
+    results = []
+    for session_id, analysis, error in IriAnalysis.for_sessions(sessions, segment_length):
+        if analysis is None:
+            results.append({"session": session_id, "status": 422, "error": error})
+        else:
+            results.append({"status": 200, **IriAnalysisSerializer(analysis).data})
+    return Response({
+        "segment_length": segment_length,
+        "analysed": sum(1 for result in results if result['status'] == 200),
+        "results": results,
+    })
+
+
+@gzip_page
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def profilometre_lidar_session_changes(request, pk, other_pk):
+    """
+    Écarts d'élévation de la session other_pk par rapport à la session pk
+    (cf. changes.py), calculés à la première demande puis relus.
+    ?cell_size= (m), ?threshold= (m) ; ?cells=0 : statistiques seules.
+    """
+    try:
+        cell_size, threshold = _float_params(request, ('cell_size', 'threshold'), required=False)
+    except ValueError as exc:
+        return Response({"error": str(exc)}, status=400)
+    if cell_size is not None and not 0.01 <= cell_size <= 1000:
+        return Response({"error": "Paramètre 'cell_size' invalide (mètres, entre 0,01 et 1000)."}, status=400)
+    if threshold is not None and threshold < 0:
+        return Response({"error": "Paramètre 'threshold' invalide (mètres, >= 0)."}, status=400)
+    sessions = set(_visible_sessions(request).filter(pk__in=[pk, other_pk]).values_list('pk', flat=True))
+    if {pk, other_pk} - sessions:
+        return Response({"error": "Session introuvable."}, status=404)
+    clouds = LidarPointCloud.objects.defer('x', 'y', 'z', 't').filter(session__in=[pk, other_pk])
+    clouds = {cloud.session_id: cloud for cloud in clouds}
+    if pk not in clouds or other_pk not in clouds:
+        return Response({"error": "Aucun point LiDAR."}, status=422)
+
+    detection = ChangeDetection.for_clouds(clouds[pk], clouds[other_pk], cell_size, threshold)
+    data = ChangeDetectionSerializer(detection).data
+    if request.query_params.get('cells', '1').lower() not in ('0', 'false'):
+        max_results = getattr(settings, 'LIDAR_SPATIAL_MAX_RESULTS', 100000)
+        cells = detection.cell_records()
+        data['truncated'] = cells.size > max_results
+        data['cells'] = changes.cells_to_json(cells[:max_results])
+    return Response(data)
+
+
+# Requêtes spatiales sur le nuage d'une session (index par voxels, cf. spatial.py)
+
+
+def _float_params(request, names, required=True):
+    """Lit des paramètres numériques de la query string (None si absent et facultatif)."""
+    values = []
+    for name in names:
+        raw = request.query_params.get(name)
+        if raw in (None, ''):
+            if required:
+                raise ValueError(f"Paramètre '{name}' requis.")
+            values.append(None)
+            continue
+        try:
+            value = float(raw)
+        except ValueError:
+            raise ValueError(f"Paramètre '{name}' invalide.")
+        if value != value or value in (float('inf'), float('-inf')):
+            raise ValueError(f"Paramètre '{name}' invalide.")
+        values.append(value)
+    return values
+
+
+def _spatial_index(request, pk):
+    session = _visible_sessions(request).filter(pk=pk).only('id').first()
+    if session is None:
+        return None
+    cloud = LidarPointCloud.objects.defer('x', 'y', 'z', 't').filter(session=session).first()
+    if cloud is None:
+        return False
+    return LidarSpatialIndex.for_cloud(cloud)
+
+
+def _spatial_response(records, distances=None):
+    max_results = getattr(settings, 'LIDAR_SPATIAL_MAX_RESULTS', 100000)
+    truncated = records.size > max_results
+    records = records[:max_results]
+    points = spatial.records_to_points(records)
+    if distances is not None:
+        for point, distance in zip(points, distances[:max_results].tolist()):
+            point['distance'] = distance
+    return Response({"count": len(points), "truncated": truncated, "points": points})
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def lidar_points_in_box(request, pk):
+    try:
+        lo = _float_params(request, ('min_x', 'min_y', 'min_z'), required=False)
+        hi = _float_params(request, ('max_x', 'max_y', 'max_z'), required=False)
+    except ValueError as exc:
+        return Response({"error": str(exc)}, status=400)
+    index = _spatial_index(request, pk)
+    if index is None:
+        return Response({"error": "Session introuvable."}, status=404)
+    if index is False:
+        return Response({"count": 0, "truncated": False, "points": []})
+    return _spatial_response(index.query_box(lo, hi))
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def lidar_points_in_radius(request, pk):
+    try:
+        x, y, z, r = _float_params(request, ('x', 'y', 'z', 'r'))
+    except ValueError as exc:
+        return Response({"error": str(exc)}, status=400)
+    if r < 0:
+        return Response({"error": "Paramètre 'r' invalide."}, status=400)
+    index = _spatial_index(request, pk)
+    if index is None:
+        return Response({"error": "Session introuvable."}, status=404)
+    if index is False:
+        return Response({"count": 0, "truncated": False, "points": []})
+    return _spatial_response(*index.query_radius((x, y, z), r))
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def lidar_points_nearest(request, pk):
+    try:
+        x, y, z = _float_params(request, ('x', 'y', 'z'))
+    except ValueError as exc:
+        return Response({"error": str(exc)}, status=400)
+    k = request.query_params.get('k') or '1'
+    max_results = getattr(settings, 'LIDAR_SPATIAL_MAX_RESULTS', 100000)
+    if not k.isdecimal() or not 1 <= int(k) <= max_results:
+        return Response({"error": f"Paramètre 'k' doit être entre 1 et {max_results}."}, status=400)
+    index = _spatial_index(request, pk)
+    if index is None:
+        return Response({"error": "Session introuvable."}, status=404)
+    if index is False:
+        return Response({"count": 0, "truncated": False, "points": []})
+    return _spatial_response(*index.query_knn((x, y, z), int(k)))
+
+
+@gzip_page
 @api_view(['GET'])
 @authentication_classes([JWTAuthentication])
 @permission_classes([IsAuthenticated])
 def get_user_details(request):
+    """Cumuls (UserUsage, une ligne) et abonnement ; les sessions sont paginées à part."""
     user = request.user
-    try:
-        subscription = Subscription.objects.get(user=user)
-        analyses = ProfilometreLidarData.objects.filter(user=user)
-        total_distance = sum(a.distance for a in analyses)
-        user_info = {
-            "user_id": user.id,
-            "analyses": ProfilometreLidarDataSerializer(analyses, many=True).data,
-            "subscription": {
-                "total_space": subscription.total_space,
-                "space_consumed": subscription.space_consumed,
-                "distance_limit": subscription.distance_limit,
-                "expiration_date": subscription.expiration_date,
-            }
-        }
-        return Response(user_info)
-    except Subscription.DoesNotExist:
+    subscription = ingest.subscriptions_for([user.id]).get(str(user.id))
+    if subscription is None:
         return Response({"error": "Aucun abonnement trouvé."}, status=404)
+    usage = UserUsage.objects.filter(user_id=str(user.id)).first() or UserUsage(user_id=str(user.id))
+    return Response({
+        "user_id": user.id,
+        "usage": UserUsageSerializer(usage).data,
+        "sessions_url": reverse('backapp:profilometre_lidar_sessions'),
+        "subscription": {
+            "plan_name": subscription.plan_name,
+            "is_active": subscription.is_active,
+            "space_consumed": usage.stored_bytes,
+            "total_space": subscription.total_space,
+            "distance_limit": subscription.max_distance,
+            "expiration_date": subscription.end_date,
+        }
+    })
+
+
+@gzip_page
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def profilometre_lidar_sessions(request):
+    """
+    Sessions de l'utilisateur, les plus récentes d'abord, par curseur
+    (?cursor= des liens next / previous, ?page_size=, ?count=1).
+    Métadonnées seules par défaut : json_data sur demande (?fields=...,json_data).
+    """
+    try:
+        fields = _sparse_fields(request, default_exclude=('json_data',))
+        filters = _session_filters(request)
+    except ValueError as exc:
+        return Response({"error": str(exc)}, status=400)
+    # timestamp (clé du curseur) toujours lu, même hors des champs demandés
+    sessions = _only_fields(_visible_sessions(request).matching(**filters), [*fields, 'timestamp'])
+    paginator = SessionPagination()
+    page = paginator.paginate_queryset(sessions, request)
+    return paginator.get_paginated_response(ProfilometreLidarDataSerializer(page, many=True, fields=fields).data)
+
+
+# Champs renvoyés par la recherche par zone : métadonnées seules, jamais json_data
+AREA_SESSION_FIELDS = [
+    'id', 'user_id', 'session_id', 'timestamp', 'lidar_point_count',
+    'bbox_min_x', 'bbox_max_x', 'bbox_min_y', 'bbox_max_y',
+]
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def profilometre_lidar_sessions_in_area(request):
+    """
+    Sessions dont l'emprise recoupe la zone ?min_x=&min_y=&max_x=&max_y=
+    (index R*Tree des emprises), filtrables par ?user_id=, ?start=, ?end= ;
+    paginées par curseur comme la liste des sessions.
+    """
+    try:
+        min_x, min_y, max_x, max_y = _float_params(request, ('min_x', 'min_y', 'max_x', 'max_y'))
+        filters = _session_filters(request)
+    except ValueError as exc:
+        return Response({"error": str(exc)}, status=400)
+    if min_x > max_x or min_y > max_y:
+        return Response({"error": "Zone invalide (min > max)."}, status=400)
+    filters['bbox'] = (min_x, min_y, max_x, max_y)
+    sessions = _only_fields(_visible_sessions(request).matching(**filters), AREA_SESSION_FIELDS)
+    paginator = SessionPagination()
+    page = paginator.paginate_queryset(sessions, request)
+    return paginator.get_paginated_response(
+        ProfilometreLidarDataSerializer(page, many=True, fields=AREA_SESSION_FIELDS).data
+    )
+
+
+# Trajets : sessions consécutives d'un même utilisateur (cf. Route, routes.py)
+def _visible_routes(request):
+    routes = Route.objects.all()
+    if not request.user.is_staff:
+        routes = routes.filter(user_id=str(request.user.id))
+    return routes
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def profilometre_lidar_routes(request):
+    """
+    Trajets de l'utilisateur, les plus récents d'abord, par curseur ;
+    ?user_id=, ?start= / ?end= (trajets qui recoupent la période).
+    """
+    try:
+        filters = _session_filters(request)
+    except ValueError as exc:
+        return Response({"error": str(exc)}, status=400)
+    routes = _visible_routes(request)
+    if filters['user_id']:
+        routes = routes.filter(user_id=filters['user_id'])
+    if filters.get('start'):
+        routes = routes.filter(end__gte=filters['start'])
+    if filters.get('end'):
+        routes = routes.filter(start__lte=filters['end'])
+    paginator = RoutePagination()
+    page = paginator.paginate_queryset(routes, request)
+    return paginator.get_paginated_response(RouteSerializer(page, many=True).data)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def profilometre_lidar_route_detail(request, pk):
+    """Trajet et ses sessions, dans l'ordre chronologique."""
+    route = _visible_routes(request).filter(pk=pk).first()
+    if route is None:
+        return Response({"error": "Trajet introuvable."}, status=404)
+    sessions = route.sessions.order_by('timestamp', 'pk').only(*AREA_SESSION_FIELDS)
+    return Response({
+        **RouteSerializer(route).data,
+        "sessions": ProfilometreLidarDataSerializer(sessions, many=True, fields=AREA_SESSION_FIELDS).data,
+    })
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def profilometre_lidar_route_iri(request, pk):
+    """IRI sur tout le trajet, conservé jusqu'au prochain changement d'une de ses sessions."""
+    try:
+        segment_length = _segment_length(request.query_params.get('segment_length'))
+    except ValueError:
+        return Response({"error": "Paramètre 'segment_length' invalide (mètres, >= 1)."}, status=400)
+    route = _visible_routes(request).filter(pk=pk).first()
+    if route is None:
+        return Response({"error": "Trajet introuvable."}, status=404)
+    try:
+        iri = route.iri(segment_length)
+    except roughness.ProfileTooShort as exc:
+        return Response({"error": str(exc)}, status=422)
+    return Response({"route": route.pk, "version": route.version, **iri})
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@renderer_classes([JSONRenderer, export.PassthroughRenderer])
+def export_profilometre_lidar_route(request, pk, export_format):
+    """Points du trajet fusionnés par temps (cf. export.py), fichier conservé par version du trajet."""
+    if export_format not in export.EXPORT_FORMATS:
+        formats = ', '.join(export.EXPORT_FORMATS)
+        return Response({"error": f"Format inconnu (formats : {formats})."}, status=400)
+    route = _visible_routes(request).filter(pk=pk).first()
+    if route is None:
+        return Response({"error": "Trajet introuvable."}, status=404)
+    return FileResponse(
+        open(route.export_file(export_format), 'rb'),
+        as_attachment=True,
+        filename=f"profilometre-route-{route.pk}.{export_format}",
+        content_type=export.EXPORT_FORMATS[export_format][1],
+    )
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, permissions.IsAdminUser])
+def lidar_partitions(request):
+    """Partitions mensuelles (staff) : volumétrie et état de rétention."""
+    LidarPartition.refresh()
+    return Response(LidarPartitionSerializer(LidarPartition.objects.all(), many=True).data)
 
 # -------------------- VENDEUR --------------------
 class DeviceInstanceViewSet(viewsets.ModelViewSet):
@@ -224,6 +927,7 @@ class DeviceInstanceViewSet(viewsets.ModelViewSet):
 class VenteViewSet(viewsets.ModelViewSet):
     serializer_class = VenteSerializer
     permission_classes = [IsAuthenticated, IsVendeur]
+    pagination_class = VentePagination
 
     def get_queryset(self):
         return Vente.objects.filter(vendeur__user=self.request.user).order_by('-date')
@@ -233,6 +937,7 @@ class UserAdminViewSet(viewsets.ModelViewSet):
     queryset = User.objects.all()
     serializer_class = UserAdminSerializer
     permission_classes = [IsAuthenticated, IsSuperUser]
+    pagination_class = UserPagination
     authentication_classes = [JWTAuthentication]
     http_method_names = ['get', 'put', 'patch', 'delete', 'head', 'options']
 
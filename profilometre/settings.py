@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -90,6 +91,12 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # Plusieurs processus écrivent (serveur + workers d'ingestion) :
+            # transactions IMMEDIATE pour éviter les "database is locked"
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
     }
 }
 
@@ -286,6 +293,7 @@ CORS_ALLOW_HEADERS = [
     'accept',
     'accept-encoding',
     'authorization',
+    'content-encoding',
     'content-type',
     'dnt',
     'origin',
@@ -293,3 +301,75 @@ CORS_ALLOW_HEADERS = [
     'x-csrftoken',
     'x-requested-with',
 ]
+
+# Stockage LiDAR (colonnes x, y, z ; timestamp_sec toujours en float64)
+LIDAR_COORD_DTYPE = 'float32'  # 'float32' (12 octets/point) ou 'float64'
+LIDAR_POINT_STORAGE = 'database'  # 'database' (blobs) ou 'file' (.npy projetés en mémoire, cf. move_lidar_points_to_files)
+LIDAR_POINT_DATA_DIR = BASE_DIR / 'lidar_points'  # répertoire des fichiers en mode 'file'
+LIDAR_BATCH_MAX_SESSIONS = 100  # sessions max par envoi groupé (profilometre-lidar/batch/)
+
+# Distance parcourue, calculée à l'enregistrement (ProfilometreLidarData.travelled_distance, en m)
+LIDAR_DISTANCE_UNIT_M = 1000.0        # mètres par unité de Subscription.max_distance (km)
+LIDAR_TRAJECTORY_MAX_GAP_SEC = 2.0    # pas enjambant une interruption plus longue : non compté (None = tous)
+LIDAR_TRAJECTORY_3D = False           # True : longueur en x, y, z (sinon dans le plan x, y)
+
+# Filtrage des points à l'ingestion (cf. pointfilter.py) ; désactivé par défaut
+LIDAR_FILTER_RANGE = None             # bornes par axe, ex. {'z': (-5.0, 5.0)} (None dans un couple : non borné)
+LIDAR_FILTER_SOR_NEIGHBOURS = 0       # k voisins des points aberrants (0 = étape désactivée)
+LIDAR_FILTER_SOR_STD_RATIO = 2.0      # retiré au-delà de moyenne + ratio * écart-type des distances
+LIDAR_FILTER_MEDIAN_WINDOW = 0        # points de la médiane glissante de z (impaire ; 0 = désactivée)
+LIDAR_FILTER_KEEP_RAW = True          # conserve les points bruts (LidarRawPointCloud) d'une session filtrée
+
+# Ingestion asynchrone (profilometre-lidar/async/ + manage.py run_ingest_workers)
+LIDAR_INGEST_WORKERS = 2             # processus workers
+LIDAR_INGEST_QUEUE_MAX_DEPTH = 1000  # jobs en attente/en cours max avant 503
+LIDAR_INGEST_POLL_INTERVAL = 1.0     # secondes d'attente quand la file est vide
+LIDAR_INGEST_MAX_ATTEMPTS = 3        # tentatives avant qu'un job repris (worker arrêté) soit abandonné
+LIDAR_ENTITLEMENT_CACHE_TTL = 300    # secondes : abonnements en cache (invalidés à chaque modification)
+
+# Cache des droits des abonnements (cf. entitlements.py), à partager entre le serveur web et les
+# workers d'ingestion pour que les invalidations les atteignent tous. Par défaut, cache propre au
+# processus (développement, signalé par manage.py check : backapp.W001) ; en production, Redis ou
+# Memcached, ex. LIDAR_CACHE_BACKEND=django.core.cache.backends.redis.RedisCache et
+# LIDAR_CACHE_LOCATION=redis://127.0.0.1:6379/1
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('LIDAR_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('LIDAR_CACHE_LOCATION', ''),
+    }
+}
+
+# Corps compressés (Content-Encoding gzip, deflate, zstd si zstandard est installé)
+LIDAR_MAX_DECOMPRESSED_SIZE = 100 * 1024 * 1024  # octets max après décompression
+
+# Index spatial par voxels (profilometre-lidar/sessions/<id>/points/...)
+LIDAR_SPATIAL_VOXEL_SIZE = None         # mètres ; None = taille choisie selon la densité du nuage
+LIDAR_SPATIAL_POINTS_PER_VOXEL = 64     # cible quand la taille est automatique
+LIDAR_SPATIAL_MAX_RESULTS = 100000      # points max renvoyés par requête (au-delà : truncated)
+
+# Niveaux de détail (profilometre-lidar/sessions/<id>/?lod=N) : points visés par niveau
+LIDAR_LOD_LEVELS = [1000, 10000, 100000]
+
+# IRI (profilometre-lidar/sessions/<id>/iri/ + manage.py compute_iri)
+LIDAR_IRI_SEGMENT_LENGTH = 100.0   # mètres de trajet par segment
+LIDAR_IRI_SAMPLE_INTERVAL = 0.25   # pas de rééchantillonnage du profil (m)
+
+# Détection de changements entre deux passages (profilometre-lidar/sessions/<id>/changes/<autre id>/)
+LIDAR_CHANGE_CELL_SIZE = 0.5    # pas de la grille x, y (m) ; appariement à moins d'une cellule
+LIDAR_CHANGE_THRESHOLD = 0.01   # écart d'élévation (m) au-delà duquel une cellule est modifiée
+
+# Export en flux (profilometre-lidar/export/<format>/ + manage.py export_lidar)
+LIDAR_EXPORT_CHUNK_POINTS = 65536  # points relus et encodés par tranche
+LIDAR_EXPORT_LAS_SCALE = 0.001     # précision des coordonnées LAS (m)
+
+# Trajets : sessions consécutives d'un même utilisateur (profilometre-lidar/routes/)
+LIDAR_ROUTE_MAX_GAP_SEC = 300                       # écart max (s) entre fin d'une session et début de la suivante
+LIDAR_ROUTE_EXPORT_DIR = BASE_DIR / 'lidar_route_exports'  # exports de trajets conservés jusqu'au prochain changement
+
+# Fenêtres temporelles (profilometre-lidar/sessions/<id>/points/?t_start=&t_end=)
+LIDAR_TIME_INDEX_STRIDE = 1024     # un timestamp indexé tous les N points
+LIDAR_SLICE_MAX_POINTS = 100000    # au-delà, la fenêtre est sous-échantillonnée (max_points par défaut)
+
+# Rétention par partition mensuelle (manage.py archive_lidar_partitions)
+LIDAR_ARCHIVE_DIR = BASE_DIR / 'lidar_archive'   # un fichier SQLite compressé par mois archivé
+LIDAR_RETENTION_ARCHIVE_AFTER_DAYS = 365         # mois entièrement plus anciens : archivés